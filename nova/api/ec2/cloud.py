@@ -31,6 +31,7 @@ import tempfile
 import time
 import urllib
 
+from nova import availability_zones
 from nova import block_device
 from nova import compute
 from nova import context
@@ -52,6 +53,9 @@ from nova.image import s3
 
 
 FLAGS = flags.FLAGS
+flags.DEFINE_integer('metadata_cache_ttl', 15,
+                     'Seconds to cache the metadata served to an instance, '
+                     '0 to disable the cache')
 flags.DECLARE('dhcp_domain', 'nova.network.manager')
 flags.DECLARE('service_down_time', 'nova.scheduler.driver')
 
@@ -209,6 +213,14 @@ class CloudController(object):
         self.compute_api = compute.API(
                 network_api=self.network_api,
                 volume_api=self.volume_api)
+        if FLAGS.memcached_servers:
+            import memcache
+        else:
+            from nova import fakememcache as memcache
+        self.metadata_cache = memcache.Client(FLAGS.memcached_servers,
+                                              debug=0)
+        self.metadata_cache_hits = 0
+        self.metadata_cache_misses = 0
         self.setup()
 
     def __str__(self):
@@ -299,12 +311,6 @@ class CloudController(object):
                     result[key] = [line]
         return result
 
-    def _get_availability_zone_by_host(self, context, host):
-        services = db.service_get_all_by_host(context.elevated(), host)
-        if len(services) > 0:
-            return services[0]['availability_zone']
-        return 'unknown zone'
-
     def _get_image_state(self, image):
         # NOTE(vish): fallback status if image_state isn't set
         state = image.get('status')
@@ -359,24 +365,58 @@ class CloudController(object):
         return mappings
 
     def get_metadata(self, address):
+        """Return the metadata tree for the instance owning address.
+
+        The tree is cached for metadata_cache_ttl seconds. A cached tree is
+        only served while the instance row, its security groups and its
+        floating ips are unchanged, so it is rebuilt after any of them is.
+        """
+        if address is None:
+            raise exception.Error(_('No address to look up metadata for'))
         ctxt = context.get_admin_context()
-        search_opts = {'fixed_ip': address}
         try:
-            instance_ref = self.compute_api.get_all(ctxt,
-                    search_opts=search_opts)
+            instance_ref = db.instance_get_by_fixed_ip(ctxt, address)
         except exception.NotFound:
-            instance_ref = None
-        if not instance_ref:
             return None
 
-        # This ensures that all attributes of the instance
-        # are populated.
-        instance_ref = db.instance_get(ctxt, instance_ref[0]['id'])
+        if not FLAGS.metadata_cache_ttl:
+            return self._build_metadata(ctxt, instance_ref, address)
+
+        cache_key = str('metadata-%s' % address)
+        version = self._metadata_version(instance_ref)
+        cached = self.metadata_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            self.metadata_cache_hits += 1
+            return cached[1]
+
+        self.metadata_cache_misses += 1
+        LOG.debug(_('Metadata cache miss for %(address)s, '
+                    '%(hits)d hits and %(misses)d misses so far') %
+                  {'address': address,
+                   'hits': self.metadata_cache_hits,
+                   'misses': self.metadata_cache_misses})
+        data = self._build_metadata(ctxt, instance_ref, address)
+        self.metadata_cache.set(cache_key, (version, data),
+                                time=FLAGS.metadata_cache_ttl)
+        return data
 
+    @staticmethod
+    def _metadata_version(instance_ref):
+        """Describe the rows the metadata of an instance is built from."""
+        security_groups = [security_group['id'] for security_group
+                           in instance_ref.get('security_groups') or []]
+        floating_ips = [floating_ip['address']
+                        for fixed_ip in instance_ref.get('fixed_ips') or []
+                        for floating_ip in fixed_ip['floating_ips']]
+        return (instance_ref['id'], instance_ref.get('updated_at'),
+                sorted(security_groups), sorted(floating_ips))
+
+    def _build_metadata(self, ctxt, instance_ref, address):
         mpi = self._get_mpi_data(ctxt, instance_ref['project_id'])
         hostname = "%s.%s" % (instance_ref['hostname'], FLAGS.dhcp_domain)
         host = instance_ref['host']
-        availability_zone = self._get_availability_zone_by_host(ctxt, host)
+        availability_zone = availability_zones.get_host_availability_zone(
+                host)
 
         floaters = self._get_floaters_for_instance(ctxt, instance_ref,
                 return_all=False)
@@ -1216,12 +1256,19 @@ class CloudController(object):
         return i[0]
 
     def _format_instance_bdm(self, context, instance_id, root_device_name,
-                             result):
-        """Format InstanceBlockDeviceMappingResponseItemType"""
+                             result, bdms=None):
+        """Format InstanceBlockDeviceMappingResponseItemType
+
+        bdms fetched with their volumes loaded may be passed in, otherwise
+        they are looked up for instance_id.
+        """
         root_device_type = 'instance-store'
         mapping = []
-        for bdm in db.block_device_mapping_get_all_by_instance(context,
-                                                               instance_id):
+        prefetched = bdms is not None
+        if not prefetched:
+            bdms = db.block_device_mapping_get_all_by_instance(context,
+                                                               instance_id)
+        for bdm in bdms:
             volume_id = bdm['volume_id']
             if (volume_id is None or bdm['no_device']):
                 continue
@@ -1231,7 +1278,12 @@ class CloudController(object):
                 assert not bdm['virtual_name']
                 root_device_type = 'ebs'
 
-            vol = self.volume_api.get(context, volume_id=volume_id)
+            if prefetched:
+                vol = bdm['volume']
+                if vol is None:
+                    raise exception.VolumeNotFound(volume_id=volume_id)
+            else:
+                vol = self.volume_api.get(context, volume_id=volume_id)
             LOG.debug(_("vol = %s\n"), vol)
             # TODO(yamahata): volume attach time
             ebs = {'volumeId': volume_id,
@@ -1292,10 +1344,24 @@ class CloudController(object):
                                                      search_opts=search_opts)
             except exception.NotFound:
                 instances = []
+        if not context.is_admin:
+            instances = [instance for instance in instances
+                         if instance['image_ref'] != str(FLAGS.vpn_image_id)]
+
+        # NOTE(vish): fetch addresses, block device mappings and zones for
+        #             all of the instances up front instead of once per
+        #             instance.
+        addresses = self.network_api.get_addresses_by_instances(context,
+                                                                instances)
+        bdms = {}
+        if instances:
+            instance_ids = [instance['id'] for instance in instances]
+            for bdm in db.block_device_mapping_get_all_by_instances(
+                    context, instance_ids):
+                bdms.setdefault(bdm['instance_id'], []).append(bdm)
+        zones = availability_zones.get_availability_zones_by_host()
+
         for instance in instances:
-            if not context.is_admin:
-                if instance['image_ref'] == str(FLAGS.vpn_image_id):
-                    continue
             i = {}
             instance_id = instance['id']
             ec2_id = ec2utils.id_to_ec2_id(instance_id)
@@ -1309,19 +1375,16 @@ class CloudController(object):
 
             fixed_ip = None
             floating_ip = None
-            (fixed_ips, fixed_ip6s) = self._get_fixed_ips_for_instance(context,
-                    instance)
+            address = addresses.get(instance_id, {})
+            fixed_ips = address.get('ips')
             if fixed_ips:
                 fixed_ip = fixed_ips[0]
-                # Now look for a floater.
-                for ip in fixed_ips:
-                    floating_ips = self._get_floaters_for_fixed_ip(context, ip)
-                    # NOTE(comstud): Will it float?
-                    if floating_ips:
-                        floating_ip = floating_ips[0]
-                        # Got one, exit out.
-                        break
-            if fixed_ip6s:
+            # NOTE(comstud): Will it float?
+            floating_ips = address.get('floating_ips')
+            if floating_ips:
+                floating_ip = floating_ips[0]
+            fixed_ip6s = address.get('ip6s')
+            if FLAGS.use_ipv6 and fixed_ip6s:
                 i['dnsNameV6'] = fixed_ip6s[0]
             i['privateDnsName'] = fixed_ip
             i['privateIpAddress'] = fixed_ip
@@ -1343,9 +1406,10 @@ class CloudController(object):
             i['displayDescription'] = instance['display_description']
             self._format_instance_root_device_name(instance, i)
             self._format_instance_bdm(context, instance_id,
-                                      i['rootDeviceName'], i)
-            host = instance['host']
-            zone = self._get_availability_zone_by_host(context, host)
+                                      i['rootDeviceName'], i,
+                                      bdms.get(instance_id, []))
+            zone = zones.get(instance['host'],
+                             availability_zones.UNKNOWN_ZONE)
             i['placement'] = {'availabilityZone': zone}
             if instance['reservation_id'] not in reservations:
                 r = {}
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
 import hashlib
 import time
 
@@ -22,6 +23,7 @@ import webob.exc
 import webob.dec
 
 from nova import auth
+from nova.auth import identity_cache
 from nova import context
 from nova import exception
 from nova import flags
@@ -97,8 +99,9 @@ class AuthMiddleware(wsgi.Middleware):
             return faults.Fault(webob.exc.HTTPUnauthorized())
 
         # Get all valid projects for the user
-        projects = self.auth.get_projects(user_id)
-        if not projects:
+        identity = identity_cache.get_identity(user_id, self._load_identity)
+        project_ids = identity['project_ids']
+        if not project_ids:
             return faults.Fault(webob.exc.HTTPUnauthorized())
 
         project_id = ""
@@ -107,13 +110,8 @@ class AuthMiddleware(wsgi.Middleware):
         # keystone should be taking this over at some point
         if len(path_parts) > 1 and path_parts[1] == 'v1.1':
             project_id = path_parts[2]
-            # Check that the project for project_id exists, and that user
-            # is authorized to use it
-            try:
-                project = self.auth.get_project(project_id)
-            except exception.ProjectNotFound:
-                return faults.Fault(webob.exc.HTTPUnauthorized())
-            if project_id not in [p.id for p in projects]:
+            # Check that the user is authorized to use the project
+            if project_id not in project_ids:
                 return faults.Fault(webob.exc.HTTPUnauthorized())
         else:
             # As a fallback, set project_id from the headers, which is the v1.0
@@ -122,9 +120,9 @@ class AuthMiddleware(wsgi.Middleware):
             try:
                 project_id = req.headers["X-Auth-Project-Id"]
             except KeyError:
-                project_id = projects[0].id
+                project_id = project_ids[0]
 
-        is_admin = self.auth.is_admin(user_id)
+        is_admin = identity['is_admin']
         remote_address = getattr(req, 'remote_address', '127.0.0.1')
         if FLAGS.use_forwarded_for:
             remote_address = req.headers.get('X-Forwarded-For', remote_address)
@@ -134,8 +132,7 @@ class AuthMiddleware(wsgi.Middleware):
                                      remote_address=remote_address)
         req.environ['nova.context'] = ctx
 
-        if not is_admin and not self.auth.is_project_member(user_id,
-                                                            project_id):
+        if not is_admin and project_id not in project_ids:
             msg = _("%(user_id)s must be an admin or a "
                     "member of %(project_id)s")
             LOG.warn(msg % locals())
@@ -143,6 +140,12 @@ class AuthMiddleware(wsgi.Middleware):
 
         return self.application
 
+    def _load_identity(self, user_id):
+        """Look up the projects and admin status of a user."""
+        projects = self.auth.get_projects(user_id)
+        return {'project_ids': [project.id for project in projects],
+                'is_admin': bool(self.auth.is_admin(user_id))}
+
     def has_authentication(self, req):
         return 'X-Auth-Token' in req.headers
 
@@ -198,6 +201,10 @@ class AuthMiddleware(wsgi.Middleware):
         This method will also remove the token if the timestamp is older than
         2 days ago.
         """
+        user_id = identity_cache.get_token_user(token_hash)
+        if user_id:
+            return user_id
+
         ctxt = context.get_admin_context()
         try:
             token = self.db.auth_token_get(ctxt, token_hash)
@@ -208,6 +215,10 @@ class AuthMiddleware(wsgi.Middleware):
             if delta.days >= 2:
                 self.db.auth_token_destroy(ctxt, token['token_hash'])
             else:
+                remaining = datetime.timedelta(days=2) - delta
+                expires_in = remaining.days * 86400 + remaining.seconds
+                identity_cache.set_token_user(token_hash, token['user_id'],
+                                              expires_in)
                 return token['user_id']
         return None
 
@@ -506,13 +506,8 @@ class VsaVCController(servers.ControllerV11):
         if self.vsa_id is None:
             super(VsaVCController, self)._get_servers(req, is_detail)
 
-        context = req.environ['nova.context']
-
         search_opts = {'metadata': dict(vsa_id=str(self.vsa_id))}
-        instance_list = self.compute_api.get_all(
-                context, search_opts=search_opts)
-
-        limited_list = self._limit_items(instance_list, req)
+        limited_list = self._get_instances(req, search_opts)
         servers = [self._build_view(req, inst, is_detail)['server']
                 for inst in limited_list]
         return dict(servers=servers)
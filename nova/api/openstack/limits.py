@@ -31,6 +31,8 @@ from collections import defaultdict
 
 from webob.dec import wsgify
 
+from nova import exception
+from nova import flags
 from nova import quota
 from nova import utils
 from nova import wsgi as base_wsgi
@@ -41,6 +43,9 @@ from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
 
 
+FLAGS = flags.FLAGS
+
+
 # Convenience constants for the limits dictionary passed to Limiter().
 PER_SECOND = 1
 PER_MINUTE = 60
@@ -199,6 +204,7 @@ class Limit(object):
 
         self.last_request = None
         self.next_request = None
+        self._compiled_regex = None
 
         self.water_level = 0
         self.capacity = self.unit
@@ -213,9 +219,26 @@ class Limit(object):
         @param verb: string http verb (POST, GET, etc.)
         @param url: string URL
         """
-        if self.verb != verb or not re.match(self.regex, url):
+        if self.verb != verb or not self.matches(url):
             return
 
+        return self.record()
+
+    def matches(self, url):
+        """Return True if url matches the regular expression of this limit."""
+        # NOTE: compiled on first use, the display-only limits built by
+        #       the views are never matched and may hold any string.
+        if self._compiled_regex is None:
+            self._compiled_regex = re.compile(self.regex)
+        return self._compiled_regex.match(url) is not None
+
+    def record(self):
+        """
+        Record a request against this limit.
+
+        @return: Seconds to wait before the request would be allowed, or
+                 None if it is allowed now.
+        """
         now = self._get_time()
 
         if self.last_request is None:
@@ -243,6 +266,17 @@ class Limit(object):
         self.remaining = math.floor(((cap - water) / cap) * val)
         self.next_request = now
 
+    def copy(self):
+        """Return a copy of this limit with its own request history."""
+        return copy.copy(self)
+
+    def is_idle(self):
+        """Return True if no earlier request still counts against this
+        limit."""
+        if self.last_request is None:
+            return True
+        return self.water_level <= self._get_time() - self.last_request
+
     def _get_time(self):
         """Retrieve the current time. Broken out for testability."""
         return time.time()
@@ -277,8 +311,9 @@ DEFAULT_LIMITS = [
 
 class RateLimitingMiddleware(base_wsgi.Middleware):
     """
-    Rate-limits requests passing through this middleware. All limit information
-    is stored in memory for this implementation.
+    Rate-limits requests passing through this middleware. By default all limit
+    information is stored in memory of this process; use the
+    `MemcachedLimiter` limiter to share it between processes.
     """
 
     def __init__(self, application, limits=None, limiter=None, **kwargs):
@@ -340,28 +375,56 @@ class RateLimitingMiddleware(base_wsgi.Middleware):
 class Limiter(object):
     """
     Rate-limit checking class which handles limits in memory.
+
+    Limits are indexed by verb, so a request is only matched against the
+    limits for its verb. A user gets a copy of a limit the first time one
+    of their requests matches it, and copies that no earlier request
+    counts against any more are dropped again.
     """
 
+    # Minimum number of checks between two sweeps for idle copies.
+    sweep_interval = 1000
+
     def __init__(self, limits, **kwargs):
         """
         Initialize the new `Limiter`.
 
         @param limits: List of `Limit` objects
         """
-        self.limits = copy.deepcopy(limits)
-        self.levels = defaultdict(lambda: copy.deepcopy(limits))
+        self.limits = list(limits)
 
         # Pick up any per-user limit information
+        self.levels = {}
         for key, value in kwargs.items():
             if key.startswith('user:'):
                 username = key[5:]
                 self.levels[username] = self.parse_limits(value)
 
+        self._by_verb = {None: self._index_by_verb(self.limits)}
+        for username, user_limits in self.levels.items():
+            self._by_verb[username] = self._index_by_verb(user_limits)
+
+        self._buckets = {}
+        self._checks = 0
+
+    @staticmethod
+    def _index_by_verb(limits):
+        """Map each verb to the positions and limits that apply to it."""
+        by_verb = defaultdict(list)
+        for position, limit in enumerate(limits):
+            by_verb[limit.verb].append((position, limit))
+        return dict(by_verb)
+
+    def _limits_for(self, username):
+        return self.levels.get(username, self.limits)
+
     def get_limits(self, username=None):
         """
         Return the limits for a given user.
         """
-        return [limit.display() for limit in self.levels[username]]
+        buckets = self._buckets.get(username, {})
+        return [buckets.get(position, limit).display()
+                for position, limit in enumerate(self._limits_for(username))]
 
     def check_for_delay(self, verb, url, username=None):
         """
@@ -369,10 +432,18 @@ class Limiter(object):
 
         @return: Tuple of delay (in seconds) and error message (or None, None)
         """
+        self._checks += 1
+        if self._checks >= max(self.sweep_interval, len(self._buckets)):
+            self._checks = 0
+            self._sweep()
+
+        by_verb = self._by_verb.get(username, self._by_verb[None])
         delays = []
 
-        for limit in self.levels[username]:
-            delay = limit(verb, url)
+        for position, limit in by_verb.get(verb, ()):
+            if not limit.matches(url):
+                continue
+            delay = self._record(username, position, limit)
             if delay:
                 delays.append((delay, limit.error_message))
 
@@ -382,6 +453,24 @@ class Limiter(object):
 
         return None, None
 
+    def _record(self, username, position, limit):
+        """Record a request by username against limit, returning the delay
+        before it would be allowed or None."""
+        buckets = self._buckets.setdefault(username, {})
+        bucket = buckets.get(position)
+        if bucket is None:
+            bucket = buckets[position] = limit.copy()
+        return bucket.record()
+
+    def _sweep(self):
+        """Drop the copies of limits that are back to their initial state."""
+        for username, buckets in self._buckets.items():
+            for position, bucket in buckets.items():
+                if bucket.is_idle():
+                    del buckets[position]
+            if not buckets:
+                del self._buckets[username]
+
     # Note: This method gets called before the class is instantiated,
     # so this must be either a static method or a class method.  It is
     # used to develop a list of limits to feed to the constructor.  We
@@ -443,6 +532,107 @@ class Limiter(object):
         return result
 
 
+class MemcachedLimiter(Limiter):
+    """
+    Rate-limit checking class which keeps the request history of each
+    user in memcached, so that limits hold across all API workers that
+    share FLAGS.memcached_servers.
+
+    Each user and limit has one key holding the time at which the bucket
+    of the limit will be empty again. A key expires once its bucket is
+    empty, so idle users take no space.
+    """
+
+    # Number of times to retry a check that raced with another worker.
+    cas_retries = 5
+
+    def __init__(self, limits, **kwargs):
+        """
+        Initialize the new `MemcachedLimiter`.
+
+        @param limits: List of `Limit` objects
+        """
+        super(MemcachedLimiter, self).__init__(limits, **kwargs)
+        if FLAGS.memcached_servers:
+            import memcache
+        else:
+            from nova import fakememcache as memcache
+        self.mc = memcache.Client(FLAGS.memcached_servers, debug=0,
+                                  cache_cas=True)
+
+    @staticmethod
+    def _key(username, position):
+        return 'ratelimit-%s-%d' % (urllib.quote(username or '', safe=''),
+                                    position)
+
+    def get_limits(self, username=None):
+        """
+        Return the limits for a given user.
+        """
+        limits = self._limits_for(username)
+        keys = [self._key(username, position)
+                for position in xrange(len(limits))]
+        if hasattr(self.mc, 'get_multi'):
+            empty_at = self.mc.get_multi(keys)
+        else:
+            empty_at = dict((key, self.mc.get(key)) for key in keys)
+
+        result = []
+        for key, limit in zip(keys, limits):
+            display = limit.display()
+            if empty_at.get(key) is not None:
+                now = limit._get_time()
+                water_level = max(empty_at[key] - now, 0)
+                display['remaining'] = int(math.floor(
+                        (limit.capacity - water_level) / limit.capacity *
+                        limit.value))
+                wait = water_level + limit.request_value - limit.capacity
+                display['resetTime'] = int(now + max(wait, 0))
+            result.append(display)
+        return result
+
+    def _record(self, username, position, limit):
+        """Record a request by username against limit, returning the delay
+        before it would be allowed or None."""
+        key = self._key(username, position)
+        for _attempt in xrange(self.cas_retries):
+            now = limit._get_time()
+            if hasattr(self.mc, 'gets'):
+                empty_at = self.mc.gets(key)
+            else:
+                empty_at = self.mc.get(key)
+
+            water_level = max((empty_at or 0) - now, 0) + limit.request_value
+            difference = water_level - limit.capacity
+            if difference > 0:
+                return difference
+
+            ttl = int(math.ceil(water_level)) + 1
+            if empty_at is None:
+                stored = self.mc.add(key, now + water_level, time=ttl)
+            elif hasattr(self.mc, 'cas'):
+                stored = self.mc.cas(key, now + water_level, time=ttl)
+            else:
+                stored = self.mc.set(key, now + water_level, time=ttl)
+            if stored:
+                return None
+
+        # NOTE: let the request through rather than fail it when memcached
+        #       is too contended to record it.
+        return None
+
+    def _sweep(self):
+        """Drop the cas ids the client keeps for every key it has read.
+
+        Memcached expires idle keys by itself, but python-memcached keeps
+        the cas id of each key passed to gets() until reset_cas().  A check
+        whose cas id is dropped between its gets() and cas() is stored with
+        a plain set.
+        """
+        if hasattr(self.mc, 'reset_cas'):
+            self.mc.reset_cas()
+
+
 class WsgiLimiter(object):
     """
     Rate-limit checking from a WSGI application. Uses an in-memory `Limiter`.
@@ -457,6 +647,15 @@ class WsgiLimiter(object):
     and receive a 204 No Content, or a 403 Forbidden with an X-Wait-Seconds
     header containing the number of seconds to wait before the action would
     succeed.
+
+    Several checks can be made at once by POSTing to / a JSON list such as:
+        [
+            {"verb": "GET", "path": "/servers", "username": "user1"},
+            {"verb": "POST", "path": "/servers", "username": "user2"}
+        ]
+
+    and receiving a 200 with a JSON list holding a [delay, error] pair for
+    each check, where both are null if the request may go ahead.
     """
 
     def __init__(self, limits=None):
@@ -478,10 +677,23 @@ class WsgiLimiter(object):
             raise webob.exc.HTTPMethodNotAllowed()
 
         try:
-            info = dict(json.loads(request.body))
-        except ValueError:
+            info = json.loads(request.body)
+            if isinstance(info, list):
+                checks = [dict(check) for check in info]
+            else:
+                info = dict(info)
+        except (TypeError, ValueError):
             raise webob.exc.HTTPBadRequest()
 
+        if isinstance(info, list):
+            results = [self._limiter.check_for_delay(check.get("verb"),
+                                                     check.get("path"),
+                                                     check.get("username"))
+                       for check in checks]
+            response = webob.Response(content_type="application/json")
+            response.body = json.dumps(results)
+            return response
+
         username = request.path_info_pop()
         verb = info.get("verb")
         path = info.get("path")
@@ -526,6 +738,29 @@ class WsgiLimiterProxy(object):
 
         return resp.getheader("X-Wait-Seconds"), resp.read() or None
 
+    def check_for_delays(self, checks):
+        """
+        Make several checks in one request to the limiter.
+
+        @param checks: List of (verb, path, username) tuples
+        @return: List of (delay, error) tuples, one for each check
+        """
+        body = json.dumps([{"verb": verb, "path": path, "username": username}
+                           for verb, path, username in checks])
+        headers = {"Content-Type": "application/json"}
+
+        conn = httplib.HTTPConnection(self.limiter_address)
+        conn.request("POST", "/", body, headers)
+
+        resp = conn.getresponse()
+        if resp.status != 200:
+            raise exception.Error(_("Rate limiter at %(address)s returned "
+                                    "%(status)s") %
+                                  {'address': self.limiter_address,
+                                   'status': resp.status})
+
+        return [tuple(result) for result in json.loads(resp.read())]
+
     # Note: This method gets called before the class is instantiated,
     # so this must be either a static method or a class method.  It is
     # used to develop a list of limits to feed to the constructor.
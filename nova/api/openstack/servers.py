@@ -69,7 +69,7 @@ class Controller(object):
         """ Returns a list of server names and ids for a given user """
         try:
             servers = self._get_servers(req, is_detail=False)
-        except exception.Invalid as err:
+        except (exception.Invalid, exception.MarkerNotFound) as err:
             return exc.HTTPBadRequest(explanation=str(err))
         except exception.NotFound:
             return exc.HTTPNotFound()
@@ -79,7 +79,7 @@ class Controller(object):
         """ Returns a list of server details for a given user """
         try:
             servers = self._get_servers(req, is_detail=True)
-        except exception.Invalid as err:
+        except (exception.Invalid, exception.MarkerNotFound) as err:
             return exc.HTTPBadRequest(explanation=str(err))
         except exception.NotFound as err:
             return exc.HTTPNotFound()
@@ -91,7 +91,8 @@ class Controller(object):
     def _build_list(self, req, instances, is_detail=False):
         raise NotImplementedError()
 
-    def _limit_items(self, items, req):
+    def _get_instances(self, req, search_opts):
+        """Return the page of instances requested by req."""
         raise NotImplementedError()
 
     def _action_rebuild(self, info, request, instance_id):
@@ -154,11 +155,8 @@ class Controller(object):
                 # No 'changes-since', so we only want non-deleted servers
                 search_opts['deleted'] = False
 
-        instance_list = self.compute_api.get_all(context,
-                                                 search_opts=search_opts)
-
-        limited_list = self._limit_items(instance_list, req)
-        return self._build_list(req, limited_list, is_detail=is_detail)
+        instance_list = self._get_instances(req, search_opts)
+        return self._build_list(req, instance_list, is_detail=is_detail)
 
     def _handle_quota_error(self, error):
         """
@@ -816,8 +814,11 @@ class ControllerV10(Controller):
         builder = views_servers.ViewBuilderV10(context, addresses)
         return builder.build_list(instances, is_detail=is_detail)
 
-    def _limit_items(self, items, req):
-        return common.limited(items, req)
+    def _get_instances(self, req, search_opts):
+        context = req.environ['nova.context']
+        instance_list = self.compute_api.get_all(context,
+                                                 search_opts=search_opts)
+        return common.limited(instance_list, req)
 
     def _update(self, context, req, id, inst_dict):
         if 'adminPass' in inst_dict['server']:
@@ -941,8 +942,14 @@ class ControllerV11(Controller):
         self.compute_api.set_admin_password(context, id, password)
         return webob.Response(status_int=202)
 
-    def _limit_items(self, items, req):
-        return common.limited_by_marker(items, req)
+    def _get_instances(self, req, search_opts):
+        # Page in the database rather than slicing the full list.
+        context = req.environ['nova.context']
+        limit, marker = common.get_limit_and_marker(req)
+        search_opts.pop('limit', None)
+        search_opts.pop('marker', None)
+        return self.compute_api.get_all(context, search_opts=search_opts,
+                                        limit=limit, marker=marker)
 
     def _validate_metadata(self, metadata):
         """Ensure that we can work with the metadata given."""
@@ -225,6 +225,12 @@ class FakeLDAP(object):
             raise SERVER_DOWN
         pass
 
+    def whoami_s(self):
+        """This method is ignored, but provided for compatibility."""
+        if server_fail:
+            raise SERVER_DOWN
+        return ''
+
     def add_s(self, dn, attr):
         """Add an object with the specified attributes at dn."""
         if server_fail:
@@ -0,0 +1,187 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Short lived cache of auth tokens and user identities.
+
+Entries are kept in a process-local LRU and, if FLAGS.memcached_servers
+is set, in memcached so that they are shared between API workers.  A
+lookup that misses the LRU falls back to memcached and then to the
+loader it was given.  Memcached entries carry their expiry time, so an
+entry copied into an LRU expires when the original does.
+
+AuthManager invalidates a user's identity whenever the user, their roles
+or their projects change.  Invalidation clears the local LRU and
+memcached; the LRUs of other processes keep their copy for at most
+FLAGS.identity_cache_ttl seconds.
+"""
+
+import hashlib
+
+from nova import flags
+from nova import utils
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer('identity_cache_ttl', 30,
+                     'Seconds to cache auth tokens and user identities for,'
+                     ' 0 to disable the cache')
+flags.DEFINE_integer('identity_cache_size', 1000,
+                     'Number of auth tokens and user identities to keep in'
+                     ' the process-local cache')
+
+
+if FLAGS.memcached_servers:
+    import memcache
+else:
+    memcache = None
+
+
+class _LRUCache(object):
+    """Dict of keys to values that expire.
+
+    Once more than size entries are held, the least recently used tenth
+    of them is dropped in one pass.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = {}
+        self._tick = 0
+
+    def _touch(self):
+        self._tick += 1
+        return self._tick
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if utils.utcnow_ts() >= entry[0]:
+            del self._entries[key]
+            return None
+        entry[2] = self._touch()
+        return entry[1]
+
+    def set(self, key, value, ttl):
+        self._entries[key] = [utils.utcnow_ts() + ttl, value, self._touch()]
+        if len(self._entries) > self.size:
+            keep = self.size - self.size // 10
+            by_use = sorted(self._entries, key=lambda k: self._entries[k][2])
+            for old_key in by_use[:len(by_use) - keep]:
+                del self._entries[old_key]
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+
+_local = None
+_mc = None
+
+
+def reset():
+    """Drop the process-local cache."""
+    global _local
+    _local = None
+
+
+def _get_local():
+    global _local
+    if _local is None:
+        _local = _LRUCache(FLAGS.identity_cache_size)
+    return _local
+
+
+def _get_memcache():
+    global _mc
+    if _mc is None and memcache is not None:
+        _mc = memcache.Client(FLAGS.memcached_servers, debug=0)
+    return _mc
+
+
+def _key(kind, name):
+    # NOTE: memcached keys can't hold spaces or control characters.
+    return 'identity-%s-%s' % (kind,
+                               hashlib.sha1(unicode(name).encode('utf-8')).
+                               hexdigest())
+
+
+def _get(key):
+    value = _get_local().get(key)
+    if value is None and _get_memcache():
+        entry = _get_memcache().get(key)
+        if entry is not None:
+            expires, value = entry
+            ttl = expires - utils.utcnow_ts()
+            if ttl > 0:
+                _get_local().set(key, value, ttl)
+            else:
+                value = None
+    return value
+
+
+def _set(key, value, ttl):
+    _get_local().set(key, value, ttl)
+    if _get_memcache():
+        _get_memcache().set(key, (utils.utcnow_ts() + ttl, value),
+                            time=ttl)
+
+
+def _delete(key):
+    _get_local().delete(key)
+    if _get_memcache():
+        _get_memcache().delete(key)
+
+
+def get_token_user(token_hash):
+    """Return the cached user id of a token, or None."""
+    if not FLAGS.identity_cache_ttl:
+        return None
+    return _get(_key('token', token_hash))
+
+
+def set_token_user(token_hash, user_id, expires_in=None):
+    """Cache the user id of a token that expires in expires_in seconds."""
+    ttl = FLAGS.identity_cache_ttl
+    if expires_in is not None:
+        ttl = min(ttl, int(expires_in))
+    if ttl > 0:
+        _set(_key('token', token_hash), user_id, ttl)
+
+
+def invalidate_token(token_hash):
+    _delete(_key('token', token_hash))
+
+
+def get_identity(user_id, load):
+    """Return the identity of a user, calling load(user_id) on a miss.
+
+    An identity is a dict with the ids of the user's projects in
+    project_ids and whether the user is an admin in is_admin.
+    """
+    if not FLAGS.identity_cache_ttl:
+        return load(user_id)
+    key = _key('user', user_id)
+    identity = _get(key)
+    if identity is None:
+        identity = load(user_id)
+        _set(key, identity, FLAGS.identity_cache_ttl)
+    return identity
+
+
+def invalidate_user(user_id):
+    """Forget the identity of a user after it changed."""
+    _delete(_key('user', user_id))
@@ -27,9 +27,12 @@ public methods.
 import functools
 import sys
 
+from eventlet import pools
+
 from nova import exception
 from nova import flags
 from nova import log as logging
+from nova import utils
 
 
 FLAGS = flags.FLAGS
@@ -52,6 +55,14 @@ flags.DEFINE_string('ldap_project_subtree', 'ou=Groups,dc=example,dc=com',
                     'OU for Projects')
 flags.DEFINE_string('role_project_subtree', 'ou=Groups,dc=example,dc=com',
                     'OU for Roles')
+flags.DEFINE_integer('ldap_pool_size', 10,
+                     'Maximum number of LDAP connections to keep open')
+flags.DEFINE_integer('ldap_pool_check_interval', 60,
+                     'Seconds an LDAP connection may be idle before it is'
+                     ' checked when taken from the pool')
+flags.DEFINE_integer('ldap_cache_ttl', 30,
+                     'Seconds to cache LDAP search results for, 0 to'
+                     ' disable the cache')
 
 # NOTE(vish): mapping with these flags is necessary because we're going
 #             to tie in to an existing ldap schema
@@ -101,25 +112,73 @@ def sanitize(fn):
     return _wrapped
 
 
+class LDAPReadCache(object):
+    """Search results kept for FLAGS.ldap_cache_ttl seconds.
+
+    Any write through a connection sharing the cache drops all of it.
+    """
+
+    # Number of results past which expired ones are dropped.
+    max_entries = 10000
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or utils.utcnow_ts() >= entry[0]:
+            return None
+        return entry[1]
+
+    def set(self, key, value):
+        ttl = FLAGS.ldap_cache_ttl
+        if ttl <= 0:
+            return
+        now = utils.utcnow_ts()
+        if len(self._entries) >= self.max_entries:
+            for old_key, (expires, _value) in self._entries.items():
+                if now >= expires:
+                    del self._entries[old_key]
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+        self._entries[key] = (now + ttl, value)
+
+    def clear(self):
+        self._entries.clear()
+
+
 class LDAPWrapper(object):
-    def __init__(self, ldap, url, user, password):
+    def __init__(self, ldap, url, user, password, cache=None):
         self.ldap = ldap
         self.url = url
         self.user = user
         self.password = password
+        self.cache = cache
         self.conn = None
+        self.last_used = None
 
     def __wrap_reconnect(f):
         def inner(self, *args, **kwargs):
             if self.conn is None:
                 self.connect()
-                return f(self.conn)(*args, **kwargs)
+                rv = f(self.conn)(*args, **kwargs)
             else:
                 try:
-                    return f(self.conn)(*args, **kwargs)
+                    rv = f(self.conn)(*args, **kwargs)
                 except self.ldap.SERVER_DOWN:
                     self.connect()
-                    return f(self.conn)(*args, **kwargs)
+                    rv = f(self.conn)(*args, **kwargs)
+            self.last_used = utils.utcnow_ts()
+            return rv
+        return inner
+
+    def __wrap_write(f):
+        def inner(self, *args, **kwargs):
+            try:
+                return f(self, *args, **kwargs)
+            finally:
+                if self.cache is not None:
+                    self.cache.clear()
         return inner
 
     def connect(self):
@@ -129,24 +188,94 @@ class LDAPWrapper(object):
         except self.ldap.SERVER_DOWN:
             self.conn = None
             raise
+        self.last_used = utils.utcnow_ts()
+
+    def check(self):
+        """Drop the connection if it has been idle and no longer works, so
+        that the next call connects and binds again."""
+        if self.conn is None or self.last_used is None:
+            return
+        idle = utils.utcnow_ts() - self.last_used
+        if idle < FLAGS.ldap_pool_check_interval:
+            return
+        try:
+            self.conn.whoami_s()
+            self.last_used = utils.utcnow_ts()
+        except Exception:  # pylint: disable=W0703
+            LOG.info(_("Idle LDAP connection to %s failed, reconnecting"),
+                     self.url)
+            self.conn = None
+
+    _search_s = __wrap_reconnect(lambda conn: conn.search_s)
+    add_s = __wrap_write(__wrap_reconnect(lambda conn: conn.add_s))
+    delete_s = __wrap_write(__wrap_reconnect(lambda conn: conn.delete_s))
+    modify_s = __wrap_write(__wrap_reconnect(lambda conn: conn.modify_s))
+
+    def search_s(self, dn, scope, query=None, fields=None):
+        if self.cache is None:
+            return self._search_s(dn, scope, query, fields)
+        key = (dn, scope, query, fields and tuple(fields))
+        res = self.cache.get(key)
+        if res is None:
+            try:
+                res = self._search_s(dn, scope, query, fields)
+            except self.ldap.NO_SUCH_OBJECT:
+                self.cache.set(key, [])
+                raise
+            self.cache.set(key, res)
+        # NOTE: callers add to the attributes they get back
+        return [(res_dn, dict(attrs)) for res_dn, attrs in res]
+
+
+class LDAPConnectionPool(pools.Pool):
+    """Pool of LDAP connections that share one LDAPReadCache."""
+
+    def __init__(self, ldap, url, user, password):
+        self.ldap = ldap
+        self.url = url
+        self.user = user
+        self.password = password
+        self.cache = LDAPReadCache()
+        super(LDAPConnectionPool, self).__init__(
+                max_size=FLAGS.ldap_pool_size,
+                order_as_stack=True)
+
+    def create(self):
+        LOG.debug(_('Pool creating new LDAP connection to %s'), self.url)
+        return LDAPWrapper(self.ldap, self.url, self.user, self.password,
+                           self.cache)
+
+    def get(self):
+        conn = super(LDAPConnectionPool, self).get()
+        conn.check()
+        return conn
+
+    def __call_pooled(name):
+        def inner(self, *args, **kwargs):
+            with self.item() as conn:
+                return getattr(conn, name)(*args, **kwargs)
+        return inner
 
-    search_s = __wrap_reconnect(lambda conn: conn.search_s)
-    add_s = __wrap_reconnect(lambda conn: conn.add_s)
-    delete_s = __wrap_reconnect(lambda conn: conn.delete_s)
-    modify_s = __wrap_reconnect(lambda conn: conn.modify_s)
+    search_s = __call_pooled('search_s')
+    add_s = __call_pooled('add_s')
+    delete_s = __call_pooled('delete_s')
+    modify_s = __call_pooled('modify_s')
 
 
 class LdapDriver(object):
     """Ldap Auth driver
 
     Defines enter and exit and therefore supports the with/as syntax.
+    Each with block takes a connection from a pool shared by all drivers
+    and returns it at the end. Calls made outside of a with block take a
+    connection for the length of that call.
     """
 
     project_pattern = '(owner=*)'
     isadmin_attribute = 'isNovaAdmin'
     project_attribute = 'owner'
     project_objectclass = 'groupOfNames'
-    conn = None
+    pool = None
     mc = None
 
     def __init__(self):
@@ -158,20 +287,29 @@ class LdapDriver(object):
             LdapDriver.project_attribute = 'projectManager'
             LdapDriver.project_objectclass = 'novaProject'
         self.__cache = None
-        if LdapDriver.conn is None:
-            LdapDriver.conn = LDAPWrapper(self.ldap, FLAGS.ldap_url,
-                                          FLAGS.ldap_user_dn,
-                                          FLAGS.ldap_password)
+        self.__conn = None
+        if LdapDriver.pool is None:
+            LdapDriver.pool = LDAPConnectionPool(self.ldap, FLAGS.ldap_url,
+                                                 FLAGS.ldap_user_dn,
+                                                 FLAGS.ldap_password)
         if LdapDriver.mc is None:
             LdapDriver.mc = memcache.Client(FLAGS.memcached_servers, debug=0)
 
+    @property
+    def conn(self):
+        """The connection taken for this with block, or the pool"""
+        return self.__conn or LdapDriver.pool
+
     def __enter__(self):
         # TODO(yorik-sar): Should be per-request cache, not per-driver-request
         self.__cache = {}
+        self.__conn = LdapDriver.pool.get()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.__cache = None
+        LdapDriver.pool.put(self.__conn)
+        self.__conn = None
         return False
 
     def __local_cache(key_fmt):  # pylint: disable=E0213
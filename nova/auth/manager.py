@@ -37,6 +37,7 @@ from nova import exception
 from nova import flags
 from nova import log as logging
 from nova import utils
+from nova.auth import identity_cache
 from nova.auth import signer
 
 
@@ -474,6 +475,7 @@ class AuthManager(object):
         with self.driver() as drv:
             self._clear_mc_key(uid, role, pid)
             drv.add_role(uid, role, pid)
+        identity_cache.invalidate_user(uid)
 
     def remove_role(self, user, role, project=None):
         """Removes role for user
@@ -503,6 +505,7 @@ class AuthManager(object):
         with self.driver() as drv:
             self._clear_mc_key(uid, role, pid)
             drv.remove_role(uid, role, pid)
+        identity_cache.invalidate_user(uid)
 
     @staticmethod
     def get_roles(project_roles=True):
@@ -574,6 +577,7 @@ class AuthManager(object):
                 LOG.audit(_("Created project %(name)s with"
                         " manager %(manager_user)s") % locals())
                 project = Project(**project_dict)
+                self._invalidate_members(project)
                 return project
 
     def modify_project(self, project, manager_user=None, description=None):
@@ -596,6 +600,8 @@ class AuthManager(object):
             drv.modify_project(Project.safe_id(project),
                                manager_user,
                                description)
+        if manager_user:
+            identity_cache.invalidate_user(manager_user)
 
     def add_to_project(self, user, project):
         """Add user to project"""
@@ -603,8 +609,10 @@ class AuthManager(object):
         pid = Project.safe_id(project)
         LOG.audit(_("Adding user %(uid)s to project %(pid)s") % locals())
         with self.driver() as drv:
-            return drv.add_to_project(User.safe_id(user),
-                                      Project.safe_id(project))
+            rv = drv.add_to_project(User.safe_id(user),
+                                    Project.safe_id(project))
+        identity_cache.invalidate_user(uid)
+        return rv
 
     def is_project_manager(self, user, project):
         """Checks if user is project manager"""
@@ -624,7 +632,9 @@ class AuthManager(object):
         pid = Project.safe_id(project)
         LOG.audit(_("Remove user %(uid)s from project %(pid)s") % locals())
         with self.driver() as drv:
-            return drv.remove_from_project(uid, pid)
+            rv = drv.remove_from_project(uid, pid)
+        identity_cache.invalidate_user(uid)
+        return rv
 
     @staticmethod
     def get_project_vpn_data(project):
@@ -653,8 +663,20 @@ class AuthManager(object):
     def delete_project(self, project):
         """Deletes a project"""
         LOG.audit(_("Deleting project %s"), Project.safe_id(project))
+        pid = Project.safe_id(project)
+        if not isinstance(project, Project):
+            project = self.get_project(pid)
         with self.driver() as drv:
-            drv.delete_project(Project.safe_id(project))
+            drv.delete_project(pid)
+        if project:
+            self._invalidate_members(project)
+
+    @staticmethod
+    def _invalidate_members(project):
+        """Forget the cached identities of the members of a project"""
+        identity_cache.invalidate_user(project.project_manager_id)
+        for member_id in project.member_ids:
+            identity_cache.invalidate_user(member_id)
 
     def get_user(self, uid):
         """Retrieves a user by id"""
@@ -724,6 +746,7 @@ class AuthManager(object):
                                         uid)
         with self.driver() as drv:
             drv.delete_user(uid)
+        identity_cache.invalidate_user(uid)
 
     def modify_user(self, user, access_key=None, secret_key=None, admin=None):
         """Modify credentials for a user"""
@@ -737,6 +760,7 @@ class AuthManager(object):
                     " for user %(uid)s") % locals())
         with self.driver() as drv:
             drv.modify_user(uid, access_key, secret_key, admin)
+        identity_cache.invalidate_user(uid)
 
     def get_credentials(self, user, project=None, use_dmz=True):
         """Get credential zip for user in project"""
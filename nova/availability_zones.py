@@ -0,0 +1,73 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Process-wide map of hosts to their availability zones.
+
+A host's availability zone is recorded on its service rows and almost
+never changes, so the map is loaded from the services table once and
+kept until it is older than FLAGS.availability_zone_cache_interval
+seconds.  Code that creates or destroys service rows calls reset().
+"""
+
+import datetime
+
+from nova import context
+from nova import db
+from nova import flags
+from nova import utils
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer('availability_zone_cache_interval', 60,
+                     'Seconds between reloads of the host to availability'
+                     ' zone map from the services table')
+
+UNKNOWN_ZONE = 'unknown zone'
+
+_zones = None
+_loaded_at = None
+
+
+def reset():
+    """Forget the map so that the next lookup reloads it."""
+    global _zones
+    _zones = None
+
+
+def _is_stale():
+    if _zones is None:
+        return True
+    interval = datetime.timedelta(
+            seconds=FLAGS.availability_zone_cache_interval)
+    return utils.utcnow() - _loaded_at >= interval
+
+
+def get_availability_zones_by_host():
+    """Return a dict of host to availability zone for all hosts."""
+    global _zones, _loaded_at
+    if _is_stale():
+        zones = {}
+        for service in db.service_get_all(context.get_admin_context()):
+            zones.setdefault(service['host'], service['availability_zone'])
+        _zones = zones
+        _loaded_at = utils.utcnow()
+    return _zones
+
+
+def get_host_availability_zone(host):
+    """Return the availability zone of host, or UNKNOWN_ZONE."""
+    return get_availability_zones_by_host().get(host, UNKNOWN_ZONE)
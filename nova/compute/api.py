@@ -368,9 +368,20 @@ class API(base.Base):
         """tell vm driver to create ephemeral/swap device at boot time by
         updating BlockDeviceMapping
         """
+        for values in self._image_block_device_mapping_values(
+                instance_type, mappings):
+            values['instance_id'] = instance_id
+            self.db.block_device_mapping_update_or_create(elevated_context,
+                                                          values)
+
+    def _image_block_device_mapping_values(self, instance_type, mappings):
+        """Return the BlockDeviceMapping values, minus the instance_id,
+        for the ephemeral/swap devices listed in the image mappings.
+        """
         instance_type = (instance_type or
                          instance_types.get_default_instance_type())
 
+        bdm_values = []
         for bdm in block_device.mappings_prepend_dev(mappings):
             LOG.debug(_("bdm %s"), bdm)
 
@@ -385,13 +396,11 @@ class API(base.Base):
             if size == 0:
                 continue
 
-            values = {
-                'instance_id': instance_id,
+            bdm_values.append({
                 'device_name': bdm['device'],
                 'virtual_name': virtual_name,
-                'volume_size': size}
-            self.db.block_device_mapping_update_or_create(elevated_context,
-                                                          values)
+                'volume_size': size})
+        return bdm_values
 
     def _update_block_device_mapping(self, elevated_context,
                                      instance_type, instance_id,
@@ -400,10 +409,22 @@ class API(base.Base):
         BlockDeviceMapping
         """
         LOG.debug(_("block_device_mapping %s"), block_device_mapping)
+        for values in self._block_device_mapping_values(
+                instance_type, block_device_mapping):
+            values['instance_id'] = instance_id
+            self.db.block_device_mapping_update_or_create(elevated_context,
+                                                          values)
+
+    def _block_device_mapping_values(self, instance_type,
+                                     block_device_mapping):
+        """Return the BlockDeviceMapping values, minus the instance_id,
+        for a block_device_mapping request.
+        """
+        bdm_values = []
         for bdm in block_device_mapping:
             assert 'device_name' in bdm
 
-            values = {'instance_id': instance_id}
+            values = {}
             for key in ('device_name', 'delete_on_termination', 'virtual_name',
                         'snapshot_id', 'volume_id', 'volume_size',
                         'no_device'):
@@ -427,19 +448,36 @@ class API(base.Base):
                           'virtual_name'):
                     values[k] = None
 
-            self.db.block_device_mapping_update_or_create(elevated_context,
-                                                          values)
+            bdm_values.append(values)
+        return bdm_values
 
-    def create_db_entry_for_new_instance(self, context, instance_type, image,
-            base_options, security_group, block_device_mapping, num=1):
-        """Create an entry in the DB for this new instance,
-        including any related table updates (such as security group,
-        etc).
-
-        This is called by the scheduler after a location for the
-        instance has been determined.
+    @staticmethod
+    def _merge_block_device_mapping_values(bdm_values):
+        """Fold a sequence of BlockDeviceMapping values the same way
+        successive block_device_mapping_update_or_create() calls would for
+        a new instance.
         """
-        elevated = context.elevated()
+        merged = []
+        for values in bdm_values:
+            for existing in merged:
+                if existing['device_name'] == values['device_name']:
+                    existing.update(values)
+                    break
+            else:
+                merged.append(dict(values))
+
+            # NOTE(yamahata): same virtual device name can be specified
+            #                 multiple times. So drop the earlier ones.
+            virtual_name = values['virtual_name']
+            if (virtual_name is not None and
+                block_device.is_swap_or_ephemeral(virtual_name)):
+                merged = [existing for existing in merged
+                          if existing['virtual_name'] != virtual_name or
+                          existing['device_name'] == values['device_name']]
+        return merged
+
+    def _get_security_group_ids(self, context, security_group):
+        """Look up the ids of the named security groups."""
         if security_group is None:
             security_group = ['default']
         if not isinstance(security_group, list):
@@ -451,6 +489,20 @@ class API(base.Base):
                     context.project_id,
                     security_group_name)
             security_groups.append(group['id'])
+        return security_groups
+
+    def create_db_entry_for_new_instance(self, context, instance_type, image,
+            base_options, security_group, block_device_mapping, num=1):
+        """Create an entry in the DB for this new instance,
+        including any related table updates (such as security group,
+        etc).
+
+        This is called by the scheduler after a location for the
+        instance has been determined.
+        """
+        elevated = context.elevated()
+        security_groups = self._get_security_group_ids(context,
+                                                       security_group)
 
         instance = dict(launch_index=num, **base_options)
         instance = self.db.instance_create(context, instance)
@@ -483,6 +535,53 @@ class API(base.Base):
         instance = self.update(context, instance_id, **updates)
         return instance
 
+    def create_db_entries_for_new_instances(self, context, instance_type,
+            image, base_options, security_group, block_device_mapping,
+            instance_values):
+        """Batch version of create_db_entry_for_new_instance().
+
+        Creates one instance for each dict in instance_values, which holds
+        the values that differ between the instances (the host, say). The
+        instance rows, their security groups and block device mappings
+        are written in a single transaction, and the default names that
+        need the new instance ids in a second one.
+        """
+        security_groups = self._get_security_group_ids(context,
+                                                       security_group)
+
+        properties = image['properties']
+        bdm_values = self._merge_block_device_mapping_values(
+                self._image_block_device_mapping_values(instance_type,
+                        properties.get('mappings', [])) +
+                self._block_device_mapping_values(instance_type,
+                        properties.get('block_device_mapping', [])) +
+                # override via command line option
+                self._block_device_mapping_values(instance_type,
+                        block_device_mapping))
+
+        values_list = []
+        for num, values in enumerate(instance_values, 1):
+            instance = dict(base_options, launch_index=num,
+                            vm_state=vm_states.BUILDING,
+                            task_state=task_states.SCHEDULING)
+            instance.update(values)
+            values_list.append(instance)
+        instances = self.db.instance_create_many(context, values_list,
+                security_groups, bdm_values)
+
+        # Set sane defaults if not specified
+        updates = {}
+        for instance in instances:
+            values = {}
+            if instance['display_name'] is None:
+                values['display_name'] = generate_default_display_name(
+                        instance)
+                instance['display_name'] = values['display_name']
+            values['hostname'] = self.hostname_factory(instance)
+            updates[instance['id']] = values
+        instances = self.db.instance_update_many(context, updates)
+        return [dict(instance.iteritems()) for instance in instances]
+
     def _schedule_run_instance(self,
             rpc_method,
             context, base_options,
@@ -927,11 +1026,16 @@ class API(base.Base):
         """
         return self.get(context, instance_id)
 
-    def get_all(self, context, search_opts=None):
+    def get_all(self, context, search_opts=None, limit=None, marker=None):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retreive
         all instances in the system.
+
+        If limit or marker is given, return at most limit instances, newest
+        first, following the instance whose id is marker.  Local results
+        are paged by the database; only when child zones are present is
+        the combined list sliced here.
         """
 
         if search_opts is None:
@@ -980,17 +1084,25 @@ class API(base.Base):
                     remap_object(value)
 
         local_zone_only = search_opts.get('local_zone_only', False)
+        paginate = limit is not None or marker is not None
 
-        instances = self._get_instances_by_filters(context, filters)
+        zones = None
+        if paginate and not local_zone_only:
+            zones = self.db.zone_get_all(context.elevated())
+            local_zone_only = not zones
 
         if local_zone_only:
-            return instances
+            return self._get_instances_by_filters(context, filters,
+                                                  limit=limit, marker=marker)
+
+        instances = self._get_instances_by_filters(context, filters)
 
         # Recurse zones. Send along the un-modified search options we received.
         children = scheduler_api.call_zone_method(context,
                 "list",
                 errors_to_ignore=[novaclient.exceptions.NotFound],
                 novaclient_collection_name="servers",
+                zones=zones,
                 search_opts=search_opts)
 
         for zone, servers in children:
@@ -1002,9 +1114,27 @@ class API(base.Base):
                 server._info['_is_precooked'] = True
                 instances.append(server._info)
 
+        if paginate:
+            instances = self._limit_by_marker(instances, limit, marker)
         return instances
 
-    def _get_instances_by_filters(self, context, filters):
+    @staticmethod
+    def _limit_by_marker(instances, limit, marker):
+        """Return the slice of instances after marker, at most limit long."""
+        start = 0
+        if marker is not None:
+            for i, instance in enumerate(instances):
+                if instance['id'] == marker:
+                    start = i + 1
+                    break
+            else:
+                raise exception.MarkerNotFound(marker=marker)
+        if limit is None:
+            return instances[start:]
+        return instances[start:start + limit]
+
+    def _get_instances_by_filters(self, context, filters, limit=None,
+                                  marker=None):
         ids = None
         if 'ip6' in filters or 'ip' in filters:
             res = self.network_api.get_instance_uuids_by_ip_filter(context,
@@ -1014,7 +1144,8 @@ class API(base.Base):
             uuids = set([r['instance_uuid'] for r in res])
             filters['uuid'] = uuids
 
-        return self.db.instance_get_all_by_filters(context, filters)
+        return self.db.instance_get_all_by_filters(context, filters,
+                                                   limit=limit, marker=marker)
 
     def _cast_compute_message(self, method, context, instance_id, host=None,
                               params=None):
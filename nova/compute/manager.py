@@ -144,7 +144,6 @@ class ComputeManager(manager.SchedulerDependentManager):
         self.network_api = network.API()
         self.network_manager = utils.import_object(FLAGS.network_manager)
         self.volume_manager = utils.import_object(FLAGS.volume_manager)
-        self._last_host_check = 0
         super(ComputeManager, self).__init__(service_name="compute",
                                              *args, **kwargs)
 
@@ -480,6 +479,13 @@ class ComputeManager(manager.SchedulerDependentManager):
     def run_instance(self, context, instance_id, **kwargs):
         self._run_instance(context, instance_id, **kwargs)
 
+    def run_instances(self, context, instance_ids, **kwargs):
+        """Launch several instances the scheduler placed on this host
+        with a single request."""
+        for instance_id in instance_ids:
+            greenthread.spawn_n(self.run_instance, context, instance_id,
+                                **kwargs)
+
     @exception.wrap_exception(notifier=notifier, publisher_id=publisher_id())
     @checks_instance_lock
     def start_instance(self, context, instance_id):
@@ -1162,6 +1168,11 @@ class ComputeManager(manager.SchedulerDependentManager):
         """Sets the specified host's ability to accept new instances."""
         return self.driver.set_host_enabled(host, enabled)
 
+    @exception.wrap_exception(notifier=notifier, publisher_id=publisher_id())
+    def prefetch_image(self, context, image_id):
+        """Download an image into this host's image cache."""
+        self.driver.prefetch_image(context, image_id)
+
     @exception.wrap_exception(notifier=notifier, publisher_id=publisher_id())
     def get_diagnostics(self, context, instance_id):
         """Retrieve diagnostics for an instance on this host."""
@@ -1697,61 +1708,35 @@ class ComputeManager(manager.SchedulerDependentManager):
         network_info = self._get_instance_nw_info(context, instances_ref)
         self.driver.destroy(instances_ref, network_info)
 
-    def periodic_tasks(self, context=None):
-        """Tasks to be run at a periodic interval."""
-        error_list = super(ComputeManager, self).periodic_tasks(context)
-        if error_list is None:
-            error_list = []
-
-        try:
-            if FLAGS.rescue_timeout > 0:
-                self.driver.poll_rescued_instances(FLAGS.rescue_timeout)
-        except Exception as ex:
-            LOG.warning(_("Error during poll_rescued_instances: %s"),
-                    unicode(ex))
-            error_list.append(ex)
-
-        try:
-            if FLAGS.resize_confirm_window > 0:
-                self.driver.poll_unconfirmed_resizes(
-                        FLAGS.resize_confirm_window)
-        except Exception as ex:
-            LOG.warning(_("Error during poll_unconfirmed_resizes: %s"),
-                    unicode(ex))
-            error_list.append(ex)
-
-        try:
-            self._report_driver_status()
-        except Exception as ex:
-            LOG.warning(_("Error during report_driver_status(): %s"),
-                    unicode(ex))
-            error_list.append(ex)
-
-        try:
-            self._sync_power_states(context)
-        except Exception as ex:
-            LOG.warning(_("Error during power_state sync: %s"), unicode(ex))
-            error_list.append(ex)
-
-        try:
-            self._reclaim_queued_deletes(context)
-        except Exception as ex:
-            LOG.warning(_("Error during reclamation of queued deletes: %s"),
-                        unicode(ex))
-            error_list.append(ex)
-
-        return error_list
-
-    def _report_driver_status(self):
-        curr_time = time.time()
-        if curr_time - self._last_host_check > FLAGS.host_state_interval:
-            self._last_host_check = curr_time
-            LOG.info(_("Updating host status"))
-            # This will grab info about the host and queue it
-            # to be sent to the Schedulers.
-            self.update_service_capabilities(
-                self.driver.get_host_stats(refresh=True))
-
+    @manager.periodic_task
+    def _poll_rescued_instances(self, context):
+        if FLAGS.rescue_timeout > 0:
+            self.driver.poll_rescued_instances(FLAGS.rescue_timeout)
+
+    @manager.periodic_task
+    def _poll_unconfirmed_resizes(self, context):
+        if FLAGS.resize_confirm_window > 0:
+            self.driver.poll_unconfirmed_resizes(FLAGS.resize_confirm_window)
+
+    @manager.periodic_task(interval='host_state_interval')
+    def _report_driver_status(self, context):
+        LOG.info(_("Updating host status"))
+        # This will grab info about the host and queue it
+        # to be sent to the Schedulers.
+        self.update_service_capabilities(
+            self.driver.get_host_stats(refresh=True))
+
+    @manager.periodic_task
+    def _manage_image_cache(self, context):
+        self.driver.manage_image_cache(context)
+
+    def _get_host_instances(self, context):
+        """Return the instances on this host, loaded once per cycle."""
+        return self._periodic_cached('host_instances',
+                                     self.db.instance_get_all_by_host,
+                                     context, self.host)
+
+    @manager.periodic_task
     def _sync_power_states(self, context):
         """Align power states between the database and the hypervisor.
 
@@ -1761,10 +1746,12 @@ class ComputeManager(manager.SchedulerDependentManager):
         then it will be set to power_state.NOSTATE, because it doesn't exist
         on the hypervisor.
 
+        All of the changed power states are written in a single update.
+
         """
         vm_instances = self.driver.list_instances_detail()
         vm_instances = dict((vm.name, vm) for vm in vm_instances)
-        db_instances = self.db.instance_get_all_by_host(context, self.host)
+        db_instances = self._get_host_instances(context)
 
         num_vm_instances = len(vm_instances)
         num_db_instances = len(db_instances)
@@ -1773,6 +1760,8 @@ class ComputeManager(manager.SchedulerDependentManager):
             LOG.info(_("Found %(num_db_instances)s in the database and "
                        "%(num_vm_instances)s on the hypervisor.") % locals())
 
+        power_states = {}
+        num_missing = 0
         for db_instance in db_instances:
             name = db_instance["name"]
             db_power_state = db_instance['power_state']
@@ -1786,14 +1775,23 @@ class ComputeManager(manager.SchedulerDependentManager):
             if vm_power_state == db_power_state:
                 continue
 
-            self._instance_update(context,
-                                  db_instance["id"],
-                                  power_state=vm_power_state)
-
+            if vm_instance is None:
+                num_missing += 1
+            power_states[db_instance["id"]] = vm_power_state
+
+        num_drifted = len(power_states)
+        if num_drifted:
+            self.db.instance_update_power_states(context, power_states)
+            LOG.info(_("Synced power states: %(num_drifted)d of "
+                       "%(num_db_instances)d instances changed, "
+                       "%(num_missing)d of them not on the hypervisor.") %
+                     locals())
+
+    @manager.periodic_task
     def _reclaim_queued_deletes(self, context):
         """Reclaim instances that are queued for deletion."""
 
-        instances = self.db.instance_get_all_by_host(context, self.host)
+        instances = self._get_host_instances(context)
 
         queue_time = datetime.timedelta(
                          seconds=FLAGS.reclaim_instance_interval)
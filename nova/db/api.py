@@ -163,6 +163,11 @@ def compute_node_get(context, compute_id, session=None):
     return IMPL.compute_node_get(context, compute_id)
 
 
+def compute_node_get_all(context):
+    """Get all computeNodes, with their services loaded."""
+    return IMPL.compute_node_get_all(context)
+
+
 def compute_node_create(context, values):
     """Create a computeNode from the values dictionary."""
     return IMPL.compute_node_create(context, values)
@@ -362,6 +367,15 @@ def fixed_ip_create(context, values):
     return IMPL.fixed_ip_create(context, values)
 
 
+def fixed_ip_create_many(context, values_iter):
+    """Create fixed ips from an iterable of values dictionaries.
+
+    All of the fixed ips are created in a single transaction.
+
+    """
+    return IMPL.fixed_ip_create_many(context, values_iter)
+
+
 def fixed_ip_disassociate(context, address):
     """Disassociate a fixed ip from an instance by address."""
     return IMPL.fixed_ip_disassociate(context, address)
@@ -392,6 +406,11 @@ def fixed_ip_get_by_instance(context, instance_id):
     return IMPL.fixed_ip_get_by_instance(context, instance_id)
 
 
+def fixed_ip_get_by_instances(context, instance_ids):
+    """Get fixed ips, with their floating ips, for many instances."""
+    return IMPL.fixed_ip_get_by_instances(context, instance_ids)
+
+
 def fixed_ip_get_by_network_host(context, network_id, host):
     """Get fixed ip for a host in a network."""
     return IMPL.fixed_ip_get_by_network_host(context, network_id, host)
@@ -449,6 +468,11 @@ def virtual_interface_get_by_instance(context, instance_id):
     return IMPL.virtual_interface_get_by_instance(context, instance_id)
 
 
+def virtual_interface_get_by_instances(context, instance_ids):
+    """Gets all virtual_interfaces for many instances."""
+    return IMPL.virtual_interface_get_by_instances(context, instance_ids)
+
+
 def virtual_interface_get_by_instance_and_network(context, instance_id,
                                                            network_id):
     """Gets all virtual interfaces for instance."""
@@ -477,6 +501,14 @@ def virtual_interface_get_all(context):
     return IMPL.virtual_interface_get_all(context)
 
 
+def virtual_interface_get_by_ip_regexp(context, regexp):
+    """Gets the vifs with a fixed or floating ip that may match regexp.
+
+    Returns None if the regexp can't be narrowed down in the database.
+    """
+    return IMPL.virtual_interface_get_by_ip_regexp(context, regexp)
+
+
 ####################
 
 
@@ -485,6 +517,20 @@ def instance_create(context, values):
     return IMPL.instance_create(context, values)
 
 
+def instance_create_many(context, values_list, security_group_ids=None,
+                         block_device_mappings=None):
+    """Create an instance for each values dictionary in one transaction.
+
+    Every instance is added to the given security groups and gets a
+    BlockDeviceMapping for each values dictionary in
+    block_device_mappings.
+
+    """
+    return IMPL.instance_create_many(context, values_list,
+                                     security_group_ids,
+                                     block_device_mappings)
+
+
 def instance_data_get_for_project(context, project_id):
     """Get (instance_count, total_cores, total_ram) for project."""
     return IMPL.instance_data_get_for_project(context, project_id)
@@ -515,9 +561,14 @@ def instance_get_all(context):
     return IMPL.instance_get_all(context)
 
 
-def instance_get_all_by_filters(context, filters):
-    """Get all instances that match all filters."""
-    return IMPL.instance_get_all_by_filters(context, filters)
+def instance_get_all_by_filters(context, filters, limit=None, marker=None):
+    """Get all instances that match all filters, newest first.
+
+    If limit is given, return at most limit instances following the
+    instance whose id is marker.
+    """
+    return IMPL.instance_get_all_by_filters(context, filters, limit=limit,
+                                            marker=marker)
 
 
 def instance_get_active_by_window(context, begin, end=None, project_id=None):
@@ -599,6 +650,26 @@ def instance_update(context, instance_id, values):
     return IMPL.instance_update(context, instance_id, values)
 
 
+def instance_update_many(context, updates):
+    """Set the given properties on several instances in one transaction.
+
+    :param updates: dict mapping instance ids to the values to set.
+    :returns: the updated instances, ordered by id.
+
+    """
+    return IMPL.instance_update_many(context, updates)
+
+
+def instance_update_power_states(context, power_states):
+    """Set the power_state of several instances in a single statement.
+
+    :param power_states: dict mapping instance ids to their power state.
+    :returns: the number of instances updated.
+
+    """
+    return IMPL.instance_update_power_states(context, power_states)
+
+
 def instance_add_security_group(context, instance_id, security_group_id):
     """Associate the given security group with the given instance."""
     return IMPL.instance_add_security_group(context, instance_id,
@@ -1053,6 +1124,12 @@ def block_device_mapping_get_all_by_instance(context, instance_id):
     return IMPL.block_device_mapping_get_all_by_instance(context, instance_id)
 
 
+def block_device_mapping_get_all_by_instances(context, instance_ids):
+    """Get all block device mappings, with their volumes, for instances"""
+    return IMPL.block_device_mapping_get_all_by_instances(context,
+                                                          instance_ids)
+
+
 def block_device_mapping_destroy(context, bdm_id):
     """Destroy the block device mapping."""
     return IMPL.block_device_mapping_destroy(context, bdm_id)
@@ -1093,6 +1170,15 @@ def security_group_get_by_instance(context, instance_id):
     return IMPL.security_group_get_by_instance(context, instance_id)
 
 
+def security_group_get_member_addresses(context, security_group_ids):
+    """Get the fixed ip addresses of the members of security groups.
+
+    Returns a dict mapping each security group id to a list of addresses.
+    """
+    return IMPL.security_group_get_member_addresses(context,
+                                                    security_group_ids)
+
+
 def security_group_exists(context, project_id, group_name):
     """Indicates if a group name exists in a project."""
     return IMPL.security_group_exists(context, project_id, group_name)
@@ -32,17 +32,27 @@ from nova import log as logging
 from nova.compute import vm_states
 from nova.db.sqlalchemy import models
 from nova.db.sqlalchemy.session import get_session
+from sqlalchemy import and_
 from sqlalchemy import or_
+from sqlalchemy import String
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import case
 from sqlalchemy.sql.expression import desc
+from sqlalchemy.sql.expression import exists
 from sqlalchemy.sql.expression import literal_column
 
 FLAGS = flags.FLAGS
 LOG = logging.getLogger("nova.db.sqlalchemy")
 
+_BULK_INSERT_CHUNK_SIZE = 1000
+# Smallest page read when instances are filtered in python after the query
+_INSTANCE_FILTER_PAGE_SIZE = 100
+# An ipv4 address or prefix such as 10.0.0.1 or ^10.0.
+_DOTTED_QUAD_RE = re.compile(r'^\^?[0-9]{1,3}(\.[0-9]{1,3}){0,3}\.?\$?$')
+
 
 def is_admin_context(context):
     """Indicates if the request context is an administrator."""
@@ -366,6 +376,17 @@ def compute_node_get(context, compute_id, session=None):
     return result
 
 
+@require_admin_context
+def compute_node_get_all(context, session=None):
+    if not session:
+        session = get_session()
+
+    return session.query(models.ComputeNode).\
+                   options(joinedload('service')).\
+                   filter_by(deleted=can_read_deleted(context)).\
+                   all()
+
+
 @require_admin_context
 def compute_node_create(context, values):
     compute_node_ref = models.ComputeNode()
@@ -767,6 +788,23 @@ def fixed_ip_create(_context, values):
     return fixed_ip_ref['address']
 
 
+@require_context
+def fixed_ip_create_many(_context, values_iter):
+    table = models.FixedIp.__table__
+    session = get_session()
+    with session.begin():
+        # NOTE: each chunk is a single executemany, which MySQLdb sends
+        #       as one multi-row INSERT.
+        chunk = []
+        for values in values_iter:
+            chunk.append(values)
+            if len(chunk) == _BULK_INSERT_CHUNK_SIZE:
+                session.execute(table.insert(), chunk)
+                chunk = []
+        if chunk:
+            session.execute(table.insert(), chunk)
+
+
 @require_context
 def fixed_ip_disassociate(context, address):
     session = get_session()
@@ -859,6 +897,19 @@ def fixed_ip_get_by_instance(context, instance_id):
     return rv
 
 
+@require_context
+def fixed_ip_get_by_instances(context, instance_ids):
+    if not instance_ids:
+        return []
+    session = get_session()
+    return session.query(models.FixedIp).\
+                   options(joinedload('floating_ips')).\
+                   filter(models.FixedIp.instance_id.in_(instance_ids)).\
+                   filter_by(deleted=False).\
+                   order_by(models.FixedIp.id).\
+                   all()
+
+
 @require_context
 def fixed_ip_get_by_network_host(context, network_id, host):
     session = get_session()
@@ -1015,6 +1066,24 @@ def virtual_interface_get_by_instance(context, instance_id):
     return vif_refs
 
 
+@require_context
+def virtual_interface_get_by_instances(context, instance_ids):
+    """Gets all virtual interfaces for many instances.
+
+    :param instance_ids: = ids of the instances to retrieve vifs for
+    """
+    if not instance_ids:
+        return []
+    session = get_session()
+    vif_refs = session.query(models.VirtualInterface).\
+                       filter(models.VirtualInterface.instance_id.in_(
+                              instance_ids)).\
+                       options(joinedload('network')).\
+                       order_by(models.VirtualInterface.id).\
+                       all()
+    return vif_refs
+
+
 @require_context
 def virtual_interface_get_by_instance_and_network(context, instance_id,
                                                            network_id):
@@ -1079,6 +1148,52 @@ def virtual_interface_get_all(context):
     return vif_refs
 
 
+@require_context
+def virtual_interface_get_by_ip_regexp(context, regexp):
+    """Get the vifs with a fixed or floating ip that may match regexp.
+
+    The regexp is narrowed down to a LIKE on the indexed address columns,
+    an equality when it is an exact address.  The dots of a dotted quad
+    such as 10.0.0.1 are taken literally, so the whole prefix is used;
+    callers still apply the regexp to the result.  Returns None if it
+    can't be translated, in which case every vif is a candidate.
+    """
+    if _DOTTED_QUAD_RE.match(regexp):
+        regexp = regexp.replace('.', '\\.')
+    like = _regexp_to_like(regexp)
+    if like is None:
+        return None
+
+    def _match(column):
+        if not set(like) & set('!%_'):
+            return column == like
+        return column.like(like, escape='!')
+
+    session = get_session()
+    fixed_ip = models.FixedIp
+    floating_ip = models.FloatingIp
+    fixed_rows = session.query(fixed_ip.virtual_interface_id).\
+                         filter(_match(fixed_ip.address)).\
+                         filter(fixed_ip.deleted == False).\
+                         all()
+    floating_rows = session.query(fixed_ip.virtual_interface_id).\
+                            filter(_match(floating_ip.address)).\
+                            filter(floating_ip.fixed_ip_id == fixed_ip.id).\
+                            filter(floating_ip.deleted == False).\
+                            filter(fixed_ip.deleted == False).\
+                            all()
+    vif_ids = set([row[0] for row in fixed_rows + floating_rows
+                   if row[0] is not None])
+    if not vif_ids:
+        return []
+    return session.query(models.VirtualInterface).\
+                   filter(models.VirtualInterface.id.in_(vif_ids)).\
+                   options(joinedload('network')).\
+                   options(joinedload_all('fixed_ips.floating_ips')).\
+                   order_by(models.VirtualInterface.id).\
+                   all()
+
+
 ###################
 
 
@@ -1113,6 +1228,57 @@ def instance_create(context, values):
     return instance_ref
 
 
+@require_context
+def instance_create_many(context, values_list, security_group_ids=None,
+                         block_device_mappings=None):
+    """Create several Instance records in a single transaction.
+
+    context - request context object
+    values_list - list of dicts containing column values, one per instance.
+    security_group_ids - ids of the security groups every instance joins.
+    block_device_mappings - BlockDeviceMapping values, minus the
+                            instance_id, every instance gets.
+    """
+    session = get_session()
+    instance_refs = []
+    with session.begin():
+        security_groups = []
+        if security_group_ids:
+            query = session.query(models.SecurityGroup).\
+                            filter(models.SecurityGroup.id.in_(
+                                    security_group_ids)).\
+                            filter_by(deleted=False)
+            if is_user_context(context):
+                query = query.filter_by(project_id=context.project_id)
+            security_groups = query.all()
+            missing = set(security_group_ids) - \
+                      set([group.id for group in security_groups])
+            if missing:
+                raise exception.SecurityGroupNotFound(
+                        security_group_id=missing.pop())
+
+        for values in values_list:
+            values = dict(values)
+            values['metadata'] = _metadata_refs(values.get('metadata'),
+                                                models.InstanceMetadata)
+            instance_ref = models.Instance()
+            instance_ref['uuid'] = str(utils.gen_uuid())
+            instance_ref.update(values)
+            instance_ref.security_groups = list(security_groups)
+            session.add(instance_ref)
+            instance_refs.append(instance_ref)
+        # Flush to get the instance ids for the block device mappings.
+        session.flush()
+
+        for instance_ref in instance_refs:
+            for bdm_values in block_device_mappings or []:
+                bdm_ref = models.BlockDeviceMapping()
+                bdm_ref.update(bdm_values)
+                bdm_ref['instance_id'] = instance_ref['id']
+                session.add(bdm_ref)
+    return instance_refs
+
+
 @require_admin_context
 def instance_data_get_for_project(context, project_id):
     session = get_session()
@@ -1221,24 +1387,99 @@ def instance_get_all(context):
                    all()
 
 
+def _regexp_to_like(pattern):
+    """Translate a regexp into an equivalent LIKE pattern, if possible.
+
+    Filters are applied with re.match(), so patterns are implicitly
+    anchored at the start.  Only literals, escaped punctuation, '.', '.*',
+    '.+' and a trailing '$' are translated; anything else returns None
+    and is left to the python regexp filter.
+    """
+    like = []
+    anchored = False
+    i = 0
+    if pattern.startswith('^'):
+        i = 1
+    while i < len(pattern):
+        c = pattern[i]
+        nxt = pattern[i + 1] if i + 1 < len(pattern) else None
+        if c == '\\':
+            if nxt is None or nxt.isalnum():
+                return None
+            c = nxt
+            i += 1
+        elif c == '.':
+            if nxt == '*':
+                like.append('%')
+                i += 2
+                continue
+            elif nxt == '+':
+                like.append('_%')
+                i += 2
+                continue
+            elif nxt in ('?', '{'):
+                return None
+            like.append('_')
+            i += 1
+            continue
+        elif c == '$' and nxt is None:
+            anchored = True
+            break
+        elif c in '[](){}|?*+^$':
+            return None
+        if c in '!%_':
+            like.append('!')
+        like.append(c)
+        i += 1
+    if not like:
+        return None
+    if not anchored and like[-1] != '%':
+        like.append('%')
+    return ''.join(like)
+
+
+def _instance_column(filter_name):
+    """Return the string column of Instance named filter_name, or None."""
+    column = models.Instance.__table__.columns.get(filter_name)
+    if column is not None and isinstance(column.type, String):
+        return getattr(models.Instance, filter_name)
+    return None
+
+
+def _instance_marker_position(query, marker):
+    """Return the (created_at, id) of the instance marker in query.
+
+    The marker is the id of the last instance of the previous page, and
+    query should be scoped like the listing so other projects' instances
+    are not found.
+    """
+    marker_ref = query.filter_by(id=marker).first()
+    if not marker_ref:
+        raise exception.MarkerNotFound(marker=marker)
+    return (marker_ref.created_at, marker_ref.id)
+
+
+def _instance_paginate_query(query, limit, position):
+    """Apply a (created_at, id) keyset position and limit to query."""
+    if position is not None:
+        created_at = models.Instance.created_at
+        query = query.filter(or_(created_at < position[0],
+                                 and_(created_at == position[0],
+                                      models.Instance.id < position[1])))
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
 @require_context
-def instance_get_all_by_filters(context, filters):
+def instance_get_all_by_filters(context, filters, limit=None, marker=None):
     """Return instances that match all filters.  Deleted instances
     will be returned by default, unless there's a filter that says
-    otherwise"""
-
-    def _regexp_filter_by_metadata(instance, meta):
-        inst_metadata = [{node['key']: node['value']} \
-                         for node in instance['metadata']]
-        if isinstance(meta, list):
-            for node in meta:
-                if node not in inst_metadata:
-                    return False
-        elif isinstance(meta, dict):
-            for k, v in meta.iteritems():
-                if {k: v} not in inst_metadata:
-                    return False
-        return True
+    otherwise.
+
+    Instances are returned newest first.  If limit is given at most that
+    many instances are returned, starting after the instance whose id is
+    marker."""
 
     def _regexp_filter_by_column(instance, filter_name, filter_re):
         try:
@@ -1261,19 +1502,40 @@ def instance_get_all_by_filters(context, filters):
             filter_dict[column] = value
             return query.filter_by(**filter_dict)
 
-    session = get_session()
+    def _metadata_filter(query, meta):
+        """Match every key/value pair with an EXISTS subquery."""
+        if isinstance(meta, dict):
+            meta = [meta]
+        for node in meta:
+            for k, v in node.iteritems():
+                # NOTE: an explicit EXISTS per pair, since several
+                #       metadata.any() clauses clone the bind parameter of
+                #       the relationship's deleted criterion and conflict.
+                query = query.filter(exists().where(and_(
+                        models.InstanceMetadata.instance_id ==
+                                models.Instance.id,
+                        models.InstanceMetadata.deleted == False,
+                        models.InstanceMetadata.key == k,
+                        models.InstanceMetadata.value == v)))
+        return query
+
+    session = get_session()
+    # The marker is looked up with the same project and deleted scoping
+    # as the listing itself.
+    marker_query = session.query(models.Instance)
     query_prefix = session.query(models.Instance).\
                    options(joinedload('security_groups')).\
                    options(joinedload('metadata')).\
                    options(joinedload('instance_type')).\
-                   order_by(desc(models.Instance.created_at))
+                   order_by(desc(models.Instance.created_at)).\
+                   order_by(desc(models.Instance.id))
 
     # Make a copy of the filters dictionary to use going forward, as we'll
     # be modifying it and we shouldn't affect the caller's use of it.
     filters = filters.copy()
 
     if 'changes-since' in filters:
-        changes_since = filters['changes-since']
+        changes_since = filters.pop('changes-since')
         query_prefix = query_prefix.\
                             filter(models.Instance.updated_at > changes_since)
 
@@ -1283,11 +1545,11 @@ def instance_get_all_by_filters(context, filters):
         if filters.pop('deleted'):
             deleted = or_(models.Instance.deleted == True,
                           models.Instance.vm_state == vm_states.SOFT_DELETE)
-            query_prefix = query_prefix.filter(deleted)
         else:
-            query_prefix = query_prefix.\
-                    filter_by(deleted=False).\
-                    filter(models.Instance.vm_state != vm_states.SOFT_DELETE)
+            deleted = and_(models.Instance.deleted == False,
+                           models.Instance.vm_state != vm_states.SOFT_DELETE)
+        query_prefix = query_prefix.filter(deleted)
+        marker_query = marker_query.filter(deleted)
 
     if not context.is_admin:
         # If we're not admin context, add appropriate filter..
@@ -1307,34 +1569,57 @@ def instance_get_all_by_filters(context, filters):
     for filter_name in query_filters:
         # Do the matching and remove the filter from the dictionary
         # so we don't try it again below..
-        query_prefix = _exact_match_filter(query_prefix, filter_name,
-                filters.pop(filter_name))
-
-    instances = query_prefix.all()
-    if not instances:
-        return []
-
-    # Now filter on everything else for regexp matching..
-    # For filters not in the list, we'll attempt to use the filter_name
-    # as a column name in Instance..
-    regexp_filter_funcs = {}
-
-    for filter_name in filters.iterkeys():
-        filter_func = regexp_filter_funcs.get(filter_name, None)
-        filter_re = re.compile(str(filters[filter_name]))
-        if filter_func:
-            filter_l = lambda instance: filter_func(instance, filter_re)
-        elif filter_name == 'metadata':
-            filter_l = lambda instance: _regexp_filter_by_metadata(instance,
-                    filters[filter_name])
-        else:
-            filter_l = lambda instance: _regexp_filter_by_column(instance,
-                    filter_name, filter_re)
-        instances = filter(filter_l, instances)
-        if not instances:
+        value = filters.pop(filter_name)
+        query_prefix = _exact_match_filter(query_prefix, filter_name, value)
+        if filter_name in ('project_id', 'user_id'):
+            marker_query = _exact_match_filter(marker_query, filter_name,
+                                               value)
+
+    if 'metadata' in filters:
+        query_prefix = _metadata_filter(query_prefix, filters.pop('metadata'))
+
+    # Regexp filters on string columns are narrowed down with LIKE where
+    # the pattern allows it.  LIKE is case insensitive on some backends,
+    # so the regexp is still applied to the (much smaller) result below.
+    regexp_filters = []
+    for filter_name, value in filters.iteritems():
+        if not hasattr(models.Instance, filter_name):
+            # Options such as 'ip' or 'local_zone_only' never filter here.
+            continue
+        pattern = str(value)
+        column = _instance_column(filter_name)
+        like = _regexp_to_like(pattern) if column is not None else None
+        if like is not None:
+            query_prefix = query_prefix.filter(column.like(like, escape='!'))
+        regexp_filters.append((filter_name, re.compile(pattern)))
+
+    def _regexp_filter(instances):
+        for filter_name, filter_re in regexp_filters:
+            instances = [instance for instance in instances
+                         if _regexp_filter_by_column(instance, filter_name,
+                                                     filter_re)]
+        return instances
+
+    position = None
+    if marker is not None:
+        position = _instance_marker_position(marker_query, marker)
+
+    if not regexp_filters or limit is None:
+        query = _instance_paginate_query(query_prefix, limit, position)
+        return _regexp_filter(query.all())
+
+    # The python filters may drop rows, so walk the index in pages until
+    # enough instances match, carrying the last row's position forward.
+    page_size = max(limit, _INSTANCE_FILTER_PAGE_SIZE)
+    instances = []
+    while len(instances) < limit:
+        page = _instance_paginate_query(query_prefix, page_size,
+                                        position).all()
+        instances.extend(_regexp_filter(page))
+        if len(page) < page_size:
             break
-
-    return instances
+        position = (page[-1]['created_at'], page[-1]['id'])
+    return instances[:limit]
 
 
 @require_context
@@ -1440,6 +1725,18 @@ def instance_get_all_by_reservation(context, reservation_id):
                 all()
 
 
+@require_context
+def instance_get_by_fixed_ip(context, address):
+    session = get_session()
+    result = _build_instance_get(context, session=session).\
+                     join(models.Instance.fixed_ips).\
+                     filter(models.FixedIp.address == address).\
+                     first()
+    if not result:
+        raise exception.FixedIpNotFoundForAddress(address=address)
+    return result
+
+
 @require_admin_context
 def instance_get_project_vpn(context, project_id):
     session = get_session()
@@ -1525,6 +1822,36 @@ def instance_update(context, instance_id, values):
         return instance_ref
 
 
+@require_context
+def instance_update_many(context, updates):
+    session = get_session()
+    with session.begin():
+        instance_refs = _build_instance_get(context, session=session).\
+                filter(models.Instance.id.in_(updates.keys())).\
+                order_by(models.Instance.id).\
+                all()
+        for instance_ref in instance_refs:
+            instance_ref.update(updates[instance_ref['id']])
+    return instance_refs
+
+
+@require_context
+def instance_update_power_states(context, power_states):
+    if not power_states:
+        return 0
+    # NOTE: one UPDATE ... SET power_state = CASE id WHEN ... END for all
+    #       of the instances, instead of a round trip for each.
+    new_power_state = case(power_states.items(), value=models.Instance.id)
+    session = get_session()
+    with session.begin():
+        return session.query(models.Instance).\
+                filter(models.Instance.id.in_(power_states.keys())).\
+                filter_by(deleted=can_read_deleted(context)).\
+                update({'power_state': new_power_state,
+                        'updated_at': utils.utcnow()},
+                       synchronize_session=False)
+
+
 def instance_add_security_group(context, instance_id, security_group_id):
     """Associate the given security group with the given instance"""
     session = get_session()
@@ -2624,6 +2951,20 @@ def block_device_mapping_get_all_by_instance(context, instance_id):
     return result
 
 
+@require_context
+def block_device_mapping_get_all_by_instances(context, instance_ids):
+    if not instance_ids:
+        return []
+    session = get_session()
+    return session.query(models.BlockDeviceMapping).\
+                   options(joinedload('volume')).\
+                   filter(models.BlockDeviceMapping.instance_id.in_(
+                          instance_ids)).\
+                   filter_by(deleted=False).\
+                   order_by(models.BlockDeviceMapping.id).\
+                   all()
+
+
 @require_context
 def block_device_mapping_destroy(context, bdm_id):
     session = get_session()
@@ -2724,6 +3065,28 @@ def security_group_get_by_instance(context, instance_id):
                    all()
 
 
+@require_admin_context
+def security_group_get_member_addresses(context, security_group_ids):
+    session = get_session()
+    association = models.SecurityGroupInstanceAssociation
+    fixed_ip = models.FixedIp
+    rows = session.query(association.security_group_id, fixed_ip.address).\
+                   filter(association.security_group_id.in_(
+                           security_group_ids)).\
+                   filter(association.deleted == False).\
+                   filter(models.Instance.id == association.instance_id).\
+                   filter(models.Instance.deleted == False).\
+                   filter(fixed_ip.instance_id == association.instance_id).\
+                   filter(fixed_ip.deleted == False).\
+                   order_by(association.instance_id, fixed_ip.id).\
+                   all()
+    result = dict((security_group_id, [])
+                  for security_group_id in security_group_ids)
+    for security_group_id, address in rows:
+        result[security_group_id].append(address)
+    return result
+
+
 @require_context
 def security_group_exists(context, project_id, group_name):
     try:
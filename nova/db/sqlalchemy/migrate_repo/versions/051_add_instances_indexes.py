@@ -0,0 +1,63 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+from nova import log as logging
+
+meta = MetaData()
+
+# Indexes backing instance_get_all_by_filters: tenant listings ordered by
+# created_at, per-host lookups, reservation and uuid lookups.
+INDEXES = [
+    ('instances_project_id_deleted_created_at_idx',
+     ('project_id', 'deleted', 'created_at')),
+    ('instances_host_deleted_idx', ('host', 'deleted')),
+    ('instances_reservation_id_idx', ('reservation_id',)),
+    ('instances_uuid_idx', ('uuid',)),
+]
+
+
+def _indexes(instances):
+    return [Index(name, *[instances.c[column] for column in columns])
+            for name, columns in INDEXES]
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine;
+    # bind migrate_engine to your metadata
+    meta.bind = migrate_engine
+    instances = Table('instances', meta, autoload=True)
+
+    for index in _indexes(instances):
+        try:
+            index.create(migrate_engine)
+        except Exception:
+            logging.error(_("Index %s couldn't be created") % index.name)
+            raise
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    meta.bind = migrate_engine
+    instances = Table('instances', meta, autoload=True)
+
+    for index in _indexes(instances):
+        try:
+            index.drop(migrate_engine)
+        except Exception:
+            logging.error(_("Index %s couldn't be dropped") % index.name)
+            raise
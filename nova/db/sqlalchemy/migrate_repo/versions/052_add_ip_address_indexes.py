@@ -0,0 +1,60 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index, MetaData, Table
+
+from nova import log as logging
+
+meta = MetaData()
+
+# Indexes backing exact and prefix lookups of instances by ip address.
+INDEXES = [
+    ('fixed_ips', 'fixed_ips_address_idx', ('address',)),
+    ('floating_ips', 'floating_ips_address_idx', ('address',)),
+]
+
+
+def _indexes():
+    indexes = []
+    for table_name, name, columns in INDEXES:
+        table = Table(table_name, meta, autoload=True)
+        indexes.append(Index(name, *[table.c[column] for column in columns]))
+    return indexes
+
+
+def upgrade(migrate_engine):
+    # Upgrade operations go here. Don't create your own engine;
+    # bind migrate_engine to your metadata
+    meta.bind = migrate_engine
+
+    for index in _indexes():
+        try:
+            index.create(migrate_engine)
+        except Exception:
+            logging.error(_("Index %s couldn't be created") % index.name)
+            raise
+
+
+def downgrade(migrate_engine):
+    # Operations to reverse the above upgrade go here.
+    meta.bind = migrate_engine
+
+    for index in _indexes():
+        try:
+            index.drop(migrate_engine)
+        except Exception:
+            logging.error(_("Index %s couldn't be dropped") % index.name)
+            raise
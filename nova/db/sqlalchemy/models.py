@@ -655,7 +655,7 @@ class VirtualInterface(BASE, NovaBase):
         if cidr_v6 is None:
             ipv6_address = None
         else:
-            project_id = self.instance.project_id
+            project_id = self.network.project_id
             mac = self.address
             ipv6_address = ipv6.to_global(cidr_v6, mac, project_id)
 
@@ -238,6 +238,11 @@ class InvalidCidr(Invalid):
     message = _("Invalid cidr %(cidr)s.")
 
 
+class InvalidIpFilter(Invalid):
+    message = _("IP filter %(ip_filter)s needs a scan of every interface, "
+                "only admins may use it.")
+
+
 # Cannot be templated as the error syntax varies.
 # msg needs to be constructed when raised.
 class InvalidParameterValue(Invalid):
@@ -332,6 +337,11 @@ class ImageUnacceptable(Invalid):
     message = _("Image %(image_id)s is unacceptable") + ": %(reason)s"
 
 
+class ImageChecksumMismatch(Invalid):
+    message = _("Image %(image_id)s has checksum %(checksum)s, expected"
+                " %(expected)s")
+
+
 class InstanceUnacceptable(Invalid):
     message = _("Instance %(instance_id)s is unacceptable") + ": %(reason)s"
 
@@ -355,6 +365,10 @@ class InstanceNotFound(NotFound):
     message = _("Instance %(instance_id)s could not be found.")
 
 
+class MarkerNotFound(NotFound):
+    message = _("Marker %(marker)s could not be found.")
+
+
 class VolumeNotFound(NotFound):
     message = _("Volume %(volume_id)s could not be found.")
 
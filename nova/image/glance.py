@@ -21,6 +21,7 @@ from __future__ import absolute_import
 
 import copy
 import datetime
+import hashlib
 import json
 import random
 from urlparse import urlparse
@@ -229,16 +230,28 @@ class GlanceImageService(object):
         raise exception.ImageNotFound(image_id=name)
 
     def get(self, context, image_id, data):
-        """Calls out to Glance for metadata and data and writes data."""
+        """Calls out to Glance for metadata and data and writes data.
+
+        :raises: ImageChecksumMismatch if the data does not match the
+                 checksum Glance recorded for the image.
+
+        """
         try:
             client = self._get_client(context)
             image_meta, image_chunks = client.get_image(image_id)
         except glance_exception.NotFound:
             raise exception.ImageNotFound(image_id=image_id)
 
+        checksum = hashlib.md5()
         for chunk in image_chunks:
+            checksum.update(chunk)
             data.write(chunk)
 
+        expected = image_meta.get('checksum')
+        if expected and checksum.hexdigest() != expected:
+            raise exception.ImageChecksumMismatch(image_id=image_id,
+                    checksum=checksum.hexdigest(), expected=expected)
+
         base_image_meta = self._translate_from_glance(image_meta)
         return base_image_meta
 
@@ -47,12 +47,19 @@ level(FlatNetwork vs VlanNetwork), and different implementations at the driver
 level(LinuxNetDriver vs CiscoNetDriver).
 
 Managers will often provide methods for initial setup of a host or periodic
-tasksto a wrapping service.
+tasks to a wrapping service.  Periodic tasks are methods decorated with
+:func:`periodic_task`, and each has its own interval and timeout.
 
 This module provides Manager, a base class for managers.
 
 """
 
+import random
+import time
+
+from eventlet import greenthread
+from eventlet import timeout as eventlet_timeout
+
 from nova import flags
 from nova import log as logging
 from nova import utils
@@ -66,16 +73,156 @@ FLAGS = flags.FLAGS
 LOG = logging.getLogger('nova.manager')
 
 
+def periodic_task(*args, **kwargs):
+    """Decorator that makes a manager method a periodic task.
+
+    Use as @periodic_task or with keyword arguments:
+
+    :param interval: seconds between runs.  Without one, the task runs
+                     every time the service runs periodic tasks.
+    :param jitter: the task sleeps a random number of seconds up to this
+                   before each run, to spread runs across hosts.
+    :param timeout: a run that takes longer than this many seconds is
+                    interrupted.
+
+    interval, jitter and timeout may also name the flag that holds them.
+
+    The method is called with a context.  Each task runs in its own
+    greenthread, and is skipped while a previous run is still going.
+
+    """
+    def decorator(f):
+        f._periodic_task = True
+        f._periodic_interval = kwargs.get('interval')
+        f._periodic_jitter = kwargs.get('jitter', 0)
+        f._periodic_timeout = kwargs.get('timeout')
+        return f
+
+    if args:
+        return decorator(args[0])
+    return decorator
+
+
+def _flag_or_value(value):
+    if isinstance(value, basestring):
+        return FLAGS[value].value
+    return value
+
+
+class ManagerMeta(type):
+    """Collects the periodic tasks of a manager class and its bases."""
+
+    def __init__(cls, names, bases, dict_):
+        super(ManagerMeta, cls).__init__(names, bases, dict_)
+        cls._periodic_tasks = []
+        for name in sorted(dir(cls)):
+            value = getattr(cls, name, None)
+            if getattr(value, '_periodic_task', False):
+                cls._periodic_tasks.append((name,
+                                            value._periodic_interval,
+                                            value._periodic_jitter,
+                                            value._periodic_timeout))
+
+
 class Manager(base.Base):
+    __metaclass__ = ManagerMeta
+
     def __init__(self, host=None, db_driver=None):
         if not host:
             host = FLAGS.host
         self.host = host
+        self._periodic_state = dict((name, {'thread': None,
+                                            'next_run': 0})
+                                    for name, _i, _j, _t
+                                    in self._periodic_tasks)
+        self._periodic_stats = dict((name, {'runs': 0,
+                                            'errors': 0,
+                                            'timeouts': 0,
+                                            'skips': 0,
+                                            'last_duration': 0.0,
+                                            'max_duration': 0.0,
+                                            'total_duration': 0.0})
+                                    for name, _i, _j, _t
+                                    in self._periodic_tasks)
+        self._periodic_cache = {}
         super(Manager, self).__init__(db_driver)
 
-    def periodic_tasks(self, context=None):
-        """Tasks to be run at a periodic interval."""
-        pass
+    def periodic_tasks(self, context=None, wait=True):
+        """Start the periodic tasks that are due.
+
+        If wait is True, wait for the tasks that were started and return
+        the exceptions they raised.
+
+        """
+        now = time.time()
+        self._periodic_cache = {}
+        threads = []
+        for name, interval, jitter, timeout in self._periodic_tasks:
+            state = self._periodic_state[name]
+            if now < state['next_run']:
+                continue
+            if state['thread'] is not None:
+                self._periodic_stats[name]['skips'] += 1
+                LOG.warning(_("Skipping periodic task %s, its last run has"
+                              " not finished"), name)
+                continue
+            state['next_run'] = now + (_flag_or_value(interval) or 0)
+            state['thread'] = greenthread.spawn(self._run_periodic_task,
+                                                context, name, jitter,
+                                                timeout)
+            threads.append(state['thread'])
+
+        if wait:
+            errors = [thread.wait() for thread in threads]
+            return [error for error in errors if error is not None]
+
+    def _run_periodic_task(self, context, name, jitter, timeout):
+        stats = self._periodic_stats[name]
+        jitter = _flag_or_value(jitter)
+        timeout = _flag_or_value(timeout) or None
+        try:
+            if jitter:
+                greenthread.sleep(random.uniform(0, jitter))
+            start = time.time()
+            try:
+                with eventlet_timeout.Timeout(timeout):
+                    getattr(self, name)(context)
+            except eventlet_timeout.Timeout as ex:
+                stats['timeouts'] += 1
+                LOG.warning(_("Periodic task %(name)s timed out after"
+                              " %(timeout)s seconds") % locals())
+                return ex
+            except Exception as ex:
+                stats['errors'] += 1
+                LOG.warning(_("Error during periodic task %(name)s: %(ex)s"),
+                            {'name': name, 'ex': unicode(ex)})
+                return ex
+            finally:
+                duration = time.time() - start
+                stats['runs'] += 1
+                stats['last_duration'] = duration
+                stats['max_duration'] = max(stats['max_duration'], duration)
+                stats['total_duration'] += duration
+                LOG.debug(_("Periodic task %(name)s took %(duration).3fs") %
+                          locals())
+        finally:
+            self._periodic_state[name]['thread'] = None
+
+    def _periodic_cached(self, key, f, *args, **kwargs):
+        """Return f(*args, **kwargs), called once per periodic cycle.
+
+        Periodic tasks that need the same data, such as the instances on
+        this host, share one copy of it per cycle.
+
+        """
+        if key not in self._periodic_cache:
+            self._periodic_cache[key] = greenthread.spawn(f, *args, **kwargs)
+        return self._periodic_cache[key].wait()
+
+    def get_periodic_task_stats(self):
+        """Return the run count and timings of each periodic task."""
+        return dict((name, dict(stats))
+                    for name, stats in self._periodic_stats.iteritems())
 
     def init_host(self):
         """Handle initialization if this is a standalone service.
@@ -105,11 +252,10 @@ class SchedulerDependentManager(Manager):
         """Remember these capabilities to send on next periodic update."""
         self.last_capabilities = capabilities
 
-    def periodic_tasks(self, context=None):
+    @periodic_task
+    def _publish_service_capabilities(self, context):
         """Pass data back to the scheduler at a periodic interval."""
         if self.last_capabilities:
             LOG.debug(_('Notifying Schedulers of capabilities ...'))
             api.update_service_capabilities(context, self.service_name,
                                 self.host, self.last_capabilities)
-
-        super(SchedulerDependentManager, self).periodic_tasks(context)
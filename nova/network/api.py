@@ -226,6 +226,21 @@ class API(base.Base):
                 raise exception.InstanceNotFound(instance_id=instance['id'])
             raise
 
+    def get_addresses_by_instances(self, context, instances):
+        """Returns the addresses of many instances with a single call.
+
+        :returns: dict of instance id to a dict with the instance's fixed
+                  ips, ip6s and floating_ips
+        """
+        if not instances:
+            return {}
+        args = {'instance_ids': [instance['id'] for instance in instances]}
+        addresses = rpc.call(context, FLAGS.network_topic,
+                             {'method': 'get_addresses_by_instances',
+                              'args': args})
+        return dict((address['instance_id'], address)
+                    for address in addresses)
+
     def validate_networks(self, context, requested_networks):
         """validate the networks passed at the time of creating
         the server
@@ -240,6 +255,14 @@ class API(base.Base):
         {'instance_uuid': uuid, 'ip': ip} that matched the ip_filter
         """
         args = {'filters': filters}
-        return rpc.call(context, FLAGS.network_topic,
-                        {'method': 'get_instance_uuids_by_ip_filter',
-                         'args': args})
+        try:
+            return rpc.call(context, FLAGS.network_topic,
+                            {'method': 'get_instance_uuids_by_ip_filter',
+                             'args': args})
+        # NOTE: see get_instance_nw_info for why the remote exception is
+        #       recreated from its class name.
+        except rpc_common.RemoteError as err:
+            if err.exc_type == 'InvalidIpFilter':
+                ip_filter = filters.get('ip6') or filters.get('ip')
+                raise exception.InvalidIpFilter(ip_filter=ip_filter)
+            raise
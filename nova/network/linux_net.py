@@ -70,6 +70,10 @@ flags.DEFINE_bool('send_arp_for_ha', False,
 flags.DEFINE_bool('use_single_default_gateway',
                    False, 'Use single default gateway. Only first nic of vm'
                           ' will get default gateway from dhcp server')
+flags.DEFINE_bool('iptables_incremental_apply', False,
+                  'Only rewrite the wrapped iptables chains that changed '
+                  'since the last apply, instead of saving and restoring '
+                  'whole tables')
 binary_name = os.path.basename(inspect.stack()[-1][1])
 
 
@@ -111,6 +115,11 @@ class IptablesTable(object):
         self.rules = []
         self.chains = set()
         self.unwrapped_chains = set()
+        # (name, wrap) of chains changed since the last apply, and the
+        # names of wrapped chains removed since then.
+        self.dirty_chains = set()
+        self.removed_chains = set()
+        self.applied = False
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -126,8 +135,10 @@ class IptablesTable(object):
         """
         if wrap:
             self.chains.add(name)
+            self.removed_chains.discard(name)
         else:
             self.unwrapped_chains.add(name)
+        self.dirty_chains.add((name, wrap))
 
     def remove_chain(self, name, wrap=True):
         """Remove named chain.
@@ -149,6 +160,11 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        if wrap:
+            self.dirty_chains.discard((name, wrap))
+            self.removed_chains.add(name)
+        else:
+            self.dirty_chains.add((name, wrap))
         self.rules = filter(lambda r: r.chain != name, self.rules)
 
         if wrap:
@@ -156,7 +172,13 @@ class IptablesTable(object):
         else:
             jump_snippet = '-j %s' % (name,)
 
-        self.rules = filter(lambda r: jump_snippet not in r.rule, self.rules)
+        rules = []
+        for rule in self.rules:
+            if jump_snippet in rule.rule:
+                self.dirty_chains.add((rule.chain, rule.wrap))
+            else:
+                rules.append(rule)
+        self.rules = rules
 
     def add_rule(self, chain, rule, wrap=True, top=False):
         """Add a rule to the table.
@@ -176,6 +198,7 @@ class IptablesTable(object):
             rule = ' '.join(map(self._wrap_target_chain, rule.split(' ')))
 
         self.rules.append(IptablesRule(chain, rule, wrap, top))
+        self.dirty_chains.add((chain, wrap))
 
     def _wrap_target_chain(self, s):
         if s.startswith('$'):
@@ -192,6 +215,7 @@ class IptablesTable(object):
         """
         try:
             self.rules.remove(IptablesRule(chain, rule, wrap, top))
+            self.dirty_chains.add((chain, wrap))
         except ValueError:
             LOG.debug(_('Tried to remove rule that was not there:'
                         ' %(chain)r %(rule)r %(wrap)r %(top)r'),
@@ -204,6 +228,21 @@ class IptablesTable(object):
                               if rule.chain == chain and rule.wrap == wrap]
         for rule in chained_rules:
             self.rules.remove(rule)
+        if chained_rules:
+            self.dirty_chains.add((chain, wrap))
+
+    def pop_changes(self):
+        """Return and forget the chains changed since the last call."""
+        changes = (self.dirty_chains, self.removed_chains)
+        self.dirty_chains = set()
+        self.removed_chains = set()
+        return changes
+
+    def restore_changes(self, changes):
+        """Put back changes returned by pop_changes that weren't applied."""
+        dirty_chains, removed_chains = changes
+        self.dirty_chains |= dirty_chains
+        self.removed_chains |= removed_chains
 
 
 class IptablesManager(object):
@@ -288,7 +327,11 @@ class IptablesManager(object):
         self.ipv4['nat'].add_chain('floating-snat')
         self.ipv4['nat'].add_rule('snat', '-j $floating-snat')
 
-    @utils.synchronized('iptables', external=True)
+        # apply() calls requested and completed so far, used to coalesce
+        # calls that queue up behind a running apply.
+        self.apply_requested = 0
+        self.apply_completed = 0
+
     def apply(self):
         """Apply the current in-memory set of iptables rules.
 
@@ -296,23 +339,90 @@ class IptablesManager(object):
         same component of Nova, and replace them with our current set of
         rules. This happens atomically, thanks to iptables-restore.
 
+        Calls that arrive while another apply is running wait for it and
+        are then served together by a single apply.
+
         """
+        self.apply_requested += 1
+        self._apply(self.apply_requested)
+
+    @utils.synchronized('iptables', external=True)
+    def _apply(self, request):
+        if self.apply_completed >= request:
+            # An apply that started after this request already ran.
+            return
+        requested = self.apply_requested
+
         s = [('iptables', self.ipv4)]
         if FLAGS.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
-            for table in tables:
-                current_table, _ = self.execute('%s-save' % (cmd,),
-                                                '-t', '%s' % (table,),
-                                                run_as_root=True,
-                                                attempts=5)
-                current_lines = current_table.split('\n')
-                new_filter = self._modify_rules(current_lines,
-                                                tables[table])
-                self.execute('%s-restore' % (cmd,), run_as_root=True,
-                             process_input='\n'.join(new_filter),
-                             attempts=5)
+            for table_name, table in tables.iteritems():
+                changes = table.pop_changes()
+                try:
+                    self._apply_table(cmd, table_name, table, changes)
+                except Exception:
+                    table.restore_changes(changes)
+                    raise
+                table.applied = True
+        self.apply_completed = requested
+
+    def _apply_table(self, cmd, table_name, table, changes):
+        dirty_chains, removed_chains = changes
+        incremental = (FLAGS.iptables_incremental_apply and table.applied and
+                       all(wrap for name, wrap in dirty_chains))
+        if not incremental:
+            current_table, _ = self.execute('%s-save' % (cmd,),
+                                            '-t', '%s' % (table_name,),
+                                            run_as_root=True,
+                                            attempts=5)
+            current_lines = current_table.split('\n')
+            new_filter = self._modify_rules(current_lines, table)
+            self.execute('%s-restore' % (cmd,), run_as_root=True,
+                         process_input='\n'.join(new_filter),
+                         attempts=5)
+        elif dirty_chains or removed_chains:
+            new_chains = self._modify_chains(table_name, table,
+                                             [name for name, wrap
+                                              in dirty_chains],
+                                             removed_chains)
+            self.execute('%s-restore' % (cmd,), '--noflush',
+                         run_as_root=True,
+                         process_input='\n'.join(new_chains),
+                         attempts=5)
+
+    def _modify_chains(self, table_name, table, chains, removed_chains):
+        """Return iptables-restore --noflush input that rewrites the given
+        wrapped chains and deletes the removed ones.
+
+        Declaring a user-defined chain flushes it, so each chain is
+        replaced as a whole; chains that are not listed are untouched.
+
+        """
+        chains = set(chains)
+        removed_chains = sorted(removed_chains)
+        lines = ['*%s' % (table_name,)]
+        lines += [':%s-%s - [0:0]' % (binary_name, name)
+                  for name in sorted(chains) + removed_chains]
+
+        seen_lines = set()
+        our_rules = []
+        # Duplicates are dropped letting the *last* occurrence take
+        # precedence, as in _modify_rules.
+        for rule in reversed(table.rules):
+            if not rule.wrap or rule.chain not in chains:
+                continue
+            rule_str = str(rule)
+            if rule_str not in seen_lines:
+                seen_lines.add(rule_str)
+                our_rules.append(rule_str)
+        our_rules.reverse()
+        lines += our_rules
+
+        lines += ['-X %s-%s' % (binary_name, name) for name in removed_chains]
+        lines.append('COMMIT')
+        return lines
 
     def _modify_rules(self, current_lines, table, binary=None):
         unwrapped_chains = table.unwrapped_chains
@@ -333,16 +443,14 @@ class IptablesManager(object):
                 if not rule.startswith(':'):
                     break
 
-        our_rules = []
-        for rule in rules:
-            rule_str = str(rule)
-            if rule.top:
-                # rule.top == True means we want this rule to be at the top.
-                # Further down, we weed out duplicates from the bottom of the
-                # list, so here we remove the dupes ahead of time.
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                                    new_filter)
-            our_rules += [rule_str]
+        # rule.top == True means we want this rule to be at the top.
+        # Further down, we weed out duplicates from the bottom of the
+        # list, so here we remove the dupes ahead of time.
+        top_rules = set(str(rule).strip() for rule in rules if rule.top)
+        if top_rules:
+            new_filter = [line for line in new_filter
+                          if line.strip() not in top_rules]
+        our_rules = [str(rule) for rule in rules]
 
         new_filter[rules_index:rules_index] = our_rules
 
@@ -317,6 +317,11 @@ class FloatingIP(object):
                                                                 fixed_address)
         return [floating_ip['address'] for floating_ip in floating_ips]
 
+    def _get_floating_addresses(self, fixed_ip):
+        """Returns the floating IPs of a fixed_ip with floating_ips loaded"""
+        return [floating_ip['address']
+                for floating_ip in fixed_ip['floating_ips']]
+
 
 class NetworkManager(manager.SchedulerDependentManager):
     """Implements common network manager functionality.
@@ -379,9 +384,8 @@ class NetworkManager(manager.SchedulerDependentManager):
         for network in self.db.network_get_all_by_host(ctxt, self.host):
             self._setup_network(ctxt, network)
 
-    def periodic_tasks(self, context=None):
-        """Tasks to be run at a periodic interval."""
-        super(NetworkManager, self).periodic_tasks(context)
+    @manager.periodic_task
+    def _disassociate_stale_fixed_ips(self, context):
         if self.timeout_fixed_ips:
             now = utils.utcnow()
             timeout = FLAGS.fixed_ip_disassociate_timeout
@@ -414,6 +418,9 @@ class NetworkManager(manager.SchedulerDependentManager):
         #                floating ips MUST override this or use the Mixin
         return []
 
+    def _get_floating_addresses(self, fixed_ip):
+        return []
+
     def get_vifs_by_instance(self, context, instance_id):
         vifs = self.db.virtual_interface_get_by_instance(context,
                                                          instance_id)
@@ -424,11 +431,7 @@ class NetworkManager(manager.SchedulerDependentManager):
         ip_filter = re.compile(str(filters.get('ip')))
         ipv6_filter = re.compile(str(filters.get('ip6')))
 
-        # NOTE(jkoelker) Should probably figure out a better way to do
-        #                this. But for now it "works", this could suck on
-        #                large installs.
-
-        vifs = self.db.virtual_interface_get_all(context)
+        vifs = self._get_vifs_by_ip_filter(context, filters)
         results = []
 
         for vif in vifs:
@@ -467,6 +470,66 @@ class NetworkManager(manager.SchedulerDependentManager):
             res['instance_uuid'] = uuid_map.get(res['instance_id'])
         return results
 
+    def _get_vifs_by_ip_filter(self, context, filters):
+        """Return the vifs that may match an ip filter.
+
+        Exact and prefix ipv4 filters are looked up through the address
+        indexes of fixed_ips and floating_ips, exact ipv6 addresses through
+        the mac they are built from.  Any other filter needs a scan of every
+        vif in the cloud, which only admins may ask for.
+        """
+        patterns = []
+        if filters.get('fixed_ip'):
+            patterns.append('^%s$' % re.escape(filters['fixed_ip']))
+        if filters.get('ip'):
+            patterns.append(filters['ip'])
+
+        vifs = {}
+        for pattern in patterns:
+            vif_refs = self.db.virtual_interface_get_by_ip_regexp(context,
+                                                                  pattern)
+            if vif_refs is None:
+                return self._get_all_vifs(context, pattern)
+            for vif in vif_refs:
+                vifs[vif['id']] = vif
+
+        if filters.get('ip6'):
+            vif = self._get_vif_by_ipv6_filter(context, filters['ip6'])
+            if vif is False:
+                return self._get_all_vifs(context, filters['ip6'])
+            if vif:
+                vifs[vif['id']] = vif
+
+        return [vifs[vif_id] for vif_id in sorted(vifs)]
+
+    def _get_vif_by_ipv6_filter(self, context, ipv6_filter):
+        """Look up the vif of an exact ipv6 filter such as ^fe80::1$.
+
+        Returns False if the filter is not an exact address.
+        """
+        address = ipv6_filter.lstrip('^')
+        if not address.endswith('$') or not netaddr.valid_ipv6(address[:-1]):
+            return False
+        address = address[:-1]
+        vif = self.db.virtual_interface_get_by_address(context,
+                                                       ipv6.to_mac(address))
+        if not vif or vif['instance_id'] is None:
+            return None
+        network = vif['network']
+        if not network or not network['cidr_v6']:
+            return None
+        fixed_ipv6 = ipv6.to_global(network['cidr_v6'], vif['address'],
+                                    network['project_id'])
+        if netaddr.IPAddress(fixed_ipv6) != netaddr.IPAddress(address):
+            return None
+        return vif
+
+    def _get_all_vifs(self, context, ip_filter):
+        if not context.is_admin:
+            raise exception.InvalidIpFilter(ip_filter=ip_filter)
+        LOG.debug(_('Scanning every vif for ip filter %s'), ip_filter)
+        return self.db.virtual_interface_get_all(context)
+
     def _get_networks_for_instance(self, context, instance_id, project_id,
                                    requested_networks=None):
         """Determine & return which networks an instance should connect to."""
@@ -617,6 +680,42 @@ class NetworkManager(manager.SchedulerDependentManager):
             network_info.append((network_dict, info))
         return network_info
 
+    def get_addresses_by_instances(self, context, instance_ids):
+        """Returns the addresses of many instances in a few queries.
+
+        The addresses are the ones get_instance_nw_info and
+        get_floating_ips_by_fixed_address return for each instance.
+        :returns: list of dicts with instance_id, ips, ip6s and
+                  floating_ips; floating_ips follow the order of ips
+        """
+        addresses = {}
+        for instance_id in instance_ids:
+            addresses[instance_id] = {'instance_id': instance_id,
+                                      'ips': [],
+                                      'ip6s': [],
+                                      'floating_ips': []}
+        fixed_ips = {}
+        for fixed_ip in self.db.fixed_ip_get_by_instances(context,
+                                                          instance_ids):
+            fixed_ips.setdefault(fixed_ip['instance_id'], []).append(fixed_ip)
+
+        for vif in self.db.virtual_interface_get_by_instances(context,
+                                                              instance_ids):
+            network = vif['network']
+            if network is None:
+                continue
+            address = addresses[vif['instance_id']]
+            for fixed_ip in fixed_ips.get(vif['instance_id'], []):
+                if fixed_ip['network_id'] == network['id']:
+                    address['ips'].append(fixed_ip['address'])
+                    address['floating_ips'].extend(
+                            self._get_floating_addresses(fixed_ip))
+            if network['cidr_v6']:
+                address['ip6s'].append(ipv6.to_global(network['cidr_v6'],
+                                                      vif['address'],
+                                                      network['project_id']))
+        return addresses.values()
+
     def _allocate_mac_addresses(self, context, instance_id, networks):
         """Generates mac addresses and creates vif rows in db for them."""
         for network in networks:
@@ -898,15 +997,16 @@ class NetworkManager(manager.SchedulerDependentManager):
         top_reserved = self._top_reserved_ips
         project_net = netaddr.IPNetwork(network['cidr'])
         num_ips = len(project_net)
-        for index in range(num_ips):
-            address = str(project_net[index])
-            if index < bottom_reserved or num_ips - index < top_reserved:
-                reserved = True
-            else:
-                reserved = False
-            self.db.fixed_ip_create(context, {'network_id': network_id,
-                                              'address': address,
-                                              'reserved': reserved})
+
+        def fixed_ips():
+            for index, address in enumerate(project_net):
+                reserved = (index < bottom_reserved or
+                            num_ips - index < top_reserved)
+                yield {'network_id': network_id,
+                       'address': str(address),
+                       'reserved': reserved}
+
+        self.db.fixed_ip_create_many(context, fixed_ips())
 
     def _allocate_fixed_ips(self, context, instance_id, host, networks,
                             **kwargs):
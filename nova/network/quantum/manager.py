@@ -268,6 +268,30 @@ class QuantumManager(manager.FlatManager):
             network_info.append((network_dict, info))
         return network_info
 
+    def get_addresses_by_instances(self, context, instance_ids):
+        """Addresses live in quantum and the IPAM lib rather than in the
+           nova fixed_ips table, so build them from get_instance_nw_info
+           for each instance.
+        """
+        addresses = []
+        for instance_id in instance_ids:
+            ips = []
+            ip6s = []
+            for network, info in self.get_instance_nw_info(context,
+                                                           instance_id,
+                                                           None, None):
+                ips.extend([ip['ip'] for ip in info.get('ips', [])])
+                ip6s.extend([ip['ip'] for ip in info.get('ip6s', [])])
+            floating_ips = []
+            for ip in ips:
+                floating_ips.extend(
+                        self.get_floating_ips_by_fixed_address(context, ip))
+            addresses.append({'instance_id': instance_id,
+                              'ips': ips,
+                              'ip6s': ip6s,
+                              'floating_ips': floating_ips})
+        return addresses
+
     def deallocate_for_instance(self, context, **kwargs):
         """Called when a VM is terminated.  Loop through each virtual
            interface in the Nova DB and remove the Quantum port and
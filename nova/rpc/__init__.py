@@ -18,7 +18,7 @@
 
 
 from nova.utils import import_object
-from nova.rpc.common import RemoteError, LOG
+from nova.rpc.common import RemoteError, Timeout, LOG
 from nova import flags
 
 FLAGS = flags.FLAGS
@@ -8,6 +8,13 @@ flags.DEFINE_integer('rpc_thread_pool_size', 1024,
                              'Size of RPC thread pool')
 flags.DEFINE_integer('rpc_conn_pool_size', 30,
                              'Size of RPC connection pool')
+flags.DEFINE_integer('rpc_response_timeout', 600,
+                             'Seconds to wait for a response from a call or '
+                             'multicall (0 waits forever)')
+flags.DEFINE_list('rpc_topic_response_timeouts', ['scheduler:60'],
+                  'Per-topic overrides of rpc_response_timeout, as '
+                  'topic:seconds.  Deadlines travel with the message, so '
+                  'hosts need roughly synchronized clocks.')
 
 
 class RemoteError(exception.Error):
@@ -27,3 +34,9 @@ class RemoteError(exception.Error):
         super(RemoteError, self).__init__('%s %s\n%s' % (exc_type,
                                                          value,
                                                          traceback))
+
+
+class Timeout(exception.Error):
+    """Signifies that a timeout has occurred while waiting for a response
+    from a call or multicall."""
+    pass
@@ -24,21 +24,28 @@ import time
 import traceback
 import types
 import uuid
+import weakref
 
 import eventlet
 from eventlet import greenpool
 from eventlet import pools
+from eventlet import queue
+from eventlet import semaphore
 import greenlet
 
 from nova import context
 from nova import exception
 from nova import flags
-from nova.rpc.common import RemoteError, LOG
+from nova.rpc.common import RemoteError, Timeout, LOG
 
 # Needed for tests
 eventlet.monkey_patch()
 
 FLAGS = flags.FLAGS
+flags.DEFINE_boolean('amqp_rpc_single_reply_queue', False,
+                     'Receive replies to call/multicall on one reply queue '
+                     'per process instead of declaring a queue per call. '
+                     'Every service must be able to reply to it first.')
 
 
 class ConsumerBase(object):
@@ -96,6 +103,20 @@ class ConsumerBase(object):
 
         self.queue.consume(*args, callback=_callback, **options)
 
+    def get_stats(self, channel):
+        """Return the queue name, messages waiting in the broker and,
+        for ProxyCallback consumers, messages being processed.
+
+        The queue is passively declared on channel, which must not be the
+        channel being consumed from.
+        """
+        queue = self.queue(channel)
+        name, depth, consumers = queue.queue_declare(passive=True)
+        in_flight = None
+        if isinstance(self.callback, ProxyCallback):
+            in_flight = self.callback.pool.running()
+        return {'queue': name, 'depth': depth, 'in_flight': in_flight}
+
     def cancel(self):
         """Cancel the consuming from the queue, if it has started"""
         try:
@@ -295,6 +316,7 @@ class Connection(object):
     def __init__(self):
         self.consumers = []
         self.consumer_thread = None
+        self.prefetch_count = None
         self.max_retries = FLAGS.rabbit_max_retries
         # Try forever?
         if self.max_retries <= 0:
@@ -352,11 +374,17 @@ class Connection(object):
         # work around 'memory' transport bug in 1.1.3
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
+        self._set_qos()
         for consumer in self.consumers:
             consumer.reconnect(self.channel)
         if self.consumers:
             LOG.debug(_("Re-established AMQP queues"))
 
+    def _set_qos(self):
+        """Limit the unacknowledged messages the broker sends us."""
+        if self.prefetch_count:
+            self.channel.basic_qos(0, self.prefetch_count, False)
+
     def get_channel(self):
         """Convenience call for bin/clear_rabbit_queues"""
         return self.channel
@@ -385,6 +413,7 @@ class Connection(object):
         if self.memory_transport:
             self.channel._new_queue('ae.undeliver')
         self.consumers = []
+        self.prefetch_count = None
 
     def declare_consumer(self, consumer_cls, topic, callback):
         """Create a Consumer using the class that was passed in and
@@ -488,8 +517,36 @@ class Connection(object):
             self.consumer_thread = eventlet.spawn(_consumer_thread)
         return self.consumer_thread
 
+    def get_consumer_stats(self):
+        """Return queue depth and in-flight counts for each consumer of a
+        shared queue.
+
+        Exclusive queues, such as fanout and direct ones, are skipped:
+        the broker refuses to declare them from any other connection.
+        """
+        consumers = [consumer for consumer in self.consumers
+                     if not consumer.kwargs.get('exclusive')]
+        if not consumers:
+            return []
+        # NOTE: the consumer thread may be waiting on self.channel, so the
+        # queues are declared on a short-lived connection of their own.
+        connection = kombu.connection.BrokerConnection(**self.params)
+        try:
+            channel = connection.channel()
+            return [consumer.get_stats(channel) for consumer in consumers]
+        finally:
+            connection.release()
+
     def create_consumer(self, topic, proxy, fanout=False):
-        """Create a consumer that calls a method in a proxy object"""
+        """Create a consumer that calls a method in a proxy object.
+
+        ProxyCallback acks a message only once a thread in its pool has
+        taken it, so prefetching as many messages as the pool has threads
+        keeps any backlog in the broker rather than in memory.
+        """
+        if self.prefetch_count != FLAGS.rpc_thread_pool_size:
+            self.prefetch_count = FLAGS.rpc_thread_pool_size
+            self._set_qos()
         if fanout:
             self.declare_fanout_consumer(topic, ProxyCallback(proxy))
         else:
@@ -598,6 +655,7 @@ class ProxyCallback(object):
 
         """
         LOG.debug(_('received %s') % message_data)
+        deadline = message_data.pop('_deadline', None)
         ctxt = _unpack_context(message_data)
         method = message_data.get('method')
         args = message_data.get('args', {})
@@ -605,14 +663,22 @@ class ProxyCallback(object):
             LOG.warn(_('no method for message: %s') % message_data)
             ctxt.reply(_('No method for message: %s') % message_data)
             return
-        self.pool.spawn_n(self._process_data, ctxt, method, args)
+        if _expired(deadline, method):
+            return
+        # NOTE: spawn_n blocks while the pool is full, which holds back
+        # the ack for this message and, via the prefetch limit, any more
+        # deliveries until a thread is free.
+        self.pool.spawn_n(self._process_data, ctxt, method, args, deadline)
 
     @exception.wrap_exception()
-    def _process_data(self, ctxt, method, args):
+    def _process_data(self, ctxt, method, args, deadline=None):
         """Thread that maigcally looks for a method on the proxy
         object and calls it.
         """
 
+        # The message may have waited for a free thread in the pool.
+        if _expired(deadline, method):
+            return
         node_func = getattr(self.proxy, str(method))
         node_args = dict((str(k), v) for k, v in args.iteritems())
         # NOTE(vish): magic is fun!
@@ -632,6 +698,32 @@ class ProxyCallback(object):
         return
 
 
+def _expired(deadline, method):
+    """Return True, and log it, if the caller has given up on a message."""
+    if deadline is None or time.time() < deadline:
+        return False
+    LOG.warn(_('Dropping %(method)s message, its caller stopped waiting '
+               '%(late).1f seconds ago') %
+             {'method': method, 'late': time.time() - deadline})
+    return True
+
+
+def _get_response_timeout(topic):
+    """Return the seconds a call on topic may wait for a response.
+
+    Entries of rpc_topic_response_timeouts match either the whole topic
+    or the part before the first '.', so 'compute' covers every
+    'compute.<host>' topic.
+    """
+    timeouts = {}
+    for entry in FLAGS.rpc_topic_response_timeouts:
+        name, _sep, seconds = entry.partition(':')
+        timeouts[name.strip()] = int(seconds)
+    base_topic = topic.split('.', 1)[0]
+    return timeouts.get(topic,
+                        timeouts.get(base_topic, FLAGS.rpc_response_timeout))
+
+
 def _unpack_context(msg):
     """Unpack context from msg."""
     context_dict = {}
@@ -643,6 +735,7 @@ def _unpack_context(msg):
             value = msg.pop(key)
             context_dict[key[9:]] = value
     context_dict['msg_id'] = msg.pop('_msg_id', None)
+    context_dict['reply_q'] = msg.pop('_reply_q', None)
     LOG.debug(_('unpacked context: %s'), context_dict)
     return RpcContext.from_dict(context_dict)
 
@@ -665,39 +758,143 @@ class RpcContext(context.RequestContext):
     """Context that supports replying to a rpc.call"""
     def __init__(self, *args, **kwargs):
         msg_id = kwargs.pop('msg_id', None)
+        reply_q = kwargs.pop('reply_q', None)
         self.msg_id = msg_id
+        self.reply_q = reply_q
         super(RpcContext, self).__init__(*args, **kwargs)
 
     def reply(self, *args, **kwargs):
         if self.msg_id:
+            kwargs['reply_q'] = self.reply_q
             msg_reply(self.msg_id, *args, **kwargs)
 
 
+class ReplyProxy(object):
+    """A reply queue shared by every call/multicall made by this process.
+
+    Replies carry the msg_id of the call they answer and are handed to
+    the MulticallWaiter registered under it.  Waiters are held weakly, so
+    a caller that abandons a multicall does not leak its waiter; replies
+    for unknown msg_ids are dropped.
+    """
+
+    def __init__(self):
+        self.reply_q = 'reply_%s' % uuid.uuid4().hex
+        self._waiters = weakref.WeakValueDictionary()
+        self._connection = Connection()
+        self._connection.declare_direct_consumer(self.reply_q,
+                                                 self._process_data)
+        self._connection.consume_in_thread()
+
+    def _process_data(self, message_data):
+        msg_id = message_data.pop('_msg_id', None)
+        waiter = self._waiters.get(msg_id)
+        if waiter is None:
+            LOG.warn(_('No calling threads waiting for msg_id : %s'),
+                     msg_id)
+            return
+        waiter(message_data)
+
+    def add_waiter(self, msg_id, waiter):
+        self._waiters[msg_id] = waiter
+
+    def del_waiter(self, msg_id):
+        self._waiters.pop(msg_id, None)
+
+    def close(self):
+        self._connection.close()
+
+
+_REPLY_PROXY = None
+_REPLY_PROXY_SEMAPHORE = semaphore.Semaphore()
+
+
+def _get_reply_proxy():
+    """Return the reply proxy for this process, creating it if needed."""
+    global _REPLY_PROXY
+    if _REPLY_PROXY is None:
+        # NOTE: connecting yields, so only one greenthread may create it
+        with _REPLY_PROXY_SEMAPHORE:
+            if _REPLY_PROXY is None:
+                _REPLY_PROXY = ReplyProxy()
+    return _REPLY_PROXY
+
+
 class MulticallWaiter(object):
-    def __init__(self, connection):
+    """Iterates over the replies to one call/multicall.
+
+    Replies either arrive on a queue declared for this call on
+    connection, or, if reply_proxy is given, are handed over by the
+    shared reply queue's consumer thread.
+    """
+
+    def __init__(self, connection, reply_proxy=None, msg_id=None,
+                 deadline=None):
         self._connection = connection
-        self._iterator = connection.iterconsume()
+        self._reply_proxy = reply_proxy
+        self._msg_id = msg_id
+        self._deadline = deadline
         self._result = None
         self._done = False
+        if reply_proxy:
+            self._iterator = None
+            self._queue = queue.LightQueue()
+            reply_proxy.add_waiter(msg_id, self)
+        else:
+            self._iterator = connection.iterconsume()
 
     def done(self):
         self._done = True
-        self._connection.close()
+        if self._reply_proxy:
+            self._reply_proxy.del_waiter(self._msg_id)
+        else:
+            self._connection.close()
 
     def __call__(self, data):
         """The consume() callback will call this.  Store the result."""
         if data['failure']:
-            self._result = RemoteError(*data['failure'])
+            result = RemoteError(*data['failure'])
+        else:
+            result = data['result']
+        if self._reply_proxy:
+            self._queue.put(result)
+        else:
+            self._result = result
+
+    def _next_result(self):
+        """Block until the next reply arrives and return it.
+
+        Raises Timeout, after releasing the connection or reply queue
+        registration, once the deadline of the call has passed.
+        """
+        timeout = None
+        if self._deadline is not None:
+            timeout = max(self._deadline - time.time(), 0)
+        if self._reply_proxy:
+            try:
+                return self._queue.get(timeout=timeout)
+            except queue.Empty:
+                pass
         else:
-            self._result = data['result']
+            timer = eventlet.Timeout(timeout)
+            try:
+                self._iterator.next()
+                return self._result
+            except eventlet.Timeout, t:
+                if t is not timer:
+                    raise
+            finally:
+                timer.cancel()
+        self.done()
+        raise Timeout(_('Timed out waiting for a reply to message ID'
+                        ' %s') % self._msg_id)
 
     def __iter__(self):
         """Return a result until we get a 'None' response from consumer"""
         if self._done:
             raise StopIteration
         while True:
-            self._iterator.next()
-            result = self._result
+            result = self._next_result()
             if isinstance(result, Exception):
                 self.done()
                 raise result
@@ -724,8 +921,23 @@ def multicall(context, topic, msg):
     LOG.debug(_('MSG_ID is %s') % (msg_id))
     _pack_context(msg, context)
 
+    deadline = None
+    timeout = _get_response_timeout(topic)
+    if timeout > 0:
+        deadline = time.time() + timeout
+        msg['_deadline'] = deadline
+
+    if FLAGS.amqp_rpc_single_reply_queue:
+        reply_proxy = _get_reply_proxy()
+        msg['_reply_q'] = reply_proxy.reply_q
+        wait_msg = MulticallWaiter(None, reply_proxy=reply_proxy,
+                                   msg_id=msg_id, deadline=deadline)
+        with ConnectionContext() as conn:
+            conn.topic_send(topic, msg)
+        return wait_msg
+
     conn = ConnectionContext()
-    wait_msg = MulticallWaiter(conn)
+    wait_msg = MulticallWaiter(conn, msg_id=msg_id, deadline=deadline)
     conn.declare_direct_consumer(msg_id, wait_msg)
     conn.topic_send(topic, msg)
     return wait_msg
@@ -757,10 +969,12 @@ def fanout_cast(context, topic, msg):
         conn.fanout_send(topic, msg)
 
 
-def msg_reply(msg_id, reply=None, failure=None):
+def msg_reply(msg_id, reply=None, failure=None, reply_q=None):
     """Sends a reply or an error on the channel signified by msg_id.
 
-    Failure should be a sys.exc_info() tuple.
+    Failure should be a sys.exc_info() tuple.  If the caller named a
+    shared reply queue in reply_q, the reply goes there, tagged with
+    msg_id.
 
     """
     with ConnectionContext() as conn:
@@ -777,4 +991,8 @@ def msg_reply(msg_id, reply=None, failure=None):
             msg = {'result': dict((k, repr(v))
                             for k, v in reply.__dict__.iteritems()),
                     'failure': failure}
-        conn.direct_send(msg_id, msg)
+        if reply_q:
+            msg['_msg_id'] = msg_id
+            conn.direct_send(reply_q, msg)
+        else:
+            conn.direct_send(msg_id, msg)
@@ -20,6 +20,7 @@ customize the behavior: filter_hosts() and weigh_hosts(). The default
 behavior is to simply select all hosts and weight them the same.
 """
 
+import heapq
 import json
 import operator
 
@@ -61,6 +62,9 @@ class AbstractScheduler(driver.Scheduler):
         """Create the requested resource in this Zone."""
         host = build_plan_item['hostname']
         instance = self.create_instance_db_entry(context, request_spec)
+        if self.zone_manager:
+            self.zone_manager.consume_host_resources("compute", host,
+                    request_spec.get('instance_type'))
         driver.cast_to_compute_host(context, host,
                 'run_instance', instance_id=instance['id'], **kwargs)
         return driver.encode_instance(instance, local=True)
@@ -220,17 +224,56 @@ class AbstractScheduler(driver.Scheduler):
         if not build_plan:
             raise driver.NoValidHost(_('No hosts were available'))
 
+        instance_type = request_spec.get('instance_type')
+        batch = FLAGS.scheduler_batch_placement and num_instances > 1
+        local_hosts = []
         instances = []
-        for num in xrange(num_instances):
+        while len(instances) + len(local_hosts) < num_instances:
             if not build_plan:
-                break
+                # Every host in the plan has been used up. Plan the rest
+                # against the host states we have been debiting; no need
+                # to go back to the child zones for that.
+                remaining = num_instances - len(instances) - \
+                            len(local_hosts)
+                build_plan = self._schedule_local(context, "compute",
+                        dict(request_spec, num_instances=remaining),
+                        limit=remaining)
+                if not build_plan:
+                    break
             build_plan_item = build_plan.pop(0)
+            if not self._host_can_fit(build_plan_item, instance_type):
+                continue
+            if batch and "hostname" in build_plan_item:
+                # Hold the resources now; the instances for this zone
+                # are all created together below.
+                host = build_plan_item['hostname']
+                self.zone_manager.consume_host_resources("compute", host,
+                        instance_type)
+                local_hosts.append(host)
+                continue
             instance = self._provision_resource(context,
                     build_plan_item, request_spec, kwargs)
             instances.append(instance)
 
+        if local_hosts:
+            local_instances = self.create_instance_db_entries(context,
+                    request_spec, local_hosts)
+            driver.cast_run_instances(context, local_instances, **kwargs)
+            instances.extend([driver.encode_instance(instance, local=True)
+                              for instance in local_instances])
         return instances
 
+    def _host_can_fit(self, build_plan_item, instance_type):
+        """Check a local build plan item against the cached host state,
+        which reflects every placement made since the plan was built.
+        """
+        host = build_plan_item.get('hostname')
+        if not host or not self.zone_manager:
+            return True
+        states = self.zone_manager.host_states.get("compute", {})
+        state = states.get(host)
+        return state is None or state.can_fit(instance_type)
+
     def select(self, context, request_spec, *args, **kwargs):
         """Select returns a list of weights and zone/host information
         corresponding to the best hosts to service the request. Any
@@ -258,20 +301,8 @@ class AbstractScheduler(driver.Scheduler):
             msg = _("Scheduler only understands Compute nodes (for now)")
             raise NotImplementedError(msg)
 
-        # Get all available hosts.
-        all_hosts = self.zone_manager.service_states.iteritems()
-        unfiltered_hosts = [(host, services[topic])
-                for host, services in all_hosts
-                if topic in services]
+        weighted_hosts = self._schedule_local(context, topic, request_spec)
 
-        # Filter local hosts based on requirements ...
-        filtered_hosts = self.filter_hosts(topic, request_spec,
-                unfiltered_hosts)
-
-        # weigh the selected hosts.
-        # weighted_hosts = [{weight=weight, hostname=hostname,
-        #         capabilities=capabs}, ...]
-        weighted_hosts = self.weigh_hosts(topic, request_spec, filtered_hosts)
         # Next, tack on the host weights from the child zones
         json_spec = json.dumps(request_spec)
         all_zones = db.zone_get_all(context.elevated())
@@ -290,6 +321,38 @@ class AbstractScheduler(driver.Scheduler):
         weighted_hosts.sort(key=operator.itemgetter('weight'))
         return weighted_hosts
 
+    def _schedule_local(self, context, topic, request_spec, limit=None):
+        """Returns the weighted list of hosts in this zone that can take
+        the request, based on the ZoneManager's cached host states. If
+        limit is given only that many of the best hosts are returned.
+        """
+        # Get all available hosts that still have room for the instance.
+        instance_type = request_spec.get('instance_type')
+        host_states = self.zone_manager.get_host_states(topic)
+        unfiltered_hosts = [(host, state.capabilities)
+                for host, state in host_states.iteritems()
+                if state.can_fit(instance_type)]
+
+        # Filter local hosts based on requirements ...
+        filtered_hosts = self.filter_hosts(topic, request_spec,
+                unfiltered_hosts)
+
+        # weigh the selected hosts.
+        # weighted_hosts = [{weight=weight, hostname=hostname,
+        #         capabilities=capabs}, ...]
+        weighted_hosts = self.weigh_hosts(topic, request_spec, filtered_hosts)
+
+        # Filters may look past the list they are given, so make sure
+        # nothing comes back that the cache knows is full or stale.
+        weighted_hosts = [weighted for weighted in weighted_hosts
+                if weighted['hostname'] in host_states and
+                host_states[weighted['hostname']].can_fit(instance_type)]
+        if limit is not None:
+            return heapq.nsmallest(limit, weighted_hosts,
+                                   key=operator.itemgetter('weight'))
+        weighted_hosts.sort(key=operator.itemgetter('weight'))
+        return weighted_hosts
+
     def filter_hosts(self, topic, request_spec, host_list):
         """Filter the full host list returned from the ZoneManager. By default,
         this method only applies the basic_ram_filter(), meaning all hosts
@@ -39,6 +39,11 @@ FLAGS = flags.FLAGS
 LOG = logging.getLogger('nova.scheduler.driver')
 flags.DEFINE_integer('service_down_time', 60,
                      'maximum time since last checkin for up service')
+flags.DEFINE_boolean('scheduler_batch_placement', False,
+                     'Place all the instances of a multi-instance request '
+                     'at once, create them in one transaction and send each '
+                     'compute host a single run_instances cast. Every '
+                     'compute host must support run_instances.')
 flags.DECLARE('instances_path', 'nova.compute.manager')
 
 
@@ -72,6 +77,19 @@ def cast_to_compute_host(context, host, method, update_db=True, **kwargs):
     LOG.debug(_("Casted '%(method)s' to compute '%(host)s'") % locals())
 
 
+def cast_run_instances(context, instances, **kwargs):
+    """Cast run_instances to the compute hosts of the given instances,
+    one message per host listing every instance it received."""
+
+    instance_ids_by_host = {}
+    for instance in instances:
+        instance_ids_by_host.setdefault(instance['host'], []).\
+                append(instance['id'])
+    for host, instance_ids in instance_ids_by_host.iteritems():
+        cast_to_compute_host(context, host, 'run_instances',
+                update_db=False, instance_ids=instance_ids, **kwargs)
+
+
 def cast_to_network_host(context, host, method, update_db=False, **kwargs):
     """Cast request to a network host queue"""
 
@@ -167,6 +185,23 @@ class Scheduler(object):
                 security_group, block_device_mapping)
         return instance
 
+    def create_instance_db_entries(self, context, request_spec, hosts):
+        """Create one instance DB entry for each of hosts, with its host
+        already set, in a single batch.
+        """
+        base_options = request_spec['instance_properties']
+        image = request_spec['image']
+        instance_type = request_spec.get('instance_type')
+        security_group = request_spec.get('security_group', 'default')
+        block_device_mapping = request_spec.get('block_device_mapping', [])
+
+        now = utils.utcnow()
+        instance_values = [{'host': host, 'scheduled_at': now}
+                           for host in hosts]
+        return self.compute_api.create_db_entries_for_new_instances(
+                context, instance_type, image, base_options,
+                security_group, block_device_mapping, instance_values)
+
     def schedule(self, context, topic, method, *_args, **_kwargs):
         """Must override at least this method for scheduler to work."""
         raise NotImplementedError(_("Must implement a fallback schedule"))
@@ -23,8 +23,6 @@ is then selected for provisioning.
 """
 
 
-import collections
-
 from nova import flags
 from nova import log as logging
 from nova.scheduler import base_scheduler
@@ -47,11 +45,54 @@ flags.DEFINE_integer('compute_fill_first_cost_fn_weight', 1,
              'How much weight to give the fill-first cost function')
 
 
+class HostColumns(object):
+    """Column-oriented view of a list of (hostname, capabilities) hosts.
+
+    Each capability is pulled out into a list of values, one per host, the
+    first time a cost function asks for it, so cost functions that have a
+    columnar form can score every host without a call per host.
+    """
+    def __init__(self, topic, hosts):
+        self.hostnames = [hostname for hostname, caps in hosts]
+        # Filters hand back either the capabilities for the topic or the
+        # full { <service> : { cap k : v }} dict for the host.
+        self._capabilities = [caps.get(topic, caps) for hostname, caps
+                              in hosts]
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.hostnames)
+
+    def column(self, key, default=0):
+        """Return the values of one capability across all hosts."""
+        try:
+            return self._columns[key]
+        except KeyError:
+            values = [caps.get(key, default) for caps in self._capabilities]
+            self._columns[key] = values
+            return values
+
+
+def columnar(column_fn):
+    """Decorator giving a per-host cost function a columnar form.
+
+    column_fn takes a HostColumns and returns a list with one cost per
+    host. weighted_sum() uses it when it is given the columns, and falls
+    back to calling the cost function once per host otherwise.
+    """
+    def decorator(cost_fn):
+        cost_fn.columnar = column_fn
+        return cost_fn
+    return decorator
+
+
+@columnar(lambda columns: [1] * len(columns))
 def noop_cost_fn(host):
     """Return a pre-weight cost of 1 for each host"""
     return 1
 
 
+@columnar(lambda columns: columns.column("host_memory_free"))
 def compute_fill_first_cost_fn(host):
     """Prefer hosts that have less ram available, filter_hosts will exclude
     hosts that don't have enough ram.
@@ -74,7 +115,7 @@ def normalize_list(L):
     return L
 
 
-def weighted_sum(domain, weighted_fns, normalize=True):
+def weighted_sum(domain, weighted_fns, normalize=True, columns=None):
     """Use the weighted-sum method to compute a score for an array of objects.
     Normalize the results of the objective-functions so that the weights are
     meaningful regardless of objective-function's range.
@@ -82,30 +123,31 @@ def weighted_sum(domain, weighted_fns, normalize=True):
     domain - input to be scored
     weighted_fns - list of weights and functions like:
         [(weight, objective-functions)]
+    columns - optional HostColumns for the domain; objective-functions
+        with a columnar form score the whole domain from it at once
 
     Returns an unsorted list of scores. To pair with hosts do:
         zip(scores, hosts)
     """
-    # Table of form:
-    #   { domain1: [score1, score2, ..., scoreM]
-    #     ...
-    #     domainN: [score1, score2, ..., scoreM] }
-    score_table = collections.defaultdict(list)
+    if not domain or not weighted_fns:
+        return []
+
+    domain_scores = [0] * len(domain)
     for weight, fn in weighted_fns:
-        scores = [fn(elem) for elem in domain]
-        if normalize:
-            norm_scores = normalize_list(scores)
+        column_fn = getattr(fn, 'columnar', None)
+        if columns is not None and column_fn is not None:
+            scores = column_fn(columns)
+        else:
+            scores = [fn(elem) for elem in domain]
+
+        max_ = normalize and max(scores) or 0
+        if max_ > 0:
+            max_ = float(max_)
+            domain_scores = [total + (score / max_) * weight
+                             for total, score in zip(domain_scores, scores)]
         else:
-            norm_scores = scores
-        for idx, score in enumerate(norm_scores):
-            weighted_score = score * weight
-            score_table[idx].append(weighted_score)
-
-    # Sum rows in table to compute score for each element in domain
-    domain_scores = []
-    for idx in sorted(score_table):
-        elem_score = sum(score_table[idx])
-        domain_scores.append(elem_score)
+            domain_scores = [total + score * weight
+                             for total, score in zip(domain_scores, scores)]
     return domain_scores
 
 
@@ -156,7 +198,8 @@ class LeastCostScheduler(base_scheduler.BaseScheduler):
            [ {weight: weight, hostname: hostname, capabilities: capabs} ]
         """
         cost_fns = self.get_cost_fns(topic)
-        costs = weighted_sum(domain=hosts, weighted_fns=cost_fns)
+        costs = weighted_sum(domain=hosts, weighted_fns=cost_fns,
+                             columns=HostColumns(topic, hosts))
 
         weighted = []
         weight_log = []
@@ -21,6 +21,8 @@
 Simple Scheduler
 """
 
+import heapq
+
 from nova import db
 from nova import flags
 from nova import utils
@@ -64,8 +66,52 @@ class SimpleScheduler(chance.ChanceScheduler):
                                    " for this request. Is the appropriate"
                                    " service running?"))
 
+    def _schedule_instances(self, context, instance_opts, num_instances):
+        """Picks a host for each of num_instances instances from a single
+        snapshot of the cores in use, spreading them over the least
+        loaded hosts that are up.
+        """
+        availability_zone = instance_opts.get('availability_zone')
+
+        if availability_zone and context.is_admin and \
+                (':' in availability_zone):
+            host = self._schedule_instance(context, instance_opts)
+            return [host] * num_instances
+
+        vcpus = instance_opts['vcpus']
+        results = db.service_get_all_compute_sorted(context)
+        # Heap of [instance_cores, position, host]; the position keeps
+        # the ordering of the query for hosts with the same load.
+        hosts = [[instance_cores, position, service['host']]
+                 for position, (service, instance_cores)
+                 in enumerate(results)
+                 if self.service_is_up(service)]
+        if not hosts:
+            raise driver.NoValidHost(_("Scheduler was unable to locate a "
+                                       "host for this request. Is the "
+                                       "appropriate service running?"))
+        heapq.heapify(hosts)
+
+        chosen_hosts = []
+        for num in xrange(num_instances):
+            instance_cores, position, host = hosts[0]
+            if instance_cores + vcpus > FLAGS.max_cores:
+                raise driver.NoValidHost(_("All hosts have too many cores"))
+            chosen_hosts.append(host)
+            heapq.heapreplace(hosts, [instance_cores + vcpus, position, host])
+        return chosen_hosts
+
     def schedule_run_instance(self, context, request_spec, *_args, **_kwargs):
         num_instances = request_spec.get('num_instances', 1)
+        if FLAGS.scheduler_batch_placement and num_instances > 1:
+            hosts = self._schedule_instances(context,
+                    request_spec['instance_properties'], num_instances)
+            instances = self.create_instance_db_entries(context,
+                    request_spec, hosts)
+            driver.cast_run_instances(context, instances, **_kwargs)
+            return [driver.encode_instance(instance)
+                    for instance in instances]
+
         instances = []
         for num in xrange(num_instances):
             host = self._schedule_instance(context,
@@ -35,6 +35,12 @@ flags.DEFINE_integer('zone_db_check_interval', 60,
                     'Seconds between getting fresh zone info from db.')
 flags.DEFINE_integer('zone_failures_to_offline', 3,
              'Number of consecutive errors before marking zone offline')
+flags.DEFINE_integer('host_state_claim_timeout', 600,
+             'Seconds before a resource claim made by the scheduler is '
+             'dropped, even if the host has not reported since')
+
+MB = 1024 * 1024
+GB = 1024 * MB
 
 
 class ZoneState(object):
@@ -91,6 +97,140 @@ class ZoneState(object):
                             "attempts. Marking inactive.") % locals())
 
 
+class HostState(object):
+    """Cached view of the resources available on a single host.
+
+    The reported values come from the capabilities the host publishes and
+    from its compute_node row. Each time the scheduler places an instance
+    on the host it records a claim against those values, so the requests
+    that follow see the debited resources instead of piling onto whatever
+    host looked best in the last report.
+    """
+    def __init__(self, host, topic):
+        self.host = host
+        self.topic = topic
+        self.capabilities = {}
+        self.updated_at = datetime.datetime.min
+        self.claims = []
+        self.claimed_ram_mb = 0
+        self.claimed_disk_gb = 0
+        self.claimed_vcpus = 0
+        # Resources as last reported by the host, before any claims.
+        self._reported_caps = {}
+        self._node_ram_mb = None
+        self._node_disk_gb = None
+        self.vcpus_total = None
+        self.vcpus_used = None
+
+    @property
+    def free_ram_mb(self):
+        if 'host_memory_free' in self._reported_caps:
+            free = float(self._reported_caps['host_memory_free']) / MB
+        elif self._node_ram_mb is not None:
+            free = self._node_ram_mb
+        else:
+            return None
+        return free - self.claimed_ram_mb
+
+    @property
+    def free_disk_gb(self):
+        if 'disk_available' in self._reported_caps:
+            free = float(self._reported_caps['disk_available']) / GB
+        elif self._node_disk_gb is not None:
+            free = self._node_disk_gb
+        else:
+            return None
+        return free - self.claimed_disk_gb
+
+    @property
+    def free_vcpus(self):
+        if self.vcpus_total is None:
+            return None
+        return self.vcpus_total - (self.vcpus_used or 0) - self.claimed_vcpus
+
+    def update_from_capabilities(self, capabilities):
+        """Take a fresh capability report from the host."""
+        # Claims made before the previous report have had a whole
+        # reporting cycle to show up in this one, so stop counting them.
+        previous = self.updated_at
+        self._drop_claims([claim for claim in self.claims
+                           if claim['timestamp'] < previous])
+        self.updated_at = capabilities.get('timestamp') or utils.utcnow()
+        self.capabilities = capabilities
+        self._reported_caps = dict((key, capabilities[key])
+                for key in ('host_memory_free', 'disk_available')
+                if key in capabilities)
+        self._apply_claims()
+
+    def update_from_compute_node(self, compute):
+        """Reconcile totals and usage with the host's compute_node row."""
+        self.vcpus_total = compute['vcpus']
+        self.vcpus_used = compute['vcpus_used']
+        self._node_ram_mb = compute['memory_mb'] - compute['memory_mb_used']
+        self._node_disk_gb = compute['local_gb'] - compute['local_gb_used']
+
+    def can_fit(self, instance_type):
+        """Check the host still has room for an instance of this type.
+        Resources the host never reported are not checked.
+        """
+        if not instance_type:
+            return True
+        wanted = ((self.free_ram_mb, instance_type.get('memory_mb')),
+                  (self.free_disk_gb, instance_type.get('local_gb')),
+                  (self.free_vcpus, instance_type.get('vcpus')))
+        for free, needed in wanted:
+            if free is not None and needed and free < needed:
+                return False
+        return True
+
+    def consume_from_instance(self, instance_type):
+        """Claim the resources for an instance placed on this host."""
+        claim = dict(timestamp=utils.utcnow(),
+                     memory_mb=instance_type.get('memory_mb') or 0,
+                     local_gb=instance_type.get('local_gb') or 0,
+                     vcpus=instance_type.get('vcpus') or 0)
+        self.claims.append(claim)
+        self.claimed_ram_mb += claim['memory_mb']
+        self.claimed_disk_gb += claim['local_gb']
+        self.claimed_vcpus += claim['vcpus']
+        self._apply_claims()
+        return claim
+
+    def expire_claims(self, now):
+        """Drop claims the host has not confirmed within the timeout."""
+        timeout = datetime.timedelta(seconds=FLAGS.host_state_claim_timeout)
+        self._drop_claims([claim for claim in self.claims
+                           if now - claim['timestamp'] > timeout])
+
+    def is_stale(self, now):
+        """Check if the last report from the host is too old to use."""
+        allowed_time_diff = FLAGS.periodic_interval * 3
+        return (now - self.updated_at >
+                datetime.timedelta(seconds=allowed_time_diff))
+
+    def _drop_claims(self, claims):
+        if not claims:
+            return
+        for claim in claims:
+            self.claims.remove(claim)
+            self.claimed_ram_mb -= claim['memory_mb']
+            self.claimed_disk_gb -= claim['local_gb']
+            self.claimed_vcpus -= claim['vcpus']
+        self._apply_claims()
+
+    def _apply_claims(self):
+        """Write the debited values back into the capabilities so host
+        filters and cost functions see them too."""
+        if 'host_memory_free' in self._reported_caps:
+            self.capabilities['host_memory_free'] = \
+                    self._reported_caps['host_memory_free'] - \
+                    self.claimed_ram_mb * MB
+        if 'disk_available' in self._reported_caps:
+            self.capabilities['disk_available'] = \
+                    self._reported_caps['disk_available'] - \
+                    self.claimed_disk_gb * GB
+
+
 def _call_novaclient(zone):
     """Call novaclient. Broken out for testing purposes. Note that
     we have to use the admin credentials for this since there is no
@@ -117,6 +257,7 @@ class ZoneManager(object):
         self.last_zone_db_check = datetime.datetime.min
         self.zone_states = {}  # { <zone_id> : ZoneState }
         self.service_states = {}  # { <host> : { <service> : { cap k : v }}}
+        self.host_states = {}  # { <service> : { <host> : HostState }}
         self.green_pool = greenpool.GreenPool()
 
     def get_zone_list(self):
@@ -200,8 +341,54 @@ class ZoneManager(object):
             logging.debug(_("Updating zone cache from db."))
             self.last_zone_db_check = utils.utcnow()
             self._refresh_from_db(context)
+        self._refresh_host_states_from_db(context)
         self._poll_zones(context)
 
+    def _refresh_host_states_from_db(self, context):
+        """Reconcile the cached compute host states with compute_node
+        rows."""
+        states = self.host_states.get('compute')
+        if not states:
+            return
+        for compute in db.compute_node_get_all(context):
+            state = states.get(compute['service']['host'])
+            if state:
+                state.update_from_compute_node(compute)
+
+    def get_host_states(self, topic):
+        """Return { <host> : HostState } for every host running `topic`
+        that has reported recently. The cache is synced with the latest
+        capability reports first, keeping any claims made since.
+        """
+        states = self.host_states.setdefault(topic, {})
+        now = utils.utcnow()
+        fresh_states = {}
+        for host, services in self.service_states.iteritems():
+            capabilities = services.get(topic)
+            if capabilities is None:
+                continue
+            state = states.get(host)
+            if state is None:
+                state = states[host] = HostState(host, topic)
+            if state.capabilities is not capabilities:
+                state.update_from_capabilities(capabilities)
+            if state.is_stale(now):
+                continue
+            state.expire_claims(now)
+            fresh_states[host] = state
+
+        # Forget hosts that no longer report this service at all.
+        for host in states.keys():
+            if topic not in self.service_states.get(host, {}):
+                del states[host]
+        return fresh_states
+
+    def consume_host_resources(self, topic, host, instance_type):
+        """Claim the resources for an instance just placed on host."""
+        state = self.host_states.get(topic, {}).get(host)
+        if state is not None:
+            state.consume_from_instance(instance_type or {})
+
     def update_service_capabilities(self, service_name, host, capabilities):
         """Update the per-service capabilities based on this notification."""
         logging.debug(_("Received %(service_name)s service update from "
@@ -25,6 +25,7 @@ import os
 import eventlet
 import greenlet
 
+from nova import availability_zones
 from nova import context
 from nova import db
 from nova import exception
@@ -45,6 +46,9 @@ flags.DEFINE_integer('report_interval', 10,
 flags.DEFINE_integer('periodic_interval', 60,
                      'seconds between running periodic tasks',
                      lower_bound=1)
+flags.DEFINE_integer('rpc_stats_interval', 0,
+                     'seconds between logging the backlog of each rpc'
+                     ' queue, 0 to disable')
 flags.DEFINE_string('ec2_listen', "0.0.0.0",
                     'IP address for EC2 API to listen')
 flags.DEFINE_integer('ec2_listen_port', 8773, 'port for ec2 api to listen')
@@ -173,6 +177,11 @@ class Service(object):
             periodic.start(interval=self.periodic_interval, now=False)
             self.timers.append(periodic)
 
+        if FLAGS.rpc_stats_interval:
+            rpc_stats = utils.LoopingCall(self.report_rpc_stats)
+            rpc_stats.start(interval=FLAGS.rpc_stats_interval, now=False)
+            self.timers.append(rpc_stats)
+
     def _create_service_ref(self, context):
         zone = FLAGS.node_availability_zone
         service_ref = db.service_create(context,
@@ -182,6 +191,7 @@ class Service(object):
                                          'report_count': 0,
                                          'availability_zone': zone})
         self.service_id = service_ref['id']
+        availability_zones.reset()
 
     def __getattr__(self, key):
         manager = self.__dict__.get('manager', None)
@@ -224,6 +234,7 @@ class Service(object):
             db.service_destroy(context.get_admin_context(), self.service_id)
         except exception.NotFound:
             logging.warn(_('Service killed that has no database entry'))
+        availability_zones.reset()
 
     def stop(self):
         # Try to shut the connection down, but if we get any sort of
@@ -248,7 +259,7 @@ class Service(object):
 
     def periodic_tasks(self):
         """Tasks to be run at a periodic interval."""
-        self.manager.periodic_tasks(context.get_admin_context())
+        self.manager.periodic_tasks(context.get_admin_context(), wait=False)
 
     def report_state(self):
         """Update the state of this service in the datastore."""
@@ -277,6 +288,18 @@ class Service(object):
                 self.model_disconnected = True
                 logging.exception(_('model server went away'))
 
+    def report_rpc_stats(self):
+        """Log the backlog and in-flight messages of each rpc consumer."""
+        get_stats = getattr(self.conn, 'get_consumer_stats', None)
+        if not get_stats:
+            return
+        try:
+            for stats in get_stats():
+                logging.debug(_('RPC queue %(queue)s: %(depth)s waiting, '
+                                '%(in_flight)s in flight') % stats)
+        except Exception:  # pylint: disable=W0702
+            logging.exception(_('Unable to read rpc queue stats'))
+
 
 class WSGIService(object):
     """Provides ability to launch API from a 'paste' configuration."""
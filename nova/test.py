@@ -36,12 +36,14 @@ import shutil
 import stubout
 from eventlet import greenthread
 
+from nova import availability_zones
 from nova import fakerabbit
 from nova import flags
 from nova import log
 from nova import rpc
 from nova import utils
 from nova import service
+from nova.auth import identity_cache
 from nova.virt import fake
 
 
@@ -152,6 +154,9 @@ class TestCase(unittest.TestCase):
             if FLAGS.image_service == 'nova.image.fake.FakeImageService':
                 nova.image.fake.FakeImageService_reset()
 
+            availability_zones.reset()
+            identity_cache.reset()
+
             # Reset any overriden flags
             self.reset_flags()
 
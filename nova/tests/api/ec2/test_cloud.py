@@ -507,19 +507,15 @@ class CloudTestCase(test.TestCase):
         """Makes sure describe_instances works and filters results."""
         self.flags(use_ipv6=True)
 
-        def fake_get_instance_nw_info(self, context, instance):
-            return [(None, {'label': 'public',
-                            'ips': [{'ip': '192.168.0.3'},
-                                    {'ip': '192.168.0.4'}],
-                            'ip6s': [{'ip': 'fe80::beef'}]})]
+        def fake_get_addresses_by_instances(self, context, instances):
+            return dict((instance['id'],
+                         {'ips': ['192.168.0.3', '192.168.0.4'],
+                          'ip6s': ['fe80::beef'],
+                          'floating_ips': ['1.2.3.4', '5.6.7.8']})
+                        for instance in instances)
 
-        def fake_get_floating_ips_by_fixed_address(self, context, fixed_ip):
-            return ['1.2.3.4', '5.6.7.8']
-
-        self.stubs.Set(network.API, 'get_instance_nw_info',
-                fake_get_instance_nw_info)
-        self.stubs.Set(network.API, 'get_floating_ips_by_fixed_address',
-                fake_get_floating_ips_by_fixed_address)
+        self.stubs.Set(network.API, 'get_addresses_by_instances',
+                fake_get_addresses_by_instances)
 
         inst1 = db.instance_create(self.context, {'reservation_id': 'a',
                                                   'image_ref': 1,
@@ -566,19 +562,15 @@ class CloudTestCase(test.TestCase):
         """Makes sure describe_instances w/ no ipv6 works."""
         self.flags(use_ipv6=False)
 
-        def fake_get_instance_nw_info(self, context, instance):
-            return [(None, {'label': 'public',
-                            'ips': [{'ip': '192.168.0.3'},
-                                    {'ip': '192.168.0.4'}],
-                            'ip6s': [{'ip': 'fe80::beef'}]})]
-
-        def fake_get_floating_ips_by_fixed_address(self, context, fixed_ip):
-            return ['1.2.3.4', '5.6.7.8']
+        def fake_get_addresses_by_instances(self, context, instances):
+            return dict((instance['id'],
+                         {'ips': ['192.168.0.3', '192.168.0.4'],
+                          'ip6s': ['fe80::beef'],
+                          'floating_ips': ['1.2.3.4', '5.6.7.8']})
+                        for instance in instances)
 
-        self.stubs.Set(network.API, 'get_instance_nw_info',
-                fake_get_instance_nw_info)
-        self.stubs.Set(network.API, 'get_floating_ips_by_fixed_address',
-                fake_get_floating_ips_by_fixed_address)
+        self.stubs.Set(network.API, 'get_addresses_by_instances',
+                fake_get_addresses_by_instances)
 
         inst1 = db.instance_create(self.context, {'reservation_id': 'a',
                                                   'image_ref': 1,
@@ -621,6 +613,88 @@ class CloudTestCase(test.TestCase):
         self.assertEqual(result1[0]['instanceId'],
                          ec2utils.id_to_ec2_id(inst2.id))
 
+    def test_describe_instances_query_count(self):
+        """Make sure describe_instances doesn't query once per instance."""
+        network_ref = db.project_get_networks(self.context, 'fake')[0]
+        db.service_create(self.context, {'host': 'host1',
+                                         'availability_zone': 'zone1',
+                                         'topic': 'compute'})
+
+        def _create_instance(num):
+            inst = db.instance_create(self.context,
+                                      {'reservation_id': 'a',
+                                       'image_ref': 1,
+                                       'instance_type_id': 1,
+                                       'host': 'host1',
+                                       'vm_state': 'active'})
+            vif = db.virtual_interface_create(self.context,
+                    {'address': '56:12:12:12:12:%02x' % num,
+                     'network_id': network_ref['id'],
+                     'instance_id': inst['id']})
+            address = '10.10.10.%d' % num
+            db.fixed_ip_create(self.context,
+                               {'address': address,
+                                'network_id': network_ref['id'],
+                                'virtual_interface_id': vif['id'],
+                                'allocated': True,
+                                'instance_id': inst['id']})
+            fixed_ip = db.fixed_ip_get_by_address(self.context, address)
+            db.floating_ip_create(self.context,
+                                  {'address': '1.2.3.%d' % num,
+                                   'fixed_ip_id': fixed_ip['id']})
+            self._block_device_mapping_create(inst['id'],
+                    [{'instance_id': inst['id'],
+                      'device_name': '/dev/sdb1',
+                      'volume_id': str(100 + num)}])
+
+        class CountingBackend(object):
+            def __init__(self, backend):
+                self.backend = backend
+                self.calls = []
+
+            def __getattr__(self, key):
+                self.calls.append(key)
+                return getattr(self.backend, key)
+
+        rpc_call = rpc.call
+
+        def _count_calls():
+            # NOTE: warm the availability zone map first, it is only loaded
+            #       once per process.
+            self.cloud.describe_instances(self.context)
+            backend = CountingBackend(db.api.IMPL)
+            rpc_calls = []
+
+            def counting_rpc_call(context, topic, msg, *args, **kwargs):
+                rpc_calls.append(msg['method'])
+                return rpc_call(context, topic, msg, *args, **kwargs)
+
+            self.stubs.Set(db.api, 'IMPL', backend)
+            self.stubs.Set(rpc, 'call', counting_rpc_call)
+            result = self.cloud.describe_instances(self.context)
+            self.stubs.UnsetAll()
+            return result, len(backend.calls), len(rpc_calls)
+
+        _create_instance(1)
+        result, db_calls, rpc_calls = _count_calls()
+        instances = result['reservationSet'][0]['instancesSet']
+        self.assertEqual(len(instances), 1)
+        self.assertEqual(instances[0]['privateIpAddress'], '10.10.10.1')
+        self.assertEqual(instances[0]['ipAddress'], '1.2.3.1')
+        self.assertEqual(instances[0]['placement']['availabilityZone'],
+                         'zone1')
+        self.assertEqual(len(instances[0]['blockDeviceMapping']), 1)
+
+        for num in xrange(2, 6):
+            _create_instance(num)
+        result, more_db_calls, more_rpc_calls = _count_calls()
+        instances = result['reservationSet'][0]['instancesSet']
+        self.assertEqual(len(instances), 5)
+        self.assertEqual(sorted(i['ipAddress'] for i in instances),
+                         ['1.2.3.%d' % num for num in xrange(1, 6)])
+        self.assertEqual(db_calls, more_db_calls)
+        self.assertEqual(rpc_calls, more_rpc_calls)
+
     def _block_device_mapping_create(self, instance_id, mappings):
         volumes = []
         for bdm in mappings:
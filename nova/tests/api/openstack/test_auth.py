@@ -87,6 +87,36 @@ class Test(test.TestCase):
         self.assertEqual(result.status, '200 OK')
         self.assertEqual(result.headers['X-Test-Success'], 'True')
 
+    def test_authorize_token_cached(self):
+        f = fakes.FakeAuthManager()
+        user = nova.auth.manager.User('id1', 'user1', 'user1_key', None, None)
+        f.add_user(user)
+        f.create_project('user1_project', user)
+
+        req = webob.Request.blank('/v1.0/', {'HTTP_HOST': 'foo'})
+        req.headers['X-Auth-User'] = 'user1'
+        req.headers['X-Auth-Key'] = 'user1_key'
+        result = req.get_response(fakes.wsgi_app(fake_auth=False))
+        token = result.headers['X-Auth-Token']
+
+        self.stubs.Set(nova.api.openstack, 'APIRouterV10', fakes.FakeRouter)
+        req = webob.Request.blank('/v1.0/user1_project')
+        req.headers['X-Auth-Token'] = token
+        result = req.get_response(fakes.wsgi_app(fake_auth=False))
+        self.assertEqual(result.status, '200 OK')
+
+        def not_called(*args, **kwargs):
+            self.fail('identity lookup was not cached')
+
+        self.stubs.Set(fakes.FakeAuthDatabase, 'auth_token_get', not_called)
+        self.stubs.Set(fakes.FakeAuthManager, 'get_projects', not_called)
+        self.stubs.Set(fakes.FakeAuthManager, 'is_admin', not_called)
+        req = webob.Request.blank('/v1.0/user1_project')
+        req.headers['X-Auth-Token'] = token
+        result = req.get_response(fakes.wsgi_app(fake_auth=False))
+        self.assertEqual(result.status, '200 OK')
+        self.assertEqual(result.headers['X-Test-Success'], 'True')
+
     def test_token_expiry(self):
         self.destroy_called = False
         token_hash = 'token_hash'
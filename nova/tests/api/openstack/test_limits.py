@@ -726,6 +726,84 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class MemcachedLimiterTest(LimiterTest):
+    """
+    Tests for the `limits.MemcachedLimiter` class.
+    """
+
+    def setUp(self):
+        """Run before each test."""
+        BaseLimitTestSuite.setUp(self)
+        userlimits = {'user:user3': ''}
+        self.limiter = limits.MemcachedLimiter(TEST_LIMITS, **userlimits)
+
+    def test_shared_between_limiters(self):
+        """Ensure limiters sharing a memcached share request history."""
+        other = limits.MemcachedLimiter(TEST_LIMITS)
+        other.mc = self.limiter.mc
+
+        expected = [None] * 10
+        results = list(self._check(10, "PUT", "/anything"))
+        self.assertEqual(expected, results)
+
+        self.assertEqual(6.0, other.check_for_delay("PUT", "/anything")[0])
+        self.assertEqual((None, None),
+                         other.check_for_delay("PUT", "/anything", "user1"))
+
+    def test_get_limits(self):
+        """Ensure remaining requests are read back from memcached."""
+        list(self._check(4, "PUT", "/anything"))
+        remaining = [limit["remaining"]
+                     for limit in self.limiter.get_limits()]
+        self.assertEqual([1, 7, 3, 6, 5], remaining)
+
+    def test_sweep_resets_cas_ids(self):
+        """Ensure the cas ids of the memcached client are dropped."""
+        resets = []
+        self.limiter.mc.reset_cas = lambda: resets.append(1)
+        self.limiter.sweep_interval = 3
+        list(self._check(3, "PUT", "/anything"))
+        self.assertEqual(1, len(resets))
+
+
+class LimiterBucketTest(BaseLimitTestSuite):
+    """
+    Tests for the per-user request history of the in-memory
+    `limits.Limiter` class.
+    """
+
+    def setUp(self):
+        """Run before each test."""
+        BaseLimitTestSuite.setUp(self)
+        self.limiter = limits.Limiter(TEST_LIMITS)
+
+    def test_only_matching_verbs_are_tracked(self):
+        """Ensure a request only keeps history for limits it matched."""
+        self.limiter.check_for_delay("GET", "/anything", "user1")
+        self.assertEqual({}, self.limiter._buckets)
+
+        self.limiter.check_for_delay("PUT", "/anything", "user1")
+        self.assertEqual([3], self.limiter._buckets["user1"].keys())
+
+    def test_limits_are_not_modified(self):
+        """Ensure the limits passed in keep no request history."""
+        self.limiter.check_for_delay("GET", "/delayed", "user1")
+        self.assertEqual(None, TEST_LIMITS[0].last_request)
+        self.assertEqual(1, TEST_LIMITS[0].remaining)
+        self.assertEqual(0, self.limiter.get_limits("user1")[0]["remaining"])
+
+    def test_idle_users_are_swept(self):
+        """Ensure users are forgotten once their limits are back to full."""
+        self.limiter.sweep_interval = 3
+        self.limiter.check_for_delay("PUT", "/anything", "user1")
+        self.limiter.check_for_delay("PUT", "/anything", "user2")
+        self.assertEqual(2, len(self.limiter._buckets))
+
+        self.time += 6.0
+        self.limiter.check_for_delay("PUT", "/anything", "user2")
+        self.assertEqual(["user2"], self.limiter._buckets.keys())
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """
     Tests for `limits.WsgiLimiter` class.
@@ -796,6 +874,22 @@ class WsgiLimiterTest(BaseLimitTestSuite):
         delay = self._request("GET", "/delayed", "user2")
         self.assertEqual(delay, '60.00')
 
+    def test_batched_checks(self):
+        request = webob.Request.blank("/")
+        request.method = "POST"
+        request.body = json.dumps([
+            {"verb": "GET", "path": "/delayed", "username": "user1"},
+            {"verb": "GET", "path": "/delayed", "username": "user2"},
+            {"verb": "GET", "path": "/delayed", "username": "user1"},
+        ])
+        response = request.get_response(self.app)
+        self.assertEqual(response.status_int, 200)
+
+        results = json.loads(response.body)
+        self.assertEqual([None, None], results[0])
+        self.assertEqual([None, None], results[1])
+        self.assertEqual(60.0, results[2][0])
+
 
 class FakeHttplibSocket(object):
     """
@@ -914,6 +1008,15 @@ class WsgiLimiterProxyTest(BaseLimitTestSuite):
 
         self.assertEqual((delay, error), expected)
 
+    def test_check_for_delays(self):
+        """Batched request test."""
+        results = self.proxy.check_for_delays([("GET", "/delayed", None),
+                                               ("GET", "/anything", None),
+                                               ("GET", "/delayed", None)])
+        self.assertEqual((None, None), results[0])
+        self.assertEqual((None, None), results[1])
+        self.assertEqual(60.0, results[2][0])
+
 
 class LimitsViewBuilderV11Test(test.TestCase):
 
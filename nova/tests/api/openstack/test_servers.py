@@ -93,7 +93,14 @@ def return_server_with_uuid_and_state(vm_state, task_state):
 
 
 def return_servers(context, *args, **kwargs):
-    return [stub_instance(i, 'fake', 'fake') for i in xrange(5)]
+    servers = [stub_instance(i, 'fake', 'fake') for i in xrange(5)]
+    marker = kwargs.get('marker')
+    if marker is not None:
+        servers = servers[marker + 1:]
+    limit = kwargs.get('limit')
+    if limit is not None:
+        servers = servers[:limit]
+    return servers
 
 
 def return_servers_by_reservation(context, reservation_id=""):
@@ -1227,9 +1234,42 @@ class ServersTest(test.TestCase):
         self.assertEqual(res.status_int, 400)
         self.assertTrue(res.body.find('marker param') > -1)
 
+    def test_get_servers_pagination_pushed_down_v1_1(self):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
+            self.assertEqual(limit, 2)
+            self.assertEqual(marker, 1)
+            self.assertFalse('limit' in search_opts)
+            self.assertFalse('marker' in search_opts)
+            return [stub_instance(3), stub_instance(2)]
+
+        self.stubs.Set(nova.compute.API, 'get_all', fake_get_all)
+        self.flags(allow_admin_api=True)
+
+        req = webob.Request.blank('/v1.1/fake/servers?limit=2&marker=1')
+        context = nova.context.RequestContext('testuser', 'testproject',
+                is_admin=True)
+        res = req.get_response(fakes.wsgi_app(fake_auth_context=context))
+        self.assertEqual(res.status_int, 200)
+        res_dict = json.loads(res.body)
+        self.assertEqual([s['id'] for s in res_dict['servers']], [3, 2])
+        self.assertTrue('marker=2' in res_dict['servers_links'][0]['href'])
+
+    def test_get_servers_with_unknown_marker_v1_1(self):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
+            raise exception.MarkerNotFound(marker=marker)
+
+        self.stubs.Set(nova.compute.API, 'get_all', fake_get_all)
+
+        req = webob.Request.blank('/v1.1/fake/servers?marker=99')
+        res = req.get_response(fakes.wsgi_app())
+        self.assertEqual(res.status_int, 400)
+
     def test_get_servers_with_bad_option_v1_0(self):
         # 1.0 API ignores unknown options
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             return [stub_instance(100)]
 
         self.stubs.Set(nova.compute.API, 'get_all', fake_get_all)
@@ -1243,7 +1283,8 @@ class ServersTest(test.TestCase):
 
     def test_get_servers_with_bad_option_v1_1(self):
         # 1.1 API also ignores unknown options
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             return [stub_instance(100)]
 
         self.stubs.Set(nova.compute.API, 'get_all', fake_get_all)
@@ -1256,7 +1297,8 @@ class ServersTest(test.TestCase):
         self.assertEqual(servers[0]['id'], 100)
 
     def test_get_servers_allows_image_v1_1(self):
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('image' in search_opts)
             self.assertEqual(search_opts['image'], '12345')
@@ -1275,7 +1317,7 @@ class ServersTest(test.TestCase):
         self.assertEqual(servers[0]['id'], 100)
 
     def test_tenant_id_filter_converts_to_project_id_for_admin(self):
-        def fake_get_all(context, filters=None, instances=None):
+        def fake_get_all(context, filters=None, limit=None, marker=None):
             self.assertNotEqual(filters, None)
             self.assertEqual(filters['project_id'], 'faketenant')
             self.assertFalse(filters.get('tenant_id'))
@@ -1295,7 +1337,8 @@ class ServersTest(test.TestCase):
         self.assertEqual(res.status_int, 200)
 
     def test_get_servers_allows_flavor_v1_1(self):
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('flavor' in search_opts)
             # flavor is an integer ID
@@ -1315,7 +1358,8 @@ class ServersTest(test.TestCase):
         self.assertEqual(servers[0]['id'], 100)
 
     def test_get_servers_allows_status_v1_1(self):
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('vm_state' in search_opts)
             self.assertEqual(search_opts['vm_state'], vm_states.ACTIVE)
@@ -1342,7 +1386,8 @@ class ServersTest(test.TestCase):
         self.assertTrue(res.body.find('Invalid server status') > -1)
 
     def test_get_servers_allows_name_v1_1(self):
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('name' in search_opts)
             self.assertEqual(search_opts['name'], 'whee.*')
@@ -1361,7 +1406,8 @@ class ServersTest(test.TestCase):
         self.assertEqual(servers[0]['id'], 100)
 
     def test_get_servers_allows_changes_since_v1_1(self):
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('changes-since' in search_opts)
             changes_since = datetime.datetime(2011, 1, 24, 17, 8, 1)
@@ -1394,7 +1440,8 @@ class ServersTest(test.TestCase):
 
         self.flags(allow_admin_api=False)
 
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             # Allowed by user
             self.assertTrue('name' in search_opts)
@@ -1428,7 +1475,8 @@ class ServersTest(test.TestCase):
 
         self.flags(allow_admin_api=True)
 
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             # Allowed by user
             self.assertTrue('name' in search_opts)
@@ -1461,7 +1509,8 @@ class ServersTest(test.TestCase):
 
         self.flags(allow_admin_api=True)
 
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             # Allowed by user
             self.assertTrue('name' in search_opts)
@@ -1492,7 +1541,8 @@ class ServersTest(test.TestCase):
         """
         self.flags(allow_admin_api=True)
 
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('ip' in search_opts)
             self.assertEqual(search_opts['ip'], '10\..*')
@@ -1518,7 +1568,8 @@ class ServersTest(test.TestCase):
         """
         self.flags(allow_admin_api=True)
 
-        def fake_get_all(compute_self, context, search_opts=None):
+        def fake_get_all(compute_self, context, search_opts=None,
+                         limit=None, marker=None):
             self.assertNotEqual(search_opts, None)
             self.assertTrue('ip6' in search_opts)
             self.assertEqual(search_opts['ip6'], 'ffff.*')
@@ -187,6 +187,10 @@ def stub_out_db_network_api(stubs):
             ip[key] = values[key]
         return ip['address']
 
+    def fake_fixed_ip_create_many(context, values_iter):
+        for values in values_iter:
+            fake_fixed_ip_create(context, values)
+
     def fake_fixed_ip_disassociate(context, address):
         ips = filter(lambda i: i['address'] == address,
                      fixed_ips)
@@ -319,6 +323,7 @@ def stub_out_db_network_api(stubs):
              fake_fixed_ip_associate,
              fake_fixed_ip_associate_pool,
              fake_fixed_ip_create,
+             fake_fixed_ip_create_many,
              fake_fixed_ip_disassociate,
              fake_fixed_ip_disassociate_all_by_timeout,
              fake_fixed_ip_get_by_instance,
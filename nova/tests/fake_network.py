@@ -15,6 +15,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import re
+
 from nova import db
 from nova import exception
 from nova import flags
@@ -87,24 +89,59 @@ class FakeNetworkManager(network_manager.NetworkManager):
             raise exception.NoNetworksFound()
 
         def virtual_interface_get_all(self, context):
+            return self._vifs()
+
+        def _vifs(self):
             floats = [{'address': '172.16.1.1'},
                       {'address': '172.16.1.2'},
                       {'address': '173.16.1.2'}]
+            networks = [{'cidr_v6': '2001:db8::/64', 'project_id': 'fake'},
+                        {'cidr_v6': '2002:db8::/64', 'project_id': 'fake'}]
 
-            vifs = [{'instance_id': 0,
+            vifs = [{'id': 1,
+                     'address': 'de:ad:be:ef:00:01',
+                     'instance_id': 0,
                      'fixed_ipv6': '2001:db8::dcad:beff:feef:1',
+                     'network': networks[0],
                      'fixed_ips': [{'address': '172.16.0.1',
                                     'floating_ips': [floats[0]]}]},
-                    {'instance_id': 20,
+                    {'id': 2,
+                     'address': 'de:ad:be:ef:00:02',
+                     'instance_id': 20,
                      'fixed_ipv6': '2001:db8::dcad:beff:feef:2',
+                     'network': networks[0],
                      'fixed_ips': [{'address': '172.16.0.2',
                                     'floating_ips': [floats[1]]}]},
-                    {'instance_id': 30,
+                    {'id': 3,
+                     'address': 'de:ad:be:ef:00:03',
+                     'instance_id': 30,
                      'fixed_ipv6': '2002:db8::dcad:beff:feef:2',
+                     'network': networks[1],
                      'fixed_ips': [{'address': '173.16.0.2',
                                     'floating_ips': [floats[2]]}]}]
             return vifs
 
+        def virtual_interface_get_by_ip_regexp(self, context, regexp):
+            if re.search('[\\[\\](|]', regexp):
+                return None
+            ip_filter = re.compile(regexp)
+            vifs = []
+            for vif in self._vifs():
+                addresses = []
+                for fixed_ip in vif['fixed_ips']:
+                    addresses.append(fixed_ip['address'])
+                    addresses.extend([floating_ip['address'] for floating_ip
+                                      in fixed_ip['floating_ips']])
+                if [address for address in addresses
+                    if ip_filter.match(address)]:
+                    vifs.append(vif)
+            return vifs
+
+        def virtual_interface_get_by_address(self, context, address):
+            for vif in self._vifs():
+                if vif['address'] == address:
+                    return vif
+
         def instance_get_id_to_uuid_mapping(self, context, ids):
             # NOTE(jkoelker): This is just here until we can rely on UUIDs
             mapping = {}
@@ -17,6 +17,7 @@
 
 
 import datetime
+import hashlib
 import stubout
 
 from nova.tests.api.openstack import fakes
@@ -463,3 +464,23 @@ class TestGlanceImageService(test.TestCase):
         image_meta = self.service.get(self.context, image_id, writer)
         self.assertEqual(image_meta['created_at'], self.NOW_DATETIME)
         self.assertEqual(image_meta['updated_at'], self.NOW_DATETIME)
+
+    def _stub_image_data(self, image_id, chunks):
+        client = self.service._get_client(self.context)
+        image_meta = client.get_image_meta(image_id)
+        self.stubs.Set(client, 'get_image',
+                       lambda image_id: (image_meta, chunks))
+
+    def test_get_verifies_checksum(self):
+        fixture = self._make_fixture(checksum=hashlib.md5('data').hexdigest())
+        image_id = self.service.create(self.context, fixture)['id']
+        self._stub_image_data(image_id, ['da', 'ta'])
+        self.service.get(self.context, image_id, NullWriter())
+
+    def test_get_raises_on_checksum_mismatch(self):
+        fixture = self._make_fixture(checksum=hashlib.md5('data').hexdigest())
+        image_id = self.service.create(self.context, fixture)['id']
+        self._stub_image_data(image_id, ['da', 'ta', 'corrupt'])
+        self.assertRaises(exception.ImageChecksumMismatch,
+                          self.service.get, self.context, image_id,
+                          NullWriter())
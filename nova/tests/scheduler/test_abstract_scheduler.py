@@ -74,6 +74,7 @@ class FakeBaseScheduler(base_scheduler.BaseScheduler):
 
 class FakeZoneManager(zone_manager.ZoneManager):
     def __init__(self):
+        super(FakeZoneManager, self).__init__()
         self.service_states = {
             'host1': {
                 'compute': {'host_memory_free': 1073741824},
@@ -92,6 +93,7 @@ class FakeZoneManager(zone_manager.ZoneManager):
 
 class FakeEmptyZoneManager(zone_manager.ZoneManager):
     def __init__(self):
+        super(FakeEmptyZoneManager, self).__init__()
         self.service_states = {}
 
 
@@ -435,6 +437,115 @@ class AbstractSchedulerTestCase(test.TestCase):
         self.assertFalse(instances[0].get('_is_precooked', False))
         nova.db.instance_destroy(fake_context, instances[0]['id'])
 
+    def test_run_instance_debits_host_states(self):
+        """Instances placed by one request must be visible to the next
+        one before the hosts report again."""
+        sched = FakeAbstractScheduler()
+        provisioned = []
+
+        def fake_create_instance_db_entry(context, request_spec):
+            return {'id': len(provisioned) + 1}
+
+        def fake_cast_to_compute_host(context, host, method, **kwargs):
+            provisioned.append(host)
+
+        self.stubs.Set(sched, 'create_instance_db_entry',
+                       fake_create_instance_db_entry)
+        self.stubs.Set(driver, 'cast_to_compute_host',
+                       fake_cast_to_compute_host)
+        self.stubs.Set(sched, '_call_zone_method',
+                       fake_empty_call_zone_method)
+        self.stubs.Set(nova.db, 'zone_get_all', fake_zone_get_all)
+
+        zm = FakeZoneManager()
+        sched.set_zone_manager(zm)
+
+        fake_context = context.RequestContext('user', 'project')
+        request_spec = {'instance_type': {'memory_mb': 1024},
+                        'num_instances': 1}
+        # host1 has room for 1 instance, host2 for 2, host3 for 3 and
+        # host4 for none.
+        for i in xrange(6):
+            sched.schedule_run_instance(fake_context, request_spec)
+        self.assertRaises(driver.NoValidHost, sched.schedule_run_instance,
+                          fake_context, request_spec)
+
+        self.assertEqual(6, len(provisioned))
+        self.assertEqual(1, provisioned.count('host1'))
+        self.assertEqual(2, provisioned.count('host2'))
+        self.assertEqual(3, provisioned.count('host3'))
+        self.assertEqual(0, zm.service_states['host3']['compute']
+                                             ['host_memory_free'])
+
+    def test_run_instance_replans_when_hosts_fill_up(self):
+        """A single request for more instances than the first plan holds
+        should keep placing instances until the hosts are full."""
+        sched = FakeAbstractScheduler()
+        provisioned = []
+
+        def fake_create_instance_db_entry(context, request_spec):
+            return {'id': len(provisioned) + 1}
+
+        def fake_cast_to_compute_host(context, host, method, **kwargs):
+            provisioned.append(host)
+
+        self.stubs.Set(sched, 'create_instance_db_entry',
+                       fake_create_instance_db_entry)
+        self.stubs.Set(driver, 'cast_to_compute_host',
+                       fake_cast_to_compute_host)
+        self.stubs.Set(sched, '_call_zone_method',
+                       fake_empty_call_zone_method)
+        self.stubs.Set(nova.db, 'zone_get_all', fake_zone_get_all)
+
+        zm = FakeZoneManager()
+        sched.set_zone_manager(zm)
+
+        fake_context = context.RequestContext('user', 'project')
+        request_spec = {'instance_type': {'memory_mb': 512},
+                        'num_instances': 20}
+        instances = sched.schedule_run_instance(fake_context, request_spec)
+
+        # 2 + 4 + 6 + 1 half-gig slots across the four hosts.
+        self.assertEqual(13, len(instances))
+        self.assertEqual(13, len(provisioned))
+
+    def test_run_instance_batch_placement(self):
+        """With batch placement every local instance is created at once
+        and each host gets a single cast."""
+        self.flags(scheduler_batch_placement=True)
+        sched = FakeAbstractScheduler()
+        casts = []
+
+        def fake_create_instance_db_entries(context, request_spec, hosts):
+            return [{'id': num, 'host': host}
+                    for num, host in enumerate(hosts)]
+
+        def fake_cast_to_compute_host(context, host, method, **kwargs):
+            casts.append((host, method, kwargs['instance_ids']))
+
+        self.stubs.Set(sched, 'create_instance_db_entries',
+                       fake_create_instance_db_entries)
+        self.stubs.Set(driver, 'cast_to_compute_host',
+                       fake_cast_to_compute_host)
+        self.stubs.Set(sched, '_call_zone_method',
+                       fake_empty_call_zone_method)
+        self.stubs.Set(nova.db, 'zone_get_all', fake_zone_get_all)
+
+        zm = FakeZoneManager()
+        sched.set_zone_manager(zm)
+
+        fake_context = context.RequestContext('user', 'project')
+        request_spec = {'instance_type': {'memory_mb': 1024},
+                        'num_instances': 6}
+        instances = sched.schedule_run_instance(fake_context, request_spec)
+
+        self.assertEqual(6, len(instances))
+        self.assertEqual(3, len(casts))
+        placed = dict((host, len(ids)) for host, method, ids in casts)
+        self.assertEqual({'host1': 1, 'host2': 2, 'host3': 3}, placed)
+        for host, method, ids in casts:
+            self.assertEqual('run_instances', method)
+
 
 class BaseSchedulerTestCase(test.TestCase):
     """Test case for Base Scheduler."""
@@ -61,6 +61,36 @@ class WeightedSumTestCase(test.TestCase):
         expected = [1.5, 2.5, 1.5]
         self.assertEqual(expected, costs)
 
+    def test_columnar_costing(self):
+        hosts = [('host1', {'host_memory_free': 512 * MB, 'io': 100}),
+                 ('host2', {'host_memory_free': 256 * MB, 'io': 400}),
+                 ('host3', {'host_memory_free': 512 * MB, 'io': 100})]
+
+        @least_cost.columnar(lambda columns: columns.column('io'))
+        def io_cost_fn(host):
+            self.fail("Columnar form should have been used")
+
+        # Has no columnar form, so it is called once per host.
+        def free_ram_cost_fn(host):
+            hostname, caps = host
+            return caps['host_memory_free']
+
+        weighted_fns = [(1, free_ram_cost_fn), (2, io_cost_fn)]
+        columns = least_cost.HostColumns('compute', hosts)
+        costs = least_cost.weighted_sum(domain=hosts,
+                weighted_fns=weighted_fns, columns=columns)
+        self.assertEqual([1.5, 2.5, 1.5], costs)
+
+    def test_host_columns(self):
+        hosts = [('host1', {'compute': {'host_memory_free': 1}}),
+                 ('host2', {'host_memory_free': 2}),
+                 ('host3', {})]
+        columns = least_cost.HostColumns('compute', hosts)
+        self.assertEqual(3, len(columns))
+        self.assertEqual(['host1', 'host2', 'host3'], columns.hostnames)
+        self.assertEqual([1, 2, 0], columns.column('host_memory_free'))
+        self.assertEqual([None] * 3, columns.column('disk', default=None))
+
 
 class LeastCostSchedulerTestCase(test.TestCase):
     def setUp(self):
@@ -643,6 +643,42 @@ class SimpleDriverTestCase(test.TestCase):
         compute1.kill()
         compute2.kill()
 
+    def test_batch_placement_groups_casts_by_host(self):
+        """Ensures a batch is spread over the hosts with one cast each"""
+        self.flags(scheduler_batch_placement=True)
+        compute1 = self.start_service('compute', host='host1')
+        compute2 = self.start_service('compute', host='host2')
+
+        def _fake_create_instance_db_entries(simple_self, context,
+                                             request_spec, hosts):
+            return [_create_instance(host=host) for host in hosts]
+
+        casts = []
+
+        def _fake_cast_to_compute_host(context, host, method, **kwargs):
+            casts.append((host, method, kwargs['instance_ids']))
+
+        self.stubs.Set(SimpleScheduler, 'create_instance_db_entries',
+                       _fake_create_instance_db_entries)
+        self.stubs.Set(driver, 'cast_to_compute_host',
+                       _fake_cast_to_compute_host)
+
+        request_spec = _create_request_spec()
+        request_spec['num_instances'] = 4
+        instances = self.scheduler.driver.schedule_run_instance(
+                self.context, request_spec)
+        self.assertEqual(len(instances), 4)
+        self.assertEqual(sorted([host for host, method, ids in casts]),
+                         ['host1', 'host2'])
+        for host, method, instance_ids in casts:
+            self.assertEqual(method, 'run_instances')
+            self.assertEqual(len(instance_ids), 2)
+
+        for instance in instances:
+            db.instance_destroy(self.context, instance['id'])
+        compute1.kill()
+        compute2.kill()
+
     def test_specific_host_gets_instance(self):
         """Ensures if you set availability_zone it launches on that zone"""
         compute1 = self.start_service('compute', host='host1')
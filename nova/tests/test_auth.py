@@ -23,9 +23,11 @@ from nova import crypto
 from nova import flags
 from nova import log as logging
 from nova import test
+from nova import utils
 from nova.auth import manager
 from nova.api.ec2 import cloud
 from nova.auth import fakeldap
+from nova.auth import ldapdriver
 
 FLAGS = flags.FLAGS
 LOG = logging.getLogger('nova.tests.auth_unittest')
@@ -376,6 +378,7 @@ class AuthManagerLdapTestCase(_AuthManagerBaseTestCase):
     auth_driver = 'nova.auth.ldapdriver.FakeLdapDriver'
 
     def test_reconnect_on_server_failure(self):
+        self.flags(ldap_cache_ttl=0)
         self.manager.get_users()
         fakeldap.server_fail = True
         try:
@@ -384,6 +387,68 @@ class AuthManagerLdapTestCase(_AuthManagerBaseTestCase):
             fakeldap.server_fail = False
         self.manager.get_users()
 
+    def test_connections_are_reused(self):
+        with self.manager.driver() as drv:
+            conn = drv.conn
+        with self.manager.driver() as drv:
+            self.assertTrue(drv.conn is conn)
+            with self.manager.driver() as nested:
+                self.assertFalse(nested.conn is conn)
+
+    def test_idle_connection_is_checked(self):
+        self.flags(ldap_cache_ttl=0)
+        self.manager.get_users()
+        with self.manager.driver() as drv:
+            conn = drv.conn
+            ldap_conn = conn.conn
+        utils.set_time_override(utils.utcnow())
+        try:
+            utils.advance_time_seconds(FLAGS.ldap_pool_check_interval)
+            fakeldap.server_fail = True
+            try:
+                with self.manager.driver() as drv:
+                    self.assertTrue(drv.conn is conn)
+                    self.assertEqual(None, conn.conn)
+            finally:
+                fakeldap.server_fail = False
+        finally:
+            utils.clear_time_override()
+        self.manager.get_users()
+        self.assertFalse(conn.conn is ldap_conn)
+
+    def test_reads_are_cached(self):
+        searches = []
+        real_search_s = fakeldap.FakeLDAP.search_s
+
+        def counting_search_s(*args, **kwargs):
+            searches.append(args)
+            return real_search_s(*args, **kwargs)
+
+        with user_generator(self.manager):
+            self.stubs.Set(fakeldap.FakeLDAP, 'search_s', counting_search_s)
+            self.manager.get_user('test1')
+            count = len(searches)
+            self.assertTrue(count > 0)
+            self.manager.get_user('test1')
+            self.assertEqual(count, len(searches))
+
+    def test_writes_invalidate_cache(self):
+        with user_generator(self.manager):
+            self.assertFalse(self.manager.get_user('test1').is_admin())
+            self.manager.modify_user('test1', admin=True)
+            self.assertTrue(self.manager.get_user('test1').is_admin())
+
+    def test_cache_expires(self):
+        cache = ldapdriver.LDAPReadCache()
+        utils.set_time_override()
+        try:
+            cache.set('key', 'value')
+            self.assertEqual('value', cache.get('key'))
+            utils.advance_time_seconds(FLAGS.ldap_cache_ttl)
+            self.assertEqual(None, cache.get('key'))
+        finally:
+            utils.clear_time_override()
+
 
 class AuthManagerDbTestCase(_AuthManagerBaseTestCase):
     auth_driver = 'nova.auth.dbdriver.DbDriver'
@@ -0,0 +1,61 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the host to availability zone map."""
+
+from nova import availability_zones
+from nova import context
+from nova import db
+from nova import test
+from nova import utils
+
+
+class AvailabilityZonesTestCase(test.TestCase):
+    def setUp(self):
+        super(AvailabilityZonesTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.flags(availability_zone_cache_interval=60)
+        utils.set_time_override()
+        self.service = db.service_create(self.context,
+                                         {'host': 'host1',
+                                          'topic': 'compute',
+                                          'availability_zone': 'zone1'})
+
+    def tearDown(self):
+        utils.clear_time_override()
+        super(AvailabilityZonesTestCase, self).tearDown()
+
+    def test_map_is_cached_until_interval(self):
+        self.assertEqual('zone1',
+                availability_zones.get_host_availability_zone('host1'))
+        db.service_update(self.context, self.service['id'],
+                          {'availability_zone': 'zone2'})
+        self.assertEqual('zone1',
+                availability_zones.get_host_availability_zone('host1'))
+        utils.advance_time_seconds(60)
+        self.assertEqual('zone2',
+                availability_zones.get_host_availability_zone('host1'))
+
+    def test_reset(self):
+        self.assertEqual(availability_zones.UNKNOWN_ZONE,
+                availability_zones.get_host_availability_zone('host2'))
+        db.service_create(self.context, {'host': 'host2',
+                                         'topic': 'compute',
+                                         'availability_zone': 'zone2'})
+        availability_zones.reset()
+        self.assertEqual('zone2',
+                availability_zones.get_host_availability_zone('host2'))
@@ -90,7 +90,7 @@ def rpc_cast_wrapper(context, topic, msg):
     rpc_call_wrapper(context, topic, msg, do_cast=True)
 
 
-def nop_report_driver_status(self):
+def nop_report_driver_status(self, context):
     pass
 
 
@@ -202,6 +202,38 @@ class ComputeTestCase(test.TestCase):
             db.security_group_destroy(self.context, group['id'])
             db.instance_destroy(self.context, ref[0]['id'])
 
+    def test_create_db_entries_for_new_instances(self):
+        """Make sure batch creation sets hosts, groups and names"""
+        group = self._create_group()
+        base_options = {'image_ref': 1,
+                        'reservation_id': 'r-fakeres',
+                        'user_id': self.user_id,
+                        'project_id': self.project_id,
+                        'display_name': None}
+        instances = self.compute_api.create_db_entries_for_new_instances(
+                self.context, instance_types.get_default_instance_type(),
+                {'properties': {}}, base_options, ['testgroup'], [],
+                [{'host': 'host1'}, {'host': 'host2'}])
+        try:
+            self.assertEqual(['host1', 'host2'],
+                             [instance['host'] for instance in instances])
+            for num, instance in enumerate(instances, 1):
+                instance_id = instance['id']
+                self.assertEqual(num, instance['launch_index'])
+                self.assertEqual('Server %s' % instance_id,
+                                 instance['display_name'])
+                self.assertEqual('server-%s' % instance_id,
+                                 instance['hostname'])
+                self.assertEqual(vm_states.BUILDING, instance['vm_state'])
+                self.assertEqual(task_states.SCHEDULING,
+                                 instance['task_state'])
+                self.assertEqual(len(db.security_group_get_by_instance(
+                                 self.context, instance_id)), 1)
+        finally:
+            for instance in instances:
+                db.instance_destroy(self.context, instance['id'])
+            db.security_group_destroy(self.context, group['id'])
+
     def test_create_instance_with_invalid_security_group_raises(self):
         instance_type = instance_types.get_default_instance_type()
 
@@ -290,6 +322,22 @@ class ComputeTestCase(test.TestCase):
         finally:
             db.instance_destroy(self.context, ref[0]['id'])
 
+    def test_run_instances(self):
+        """Make sure run_instances launches every instance it is given"""
+        def fake_spawn_n(func, *args, **kwargs):
+            func(*args, **kwargs)
+
+        self.stubs.Set(compute_manager.greenthread, 'spawn_n', fake_spawn_n)
+        instance_ids = [self._create_instance(), self._create_instance()]
+        self.compute.run_instances(self.context, instance_ids)
+        try:
+            for instance_id in instance_ids:
+                instance = db.instance_get(self.context, instance_id)
+                self.assertEqual(vm_states.ACTIVE, instance['vm_state'])
+        finally:
+            for instance_id in instance_ids:
+                self.compute.terminate_instance(self.context, instance_id)
+
     def test_run_terminate(self):
         """Make sure it is possible to  run and terminate instance"""
         instance_id = self._create_instance()
@@ -1020,6 +1068,46 @@ class ComputeTestCase(test.TestCase):
         self.assertEqual(len(instances), 1)
         self.assertEqual(power_state.NOSTATE, instances[0]['power_state'])
 
+    def test_periodic_power_state_sync_is_batched(self):
+        """Ensure a periodic cycle loads instances once and updates once"""
+        self.stubs.Set(compute_manager.ComputeManager,
+                '_report_driver_status', nop_report_driver_status)
+        instance_ids = [self._create_instance() for i in xrange(3)]
+        for instance_id in instance_ids:
+            self.compute.run_instance(self.context, instance_id)
+            instance = db.instance_get(self.context, instance_id)
+            self.compute.driver.test_remove_vm(instance['name'])
+
+        calls = {'get_all_by_host': 0, 'update_power_states': 0}
+        compute_db = self.compute.db
+        instance_get_all_by_host = compute_db.instance_get_all_by_host
+        instance_update_power_states = compute_db.instance_update_power_states
+
+        def fake_instance_get_all_by_host(*args, **kwargs):
+            calls['get_all_by_host'] += 1
+            return instance_get_all_by_host(*args, **kwargs)
+
+        def fake_instance_update_power_states(*args, **kwargs):
+            calls['update_power_states'] += 1
+            return instance_update_power_states(*args, **kwargs)
+
+        def fake_instance_update(*args, **kwargs):
+            self.fail('instance_update called during power state sync')
+
+        self.stubs.Set(compute_db, 'instance_get_all_by_host',
+                       fake_instance_get_all_by_host)
+        self.stubs.Set(compute_db, 'instance_update_power_states',
+                       fake_instance_update_power_states)
+        self.stubs.Set(compute_db, 'instance_update', fake_instance_update)
+
+        error_list = self.compute.periodic_tasks(context.get_admin_context())
+        self.assertFalse(error_list)
+        self.assertEqual({'get_all_by_host': 1, 'update_power_states': 1},
+                         calls)
+        for instance_id in instance_ids:
+            instance = db.instance_get(self.context, instance_id)
+            self.assertEqual(power_state.NOSTATE, instance['power_state'])
+
     def test_get_all_by_name_regexp(self):
         """Test searching instances by name (display_name)"""
         c = context.get_admin_context()
@@ -1333,6 +1421,52 @@ class ComputeTestCase(test.TestCase):
         db.instance_destroy(c, instance_id3)
         db.instance_destroy(c, instance_id4)
 
+    def test_get_all_paginated(self):
+        """Test paging through instances with limit and marker"""
+        c = context.get_admin_context()
+        instance_ids = [self._create_instance() for i in xrange(5)]
+        instance_ids.reverse()
+
+        search_opts = {'local_zone_only': False}
+        page1 = self.compute_api.get_all(c, search_opts=search_opts,
+                                         limit=3)
+        page2 = self.compute_api.get_all(c, search_opts=search_opts,
+                                         limit=3, marker=page1[-1]['id'])
+        self.assertEqual(instance_ids,
+                         [instance['id'] for instance in page1 + page2])
+        self.assertRaises(exception.MarkerNotFound,
+                          self.compute_api.get_all, c,
+                          search_opts=search_opts, limit=3, marker=-1)
+
+        for instance_id in instance_ids:
+            db.instance_destroy(c, instance_id)
+
+    def test_get_all_paginated_with_child_zones(self):
+        """Test paging when child zone results have to be merged"""
+        c = context.get_admin_context()
+        instance_ids = [self._create_instance() for i in xrange(2)]
+        instance_ids.reverse()
+
+        class Server(object):
+            def __init__(self, id):
+                self._info = {'id': id}
+
+        def fake_call_zone_method(context, method, **kwargs):
+            return [('zone1', [Server(100), Server(101)])]
+
+        self.stubs.Set(self.compute_api.db, 'zone_get_all',
+                       lambda context: ['zone1'])
+        self.stubs.Set(compute.api.scheduler_api, 'call_zone_method',
+                       fake_call_zone_method)
+
+        instances = self.compute_api.get_all(c, limit=2,
+                                             marker=instance_ids[-1])
+        self.assertEqual([100, 101],
+                         [instance['id'] for instance in instances])
+
+        for instance_id in instance_ids:
+            db.instance_destroy(c, instance_id)
+
     @staticmethod
     def _parse_db_block_device_mapping(bdm_ref):
         attr_list = ('delete_on_termination', 'device_name', 'no_device',
@@ -23,7 +23,9 @@ import datetime
 from nova import test
 from nova import context
 from nova import db
+from nova import exception
 from nova import flags
+from nova.db.sqlalchemy import api as sqlalchemy_api
 
 FLAGS = flags.FLAGS
 
@@ -79,6 +81,39 @@ class DbApiTestCase(test.TestCase):
         self.assertEqual(result['fixed_ips'][0]['floating_ips'][0].address,
                          '1.2.1.2')
 
+    def test_instance_get_by_fixed_ip(self):
+        values = {'instance_type_id': FLAGS.default_instance_type,
+                  'project_id': self.project_id,
+                 }
+        instance = db.instance_create(self.context, values)
+        _setup_networking(instance['id'])
+        result = db.instance_get_by_fixed_ip(self.context.elevated(),
+                                             '1.2.3.4')
+        self.assertEqual(instance['id'], result['id'])
+        self.assertEqual(result['fixed_ips'][0]['floating_ips'][0].address,
+                         '1.2.1.2')
+        self.assertRaises(exception.FixedIpNotFoundForAddress,
+                          db.instance_get_by_fixed_ip,
+                          self.context.elevated(), '1.2.3.5')
+
+    def test_virtual_interface_get_by_ip_regexp(self):
+        ctxt = self.context.elevated()
+        instance = db.instance_create(self.context, {})
+        _setup_networking(instance['id'])
+
+        def _instance_ids(regexp):
+            vifs = db.virtual_interface_get_by_ip_regexp(ctxt, regexp)
+            return [vif['instance_id'] for vif in vifs]
+
+        self.assertEqual([instance['id']], _instance_ids('^1\.2\.3\.4$'))
+        self.assertEqual([instance['id']], _instance_ids('1.2.3'))
+        self.assertEqual([instance['id']], _instance_ids('1.2.3.4'))
+        self.assertEqual([], _instance_ids('1.2.3.5'))
+        self.assertEqual([instance['id']], _instance_ids('1\.2\.1\.2'))
+        self.assertEqual([], _instance_ids('^1\.2\.3\.5$'))
+        self.assertEqual(None,
+                         db.virtual_interface_get_by_ip_regexp(ctxt, '1|2'))
+
     def test_instance_get_all_by_filters(self):
         args = {'reservation_id': 'a', 'image_ref': 1, 'host': 'host1'}
         inst1 = db.instance_create(self.context, args)
@@ -101,6 +136,65 @@ class DbApiTestCase(test.TestCase):
         else:
             self.assertTrue(result[1].deleted)
 
+    def test_instance_get_all_by_filters_regexp(self):
+        ctxt = self.context.elevated()
+        for name in ('woot', 'woo', 'not-woot', 'a_b', 'axb'):
+            db.instance_create(self.context, {'display_name': name})
+
+        def _names(filters):
+            result = db.instance_get_all_by_filters(ctxt, filters)
+            return sorted([instance['display_name'] for instance in result])
+
+        self.assertEqual(['woo', 'woot'], _names({'display_name': 'woo'}))
+        self.assertEqual(['woo'], _names({'display_name': 'woo$'}))
+        self.assertEqual(['not-woot', 'woot'],
+                         _names({'display_name': '.*oot'}))
+        self.assertEqual(['a_b'], _names({'display_name': 'a_b'}))
+        self.assertEqual(['a_b', 'axb'], _names({'display_name': 'a.b'}))
+        self.assertEqual(['a_b', 'axb', 'not-woot'],
+                         _names({'display_name': '[an]'}))
+
+    def test_instance_get_all_by_filters_metadata(self):
+        ctxt = self.context.elevated()
+        inst1 = db.instance_create(self.context,
+                                   {'metadata': {'key1': 'value1'}})
+        db.instance_create(self.context, {'metadata': {'key2': 'value2'}})
+        result = db.instance_get_all_by_filters(ctxt,
+                {'metadata': {'key1': 'value1'}})
+        self.assertEqual([inst1.id], [instance.id for instance in result])
+
+    def test_instance_get_all_by_filters_paginate(self):
+        ctxt = self.context.elevated()
+        ids = [db.instance_create(self.context, {'display_name': 'x%d' % i}).id
+               for i in xrange(5)]
+        ids.reverse()
+        page1 = db.instance_get_all_by_filters(ctxt, {}, limit=2)
+        page2 = db.instance_get_all_by_filters(ctxt, {}, limit=2,
+                                               marker=page1[-1].id)
+        page3 = db.instance_get_all_by_filters(ctxt, {}, limit=2,
+                                               marker=page2[-1].id)
+        self.assertEqual(ids, [instance.id
+                               for instance in page1 + page2 + page3])
+        self.assertRaises(exception.MarkerNotFound,
+                          db.instance_get_all_by_filters,
+                          ctxt, {}, limit=2, marker=-1)
+
+    def test_instance_get_all_by_filters_marker_is_scoped(self):
+        other = db.instance_create(self.context, {'project_id': 'other'})
+        db.instance_create(self.context, {'project_id': self.project_id})
+        self.assertRaises(exception.MarkerNotFound,
+                          db.instance_get_all_by_filters,
+                          self.context, {}, limit=2, marker=other.id)
+
+    def test_instance_get_all_by_filters_paginate_regexp(self):
+        ctxt = self.context.elevated()
+        for name in ('a1', 'b1', 'a2', 'b2', 'a3'):
+            db.instance_create(self.context, {'display_name': name})
+        result = db.instance_get_all_by_filters(ctxt,
+                {'display_name': '[a]'}, limit=2)
+        self.assertEqual(['a3', 'a2'],
+                         [instance.display_name for instance in result])
+
     def test_migration_get_all_unconfirmed(self):
         ctxt = context.get_admin_context()
 
@@ -123,3 +217,36 @@ class DbApiTestCase(test.TestCase):
         results = db.migration_get_all_unconfirmed(ctxt, 10)
         self.assertEqual(0, len(results))
         db.migration_update(ctxt, migration.id, {"status": "CONFIRMED"})
+
+    def test_fixed_ip_create_many(self):
+        ctxt = context.get_admin_context()
+        self.stubs.Set(sqlalchemy_api, '_BULK_INSERT_CHUNK_SIZE', 2)
+        network = db.network_create_safe(ctxt, {'cidr': '10.9.0.0/29'})
+        db.fixed_ip_create_many(ctxt, ({'network_id': network['id'],
+                                        'address': '10.9.0.%d' % i,
+                                        'reserved': i < 2}
+                                       for i in xrange(5)))
+        fixed_ips = db.network_get_associated_fixed_ips(ctxt, network['id'])
+        self.assertEqual([], fixed_ips)
+        for i in xrange(5):
+            fixed_ip = db.fixed_ip_get_by_address(ctxt, '10.9.0.%d' % i)
+            self.assertEqual(i < 2, fixed_ip['reserved'])
+            self.assertFalse(fixed_ip['allocated'])
+            self.assertFalse(fixed_ip['deleted'])
+            self.assertTrue(fixed_ip['created_at'])
+
+    def test_instance_update_power_states(self):
+        ctxt = context.get_admin_context()
+        instance1 = db.instance_create(ctxt, {'power_state': 1})
+        instance2 = db.instance_create(ctxt, {'power_state': 1})
+        instance3 = db.instance_create(ctxt, {'power_state': 1})
+        updated = db.instance_update_power_states(ctxt,
+                {instance1['id']: 0, instance2['id']: 4})
+        self.assertEqual(2, updated)
+        self.assertEqual(0, db.instance_get(ctxt,
+                                            instance1['id'])['power_state'])
+        self.assertEqual(4, db.instance_get(ctxt,
+                                            instance2['id'])['power_state'])
+        self.assertEqual(1, db.instance_get(ctxt,
+                                            instance3['id'])['power_state'])
+        self.assertEqual(0, db.instance_update_power_states(ctxt, {}))
@@ -0,0 +1,123 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the auth token and identity cache."""
+
+from nova import fakememcache
+from nova import test
+from nova import utils
+from nova.auth import identity_cache
+from nova.auth import manager
+
+
+class IdentityCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(IdentityCacheTestCase, self).setUp()
+        self.flags(identity_cache_ttl=30, identity_cache_size=10)
+        utils.set_time_override()
+        self.loads = []
+
+    def tearDown(self):
+        utils.clear_time_override()
+        super(IdentityCacheTestCase, self).tearDown()
+
+    def _load(self, user_id):
+        self.loads.append(user_id)
+        return {'project_ids': ['proj'], 'is_admin': False}
+
+    def test_identity_is_cached_until_ttl(self):
+        identity_cache.get_identity('user1', self._load)
+        identity_cache.get_identity('user1', self._load)
+        self.assertEqual(['user1'], self.loads)
+        utils.advance_time_seconds(30)
+        identity_cache.get_identity('user1', self._load)
+        self.assertEqual(['user1', 'user1'], self.loads)
+
+    def test_invalidate_user(self):
+        identity_cache.get_identity('user1', self._load)
+        identity_cache.invalidate_user('user1')
+        identity_cache.get_identity('user1', self._load)
+        self.assertEqual(['user1', 'user1'], self.loads)
+
+    def test_zero_ttl_disables_cache(self):
+        self.flags(identity_cache_ttl=0)
+        identity_cache.set_token_user('token', 'user1')
+        self.assertEqual(None, identity_cache.get_token_user('token'))
+        identity_cache.get_identity('user1', self._load)
+        identity_cache.get_identity('user1', self._load)
+        self.assertEqual(['user1', 'user1'], self.loads)
+
+    def test_token_ttl_is_bounded_by_expiry(self):
+        identity_cache.set_token_user('token', 'user1', expires_in=5)
+        self.assertEqual('user1', identity_cache.get_token_user('token'))
+        utils.advance_time_seconds(5)
+        self.assertEqual(None, identity_cache.get_token_user('token'))
+
+    def test_memcached_entry_keeps_its_expiry(self):
+        self.stubs.Set(identity_cache, '_mc', fakememcache.Client())
+        identity_cache.set_token_user('token', 'user1', expires_in=5)
+        # NOTE: another worker, with an empty local cache
+        identity_cache.reset()
+        utils.advance_time_seconds(3)
+        self.assertEqual('user1', identity_cache.get_token_user('token'))
+        utils.advance_time_seconds(2)
+        self.assertEqual(None, identity_cache.get_token_user('token'))
+
+    def test_least_recently_used_are_dropped(self):
+        for i in xrange(10):
+            identity_cache.set_token_user('token%d' % i, 'user%d' % i)
+        identity_cache.get_token_user('token0')
+        identity_cache.set_token_user('token10', 'user10')
+        self.assertEqual('user0', identity_cache.get_token_user('token0'))
+        self.assertEqual(None, identity_cache.get_token_user('token1'))
+        self.assertEqual('user10', identity_cache.get_token_user('token10'))
+
+
+class AuthManagerInvalidationTestCase(test.TestCase):
+    def setUp(self):
+        super(AuthManagerInvalidationTestCase, self).setUp()
+        self.manager = manager.AuthManager(new=True)
+        self.user = self.manager.create_user('herbert')
+        self.project = self.manager.create_project('proj', self.user)
+        self.loads = []
+
+    def tearDown(self):
+        self.manager.delete_project(self.project)
+        self.manager.delete_user(self.user)
+        super(AuthManagerInvalidationTestCase, self).tearDown()
+
+    def _load(self, user_id):
+        self.loads.append(user_id)
+        return {'project_ids': [], 'is_admin': False}
+
+    def _assert_invalidates(self, func, *args):
+        identity_cache.get_identity(self.user.id, self._load)
+        func(*args)
+        identity_cache.get_identity(self.user.id, self._load)
+        self.assertEqual([self.user.id, self.user.id], self.loads)
+
+    def test_add_role_invalidates(self):
+        self._assert_invalidates(self.manager.add_role, self.user,
+                                 'cloudadmin')
+
+    def test_modify_user_invalidates(self):
+        self._assert_invalidates(self.manager.modify_user, self.user,
+                                 None, None, True)
+
+    def test_remove_from_project_invalidates(self):
+        self._assert_invalidates(self.manager.remove_from_project, self.user,
+                                 self.project)
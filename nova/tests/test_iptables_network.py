@@ -19,6 +19,8 @@
 
 import os
 
+import eventlet
+
 from nova import test
 from nova.network import linux_net
 
@@ -162,3 +164,72 @@ class IptablesManagerTestCase(test.TestCase):
             self.assertTrue('-A %s -j run_tests.py-%s' \
                             % (chain, chain) in new_lines,
                             "Built-in chain %s not wrapped" % (chain,))
+
+    def _fake_execute(self, *cmd, **kwargs):
+        self.executed.append((cmd, kwargs.get('process_input')))
+        eventlet.sleep(0)
+        if cmd[0].endswith('-save'):
+            return '\n'.join(self.sample_filter), ''
+        return '', ''
+
+    def test_incremental_apply(self):
+        self.flags(iptables_incremental_apply=True, use_ipv6=False)
+        self.executed = []
+        self.manager.execute = self._fake_execute
+        filter_table = self.manager.ipv4['filter']
+        wrapped = lambda name: '%s-%s' % (linux_net.binary_name, name)
+
+        # The first apply always rewrites whole tables.
+        self.manager.apply()
+        self.assertEqual(4, len(self.executed))
+
+        # Unchanged tables are skipped, changed chains are rewritten alone.
+        self.executed = []
+        filter_table.add_chain('foo')
+        filter_table.add_rule('local', '-j $foo')
+        filter_table.add_rule('foo', '-j DROP')
+        self.manager.apply()
+        self.assertEqual(1, len(self.executed))
+        cmd, process_input = self.executed[0]
+        self.assertEqual(('iptables-restore', '--noflush'), cmd)
+        lines = process_input.split('\n')
+        self.assertEqual(['*filter',
+                          ':%s - [0:0]' % wrapped('foo'),
+                          ':%s - [0:0]' % wrapped('local'),
+                          '-A %s -j %s' % (wrapped('local'), wrapped('foo')),
+                          '-A %s -j DROP' % wrapped('foo'),
+                          'COMMIT'], lines)
+
+        # Removing a chain rewrites the chains that jumped to it.
+        self.executed = []
+        filter_table.remove_chain('foo')
+        self.manager.apply()
+        cmd, process_input = self.executed[0]
+        self.assertEqual(['*filter',
+                          ':%s - [0:0]' % wrapped('local'),
+                          ':%s - [0:0]' % wrapped('foo'),
+                          '-X %s' % wrapped('foo'),
+                          'COMMIT'], process_input.split('\n'))
+
+        # Changes to unwrapped chains need the full save/restore.
+        self.executed = []
+        filter_table.add_rule('FORWARD', '-j ACCEPT', wrap=False)
+        self.manager.apply()
+        self.assertEqual([('iptables-save', '-t', 'filter'),
+                          ('iptables-restore',)],
+                         [cmd for cmd, process_input in self.executed])
+
+    def test_apply_coalesces_queued_calls(self):
+        self.flags(use_ipv6=False)
+        self.executed = []
+        self.manager.execute = self._fake_execute
+
+        pool = eventlet.GreenPool()
+        for i in xrange(5):
+            pool.spawn_n(self.manager.apply)
+        pool.waitall()
+
+        # The first apply runs at once, the other four share one apply.
+        restores = [cmd for cmd, process_input in self.executed
+                    if cmd[0].endswith('-restore')]
+        self.assertEqual(4, len(restores))
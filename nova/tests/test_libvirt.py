@@ -21,7 +21,9 @@ import os
 import re
 import shutil
 import sys
+import struct
 import tempfile
+import time
 
 from xml.etree.ElementTree import fromstring as xml_to_tree
 from xml.dom.minidom import parseString as xml_to_dom
@@ -35,9 +37,11 @@ from nova import utils
 from nova.api.ec2 import cloud
 from nova.compute import power_state
 from nova.compute import vm_states
+from nova.virt import disk
 from nova.virt import driver
 from nova.virt.libvirt import connection
 from nova.virt.libvirt import firewall
+from nova.virt.libvirt import imagecache
 from nova.tests import fake_network
 
 libvirt = None
@@ -101,20 +105,24 @@ class CacheConcurrencyTestCase(test.TestCase):
         def fake_execute(*args, **kwargs):
             pass
 
+        def fake_clone_image(base, target):
+            pass
+
         self.stubs.Set(os.path, 'exists', fake_exists)
         self.stubs.Set(utils, 'execute', fake_execute)
+        self.stubs.Set(disk, 'clone_image', fake_clone_image)
 
     def test_same_fname_concurrency(self):
         """Ensures that the same fname cache runs at a sequentially"""
         conn = connection.LibvirtConnection
         wait1 = eventlet.event.Event()
         done1 = eventlet.event.Event()
-        eventlet.spawn(conn._cache_image, _concurrency,
-                       'target', 'fname', False, wait1, done1)
+        thread1 = eventlet.spawn(conn._cache_image, _concurrency,
+                                 'target', 'fname', False, wait1, done1)
         wait2 = eventlet.event.Event()
         done2 = eventlet.event.Event()
-        eventlet.spawn(conn._cache_image, _concurrency,
-                       'target', 'fname', False, wait2, done2)
+        thread2 = eventlet.spawn(conn._cache_image, _concurrency,
+                                 'target', 'fname', False, wait2, done2)
         wait2.send()
         eventlet.sleep(0)
         try:
@@ -124,18 +132,21 @@ class CacheConcurrencyTestCase(test.TestCase):
         done1.wait()
         eventlet.sleep(0)
         self.assertTrue(done2.ready())
+        # NOTE: let both release their locks before the next test.
+        thread1.wait()
+        thread2.wait()
 
     def test_different_fname_concurrency(self):
         """Ensures that two different fname caches are concurrent"""
         conn = connection.LibvirtConnection
         wait1 = eventlet.event.Event()
         done1 = eventlet.event.Event()
-        eventlet.spawn(conn._cache_image, _concurrency,
-                       'target', 'fname2', False, wait1, done1)
+        thread1 = eventlet.spawn(conn._cache_image, _concurrency,
+                                 'target', 'fname2', False, wait1, done1)
         wait2 = eventlet.event.Event()
         done2 = eventlet.event.Event()
-        eventlet.spawn(conn._cache_image, _concurrency,
-                       'target', 'fname1', False, wait2, done2)
+        thread2 = eventlet.spawn(conn._cache_image, _concurrency,
+                                 'target', 'fname1', False, wait2, done2)
         wait2.send()
         eventlet.sleep(0)
         try:
@@ -143,6 +154,113 @@ class CacheConcurrencyTestCase(test.TestCase):
         finally:
             wait1.send()
             eventlet.sleep(0)
+        thread1.wait()
+        thread2.wait()
+
+
+class ImageCacheManagerTestCase(test.TestCase):
+    def setUp(self):
+        super(ImageCacheManagerTestCase, self).setUp()
+        self.instances_path = tempfile.mkdtemp()
+        self.flags(instances_path=self.instances_path,
+                   image_cache_manager_interval=0,
+                   image_cache_max_age=3600,
+                   image_cache_max_size=0)
+        self.manager = imagecache.ImageCacheManager()
+        self.base_dir = os.path.join(self.instances_path, '_base')
+
+    def tearDown(self):
+        shutil.rmtree(self.instances_path)
+        super(ImageCacheManagerTestCase, self).tearDown()
+
+    def _create_base(self, fname, age=0, size=4096):
+        path = os.path.join(self.base_dir, fname)
+        if not os.path.exists(self.base_dir):
+            os.mkdir(self.base_dir)
+        with open(path, 'w') as f:
+            f.write('x' * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def _create_disk(self, instance_name, backing_file):
+        instance_dir = os.path.join(self.instances_path, instance_name)
+        os.mkdir(instance_dir)
+        header = struct.pack('>4sIQI', 'QFI\xfb', 2, 72, len(backing_file))
+        with open(os.path.join(instance_dir, 'disk'), 'w') as f:
+            f.write(header + '\0' * (72 - len(header)) + backing_file)
+
+    def test_fetch_creates_base_once(self):
+        created = []
+        used = []
+
+        def fake_fetch(target):
+            created.append(target)
+            open(target, 'w').close()
+
+        for i in xrange(2):
+            self.manager.fetch(fake_fetch, 'base', used.append)
+        base = os.path.join(self.base_dir, 'base')
+        self.assertEqual([base], created)
+        self.assertEqual([base, base], used)
+        self.assertEqual(1, self.manager.misses)
+        self.assertEqual(1, self.manager.hits)
+
+    def test_fetch_uses_base_outside_lock(self):
+        held = []
+        used = []
+
+        def fake_synchronized(name, external=False):
+            def wrap(f):
+                def inner(*args, **kwargs):
+                    held.append(name)
+                    try:
+                        return f(*args, **kwargs)
+                    finally:
+                        held.pop()
+                return inner
+            return wrap
+
+        def fake_fetch(target):
+            open(target, 'w').close()
+
+        self.stubs.Set(utils, 'synchronized', fake_synchronized)
+        self.manager.fetch(fake_fetch, 'base',
+                           lambda base: used.append(list(held)))
+        self.assertEqual([[]], used)
+
+    def test_manage_evicts_old_unused_bases(self):
+        old = self._create_base('old', age=7200)
+        backing = self._create_base('backing', age=7200)
+        referenced = self._create_base('referenced', age=7200)
+        recent = self._create_base('recent')
+        self._create_disk('instance-00000001', backing)
+
+        self.manager.manage(['referenced'])
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(backing))
+        self.assertTrue(os.path.exists(referenced))
+        self.assertTrue(os.path.exists(recent))
+        self.assertEqual(1, self.manager.evictions)
+
+    def test_manage_evicts_least_recently_used_over_budget(self):
+        self.flags(image_cache_max_age=0, image_cache_max_size=1)
+        oldest = self._create_base('oldest', age=30, size=512 * 1024)
+        older = self._create_base('older', age=20, size=512 * 1024)
+        newer = self._create_base('newer', age=10, size=512 * 1024)
+
+        self.manager.manage()
+        self.assertFalse(os.path.exists(oldest))
+        self.assertTrue(os.path.exists(older))
+        self.assertTrue(os.path.exists(newer))
+
+    def test_get_stats(self):
+        self._create_base('one')
+        self._create_base('two')
+        self._create_base('three.part')
+        stats = self.manager.get_stats()
+        self.assertEqual(2, stats['image_cache_images'])
+        self.assertTrue(stats['image_cache_bytes'] > 0)
 
 
 class LibvirtConnTestCase(test.TestCase):
@@ -1097,11 +1215,16 @@ class IptablesFirewallTestCase(test.TestCase):
                 ips.extend(info['ips'])
             return [ip['ip'] for ip in ips]
 
+        def get_member_addresses(context, security_group_ids):
+            return dict((security_group_id, get_fixed_ips())
+                        for security_group_id in security_group_ids)
+
         from nova.network import linux_net
         linux_net.iptables_manager.execute = fake_iptables_execute
 
         network_info = _fake_network_info(self.stubs, 1)
-        self.stubs.Set(db, 'instance_get_fixed_addresses', get_fixed_ips)
+        self.stubs.Set(db, 'security_group_get_member_addresses',
+                       get_member_addresses)
         self.fw.prepare_instance_filter(instance_ref, network_info)
         self.fw.apply_instance_filter(instance_ref, network_info)
 
@@ -1198,6 +1321,62 @@ class IptablesFirewallTestCase(test.TestCase):
         self.mox.ReplayAll()
         self.fw.do_refresh_security_group_rules("fake")
 
+    def test_security_group_rules_compiled_once(self):
+        admin_ctxt = context.get_admin_context()
+        secgroup = db.security_group_create(admin_ctxt,
+                                            {'user_id': 'fake',
+                                             'project_id': 'fake',
+                                             'name': 'testgroup',
+                                             'description': 'test group'})
+        db.security_group_rule_create(admin_ctxt,
+                                      {'parent_group_id': secgroup['id'],
+                                       'protocol': 'tcp',
+                                       'from_port': 22,
+                                       'to_port': 22,
+                                       'group_id': secgroup['id']})
+        instances = []
+        for i in xrange(3):
+            instance_ref = self._create_instance_ref()
+            db.instance_add_security_group(admin_ctxt, instance_ref['id'],
+                                           secgroup['id'])
+            db.fixed_ip_create(admin_ctxt,
+                               {'address': '10.0.0.%d' % (i + 2),
+                                'instance_id': instance_ref['id']})
+            instances.append(instance_ref)
+
+        calls = []
+        rule_get = db.security_group_rule_get_by_security_group
+
+        def counting_rule_get(context, security_group_id):
+            calls.append(security_group_id)
+            return rule_get(context, security_group_id)
+
+        self.stubs.Set(db, 'security_group_rule_get_by_security_group',
+                       counting_rule_get)
+        self.stubs.Set(self.fw.iptables, 'apply', lambda: None)
+        self.stubs.Set(self.fw.nwfilter, 'unfilter_instance',
+                       lambda instance, network_info: None)
+
+        network_info = _fake_network_info(self.stubs, 1)
+        for instance_ref in instances:
+            self.fw.prepare_instance_filter(instance_ref, network_info)
+        self.assertEqual([secgroup['id']], calls)
+
+        ipv4_rules, ipv6_rules = self.fw.instance_rules(instances[0],
+                                                        network_info)
+        for i in xrange(3):
+            self.assertTrue('-j ACCEPT -p tcp --dport 22 -s 10.0.0.%d' %
+                            (i + 2) in ipv4_rules)
+
+        self.fw.refresh_security_group_members(secgroup['id'])
+        self.assertEqual([secgroup['id']] * 2, calls)
+        self.fw.refresh_security_group_rules(secgroup['id'])
+        self.assertEqual([secgroup['id']] * 3, calls)
+
+        for instance_ref in instances:
+            self.fw.unfilter_instance(instance_ref, network_info)
+        self.assertEqual({}, self.fw.compiled_security_groups)
+
     def test_unfilter_instance_undefines_nwfilter(self):
         # Skip if non-libvirt environment
         if not self.lazy_load_library_exists():
@@ -0,0 +1,159 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the periodic tasks of nova.manager.Manager."""
+
+import time
+
+from eventlet import event
+from eventlet import greenthread
+
+from nova import manager
+from nova import test
+
+
+class FakeTaskError(Exception):
+    pass
+
+
+class FakeManager(manager.Manager):
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+        self.blocker = event.Event()
+        super(FakeManager, self).__init__(*args, **kwargs)
+
+    @manager.periodic_task
+    def _every_time(self, context):
+        self.calls.append('every_time')
+
+    @manager.periodic_task(interval=60)
+    def _every_minute(self, context):
+        self.calls.append('every_minute')
+
+    def not_a_task(self, context):
+        self.calls.append('not_a_task')
+
+
+class BlockingFakeManager(FakeManager):
+    @manager.periodic_task
+    def _blocking(self, context):
+        self.blocker.wait()
+
+
+class SlowFakeManager(FakeManager):
+    @manager.periodic_task(interval=60)
+    def _blocking(self, context):
+        self.blocker.wait()
+
+
+class TimeoutFakeManager(FakeManager):
+    @manager.periodic_task(timeout=0.01)
+    def _blocking(self, context):
+        self.blocker.wait()
+
+
+class FailingFakeManager(FakeManager):
+    @manager.periodic_task
+    def _failing(self, context):
+        raise FakeTaskError()
+
+
+class ManagerPeriodicTaskTestCase(test.TestCase):
+    def test_tasks_are_collected_from_bases(self):
+        names = [task[0] for task in FailingFakeManager._periodic_tasks]
+        self.assertEqual(['_every_minute', '_every_time', '_failing'], names)
+
+    def test_tasks_run_at_their_interval(self):
+        now = [1000.0]
+        self.stubs.Set(time, 'time', lambda: now[0])
+        fake_manager = FakeManager()
+        self.assertEqual([], fake_manager.periodic_tasks(None))
+        self.assertEqual(['every_minute', 'every_time'],
+                         sorted(fake_manager.calls))
+        now[0] += 30
+        fake_manager.periodic_tasks(None)
+        self.assertEqual(['every_minute', 'every_time', 'every_time'],
+                         sorted(fake_manager.calls))
+        now[0] += 30
+        fake_manager.periodic_tasks(None)
+        self.assertEqual(2, fake_manager.calls.count('every_minute'))
+        self.assertEqual(3, fake_manager.calls.count('every_time'))
+
+    def test_errors_are_returned(self):
+        fake_manager = FailingFakeManager()
+        errors = fake_manager.periodic_tasks(None)
+        self.assertEqual(1, len(errors))
+        self.assertTrue(isinstance(errors[0], FakeTaskError))
+        stats = fake_manager.get_periodic_task_stats()
+        self.assertEqual(1, stats['_failing']['errors'])
+        self.assertEqual(0, stats['_every_time']['errors'])
+
+    def test_task_still_running_is_skipped(self):
+        fake_manager = BlockingFakeManager()
+        fake_manager.periodic_tasks(None, wait=False)
+        greenthread.sleep(0)
+        self.assertEqual([], fake_manager.periodic_tasks(None))
+        stats = fake_manager.get_periodic_task_stats()
+        self.assertEqual(1, stats['_blocking']['skips'])
+        self.assertEqual(2, stats['_every_time']['runs'])
+        fake_manager.blocker.send()
+        greenthread.sleep(0)
+        stats = fake_manager.get_periodic_task_stats()
+        self.assertEqual(1, stats['_blocking']['runs'])
+
+    def test_task_still_running_is_skipped_only_when_due(self):
+        now = [1000.0]
+        self.stubs.Set(time, 'time', lambda: now[0])
+        fake_manager = SlowFakeManager()
+        fake_manager.periodic_tasks(None, wait=False)
+        greenthread.sleep(0)
+        now[0] += 30
+        fake_manager.periodic_tasks(None)
+        stats = fake_manager.get_periodic_task_stats()
+        self.assertEqual(0, stats['_blocking']['skips'])
+        now[0] += 30
+        fake_manager.periodic_tasks(None)
+        stats = fake_manager.get_periodic_task_stats()
+        self.assertEqual(1, stats['_blocking']['skips'])
+        fake_manager.blocker.send()
+        greenthread.sleep(0)
+
+    def test_task_timeout(self):
+        fake_manager = TimeoutFakeManager()
+        errors = fake_manager.periodic_tasks(None)
+        self.assertEqual(1, len(errors))
+        stats = fake_manager.get_periodic_task_stats()
+        self.assertEqual(1, stats['_blocking']['timeouts'])
+        self.assertEqual(1, stats['_blocking']['runs'])
+        self.assertEqual(['every_minute', 'every_time'],
+                         sorted(fake_manager.calls))
+
+    def test_periodic_cached(self):
+        fake_manager = FakeManager()
+        calls = []
+
+        def load():
+            calls.append(1)
+            return 'value'
+
+        fake_manager.periodic_tasks(None)
+        self.assertEqual('value', fake_manager._periodic_cached('key', load))
+        self.assertEqual('value', fake_manager._periodic_cached('key', load))
+        self.assertEqual(1, len(calls))
+        fake_manager.periodic_tasks(None)
+        fake_manager._periodic_cached('key', load)
+        self.assertEqual(2, len(calls))
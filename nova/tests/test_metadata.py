@@ -75,6 +75,9 @@ class MetadataTestCase(test.TestCase):
         def instance_get_list(*args, **kwargs):
             return [self.instance]
 
+        def instance_get_by_fixed_ip(*args, **kwargs):
+            return self.instance
+
         def floating_get(*args, **kwargs):
             return '99.99.99.99'
 
@@ -84,6 +87,8 @@ class MetadataTestCase(test.TestCase):
                 fake_get_floating_ips_by_fixed_address)
         self.stubs.Set(api, 'instance_get', instance_get)
         self.stubs.Set(api, 'instance_get_all_by_filters', instance_get_list)
+        self.stubs.Set(api, 'instance_get_by_fixed_ip',
+                       instance_get_by_fixed_ip)
         self.stubs.Set(api, 'instance_get_floating_address', floating_get)
         self.app = metadatarequesthandler.MetadataRequestHandler()
         network_manager = fake_network.FakeNetworkManager()
@@ -111,7 +116,7 @@ class MetadataTestCase(test.TestCase):
                          'default\nother')
 
     def test_user_data_non_existing_fixed_address(self):
-        self.stubs.Set(api, 'instance_get_all_by_filters',
+        self.stubs.Set(api, 'instance_get_by_fixed_ip',
                        return_non_existing_server_by_address)
         request = webob.Request.blank('/user-data')
         request.remote_addr = "127.1.1.1"
@@ -119,7 +124,7 @@ class MetadataTestCase(test.TestCase):
         self.assertEqual(response.status_int, 404)
 
     def test_user_data_none_fixed_address(self):
-        self.stubs.Set(api, 'instance_get_all_by_filters',
+        self.stubs.Set(api, 'instance_get_by_fixed_ip',
                        return_non_existing_server_by_address)
         request = webob.Request.blank('/user-data')
         request.remote_addr = None
@@ -144,3 +149,32 @@ class MetadataTestCase(test.TestCase):
     def test_local_hostname_fqdn(self):
         self.assertEqual(self.request('/meta-data/local-hostname'),
             "%s.%s" % (self.instance['hostname'], FLAGS.dhcp_domain))
+
+    def test_metadata_cache(self):
+        self.instance['user_data'] = base64.b64encode('happy')
+        self.assertEqual(self.request('/user-data'), 'happy')
+        self.assertEqual(self.request('/meta-data/hostname'),
+            "%s.%s" % (self.instance['hostname'], FLAGS.dhcp_domain))
+        self.assertEqual(1, self.app.cc.metadata_cache_hits)
+        self.assertEqual(1, self.app.cc.metadata_cache_misses)
+
+        # Changing the instance row drops the cached metadata.
+        self.instance['user_data'] = base64.b64encode('happier')
+        self.instance['updated_at'] = 'now'
+        self.assertEqual(self.request('/user-data'), 'happier')
+        self.assertEqual(2, self.app.cc.metadata_cache_misses)
+
+        # So does associating a floating ip or a security group.
+        self.instance['fixed_ips'] = [{'floating_ips':
+                                       [{'address': '1.2.3.4'}]}]
+        self.request('/user-data')
+        self.instance['security_groups'] = [{'id': 1}]
+        self.request('/user-data')
+        self.assertEqual(1, self.app.cc.metadata_cache_hits)
+        self.assertEqual(4, self.app.cc.metadata_cache_misses)
+
+    def test_metadata_cache_disabled(self):
+        self.flags(metadata_cache_ttl=0)
+        self.request('/user-data')
+        self.request('/user-data')
+        self.assertEqual(0, self.app.cc.metadata_cache_hits)
@@ -677,32 +677,33 @@ class CommonNetworkTestCase(test.TestCase):
 
     def test_get_instance_uuids_by_ip_regex(self):
         manager = fake_network.FakeNetworkManager()
+        ctxt = context.get_admin_context()
         _vifs = manager.db.virtual_interface_get_all(None)
 
         # Greedy get eveything
-        res = manager.get_instance_uuids_by_ip_filter(None, {'ip': '.*'})
+        res = manager.get_instance_uuids_by_ip_filter(ctxt, {'ip': '.*'})
         self.assertEqual(len(res), len(_vifs))
 
         # Doesn't exist
-        res = manager.get_instance_uuids_by_ip_filter(None, {'ip': '10.0.0.1'})
+        res = manager.get_instance_uuids_by_ip_filter(ctxt, {'ip': '10.0.0.1'})
         self.assertFalse(res)
 
         # Get instance 1
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                     {'ip': '172.16.0.2'})
         self.assertTrue(res)
         self.assertEqual(len(res), 1)
         self.assertEqual(res[0]['instance_id'], _vifs[1]['instance_id'])
 
         # Get instance 2
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                     {'ip': '173.16.0.2'})
         self.assertTrue(res)
         self.assertEqual(len(res), 1)
         self.assertEqual(res[0]['instance_id'], _vifs[2]['instance_id'])
 
         # Get instance 0 and 1
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                     {'ip': '172.16.0.*'})
         self.assertTrue(res)
         self.assertEqual(len(res), 2)
@@ -710,7 +711,7 @@ class CommonNetworkTestCase(test.TestCase):
         self.assertEqual(res[1]['instance_id'], _vifs[1]['instance_id'])
 
         # Get instance 1 and 2
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                     {'ip': '17..16.0.2'})
         self.assertTrue(res)
         self.assertEqual(len(res), 2)
@@ -719,19 +720,20 @@ class CommonNetworkTestCase(test.TestCase):
 
     def test_get_instance_uuids_by_ipv6_regex(self):
         manager = fake_network.FakeNetworkManager()
+        ctxt = context.get_admin_context()
         _vifs = manager.db.virtual_interface_get_all(None)
 
         # Greedy get eveything
-        res = manager.get_instance_uuids_by_ip_filter(None, {'ip6': '.*'})
+        res = manager.get_instance_uuids_by_ip_filter(ctxt, {'ip6': '.*'})
         self.assertEqual(len(res), len(_vifs))
 
         # Doesn't exist
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                       {'ip6': '.*1034.*'})
         self.assertFalse(res)
 
         # Get instance 1
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                     {'ip6': '2001:.*:2'})
         self.assertTrue(res)
         self.assertEqual(len(res), 1)
@@ -739,13 +741,13 @@ class CommonNetworkTestCase(test.TestCase):
 
         # Get instance 2
         ip6 = '2002:db8::dcad:beff:feef:2'
-        res = manager.get_instance_uuids_by_ip_filter(None, {'ip6': ip6})
+        res = manager.get_instance_uuids_by_ip_filter(ctxt, {'ip6': ip6})
         self.assertTrue(res)
         self.assertEqual(len(res), 1)
         self.assertEqual(res[0]['instance_id'], _vifs[2]['instance_id'])
 
         # Get instance 0 and 1
-        res = manager.get_instance_uuids_by_ip_filter(None, {'ip6': '2001:.*'})
+        res = manager.get_instance_uuids_by_ip_filter(ctxt, {'ip6': '2001:.*'})
         self.assertTrue(res)
         self.assertEqual(len(res), 2)
         self.assertEqual(res[0]['instance_id'], _vifs[0]['instance_id'])
@@ -753,7 +755,7 @@ class CommonNetworkTestCase(test.TestCase):
 
         # Get instance 1 and 2
         ip6 = '200.:db8::dcad:beff:feef:2'
-        res = manager.get_instance_uuids_by_ip_filter(None, {'ip6': ip6})
+        res = manager.get_instance_uuids_by_ip_filter(ctxt, {'ip6': ip6})
         self.assertTrue(res)
         self.assertEqual(len(res), 2)
         self.assertEqual(res[0]['instance_id'], _vifs[1]['instance_id'])
@@ -761,22 +763,23 @@ class CommonNetworkTestCase(test.TestCase):
 
     def test_get_instance_uuids_by_ip(self):
         manager = fake_network.FakeNetworkManager()
+        ctxt = context.get_admin_context()
         _vifs = manager.db.virtual_interface_get_all(None)
 
         # No regex for you!
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                       {'fixed_ip': '.*'})
         self.assertFalse(res)
 
         # Doesn't exist
         ip = '10.0.0.1'
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                       {'fixed_ip': ip})
         self.assertFalse(res)
 
         # Get instance 1
         ip = '172.16.0.2'
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                       {'fixed_ip': ip})
         self.assertTrue(res)
         self.assertEqual(len(res), 1)
@@ -784,8 +787,44 @@ class CommonNetworkTestCase(test.TestCase):
 
         # Get instance 2
         ip = '173.16.0.2'
-        res = manager.get_instance_uuids_by_ip_filter(None,
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
                                                       {'fixed_ip': ip})
         self.assertTrue(res)
         self.assertEqual(len(res), 1)
         self.assertEqual(res[0]['instance_id'], _vifs[2]['instance_id'])
+
+    def test_get_instance_uuids_by_ip_uses_indexes(self):
+        manager = fake_network.FakeNetworkManager()
+        ctxt = context.RequestContext('fake', 'fake')
+        _vifs = manager.db.virtual_interface_get_all(None)
+        self.mox.StubOutWithMock(manager.db, 'virtual_interface_get_all')
+        self.mox.ReplayAll()
+
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
+                {'ip': '^172\.16\.0\.2$'})
+        self.assertEqual([_vifs[1]['instance_id']],
+                         [r['instance_id'] for r in res])
+
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
+                {'ip': '172.16.1.'})
+        self.assertEqual([_vifs[0]['instance_id'], _vifs[1]['instance_id']],
+                         [r['instance_id'] for r in res])
+
+        res = manager.get_instance_uuids_by_ip_filter(ctxt,
+                {'ip6': '^2001:db8::dcad:beff:feef:2$'})
+        self.assertEqual([_vifs[1]['instance_id']],
+                         [r['instance_id'] for r in res])
+
+    def test_get_instance_uuids_by_ip_scan_needs_admin(self):
+        manager = fake_network.FakeNetworkManager()
+        ctxt = context.RequestContext('fake', 'fake')
+        self.assertRaises(exception.InvalidIpFilter,
+                          manager.get_instance_uuids_by_ip_filter,
+                          ctxt, {'ip': '172\.16\.0\.[12]'})
+        self.assertRaises(exception.InvalidIpFilter,
+                          manager.get_instance_uuids_by_ip_filter,
+                          ctxt, {'ip6': '2001:.*'})
+
+        res = manager.get_instance_uuids_by_ip_filter(ctxt.elevated(),
+                {'ip': '172\.16\.0\.[12]'})
+        self.assertEqual(2, len(res))
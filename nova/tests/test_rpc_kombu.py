@@ -19,6 +19,10 @@
 Unit Tests for remote procedure calls using kombu
 """
 
+import time
+
+import eventlet
+
 from nova import context
 from nova import log as logging
 from nova import test
@@ -108,3 +112,110 @@ class RpcKombuTestCase(test_rpc_common._BaseRpcTestCase):
         conn2.consume(limit=1)
         conn2.close()
         self.assertEqual(self.received_message, message)
+
+    def test_call_timeout(self):
+        """Test that a call nobody answers times out."""
+        self.flags(rpc_topic_response_timeouts=['nobody_listening:1'])
+        self.assertRaises(self.rpc.Timeout,
+                          self.rpc.call,
+                          self.context,
+                          'nobody_listening.host',
+                          {"method": "echo",
+                           "args": {"value": 42}})
+
+    def test_response_timeout_per_topic(self):
+        self.flags(rpc_response_timeout=600,
+                   rpc_topic_response_timeouts=['scheduler:30',
+                                                'compute.host1:5'])
+        self.assertEqual(30, self.rpc._get_response_timeout('scheduler'))
+        self.assertEqual(30,
+                         self.rpc._get_response_timeout('scheduler.host'))
+        self.assertEqual(5, self.rpc._get_response_timeout('compute.host1'))
+        self.assertEqual(600,
+                         self.rpc._get_response_timeout('compute.host2'))
+
+    def test_expired_message_is_dropped(self):
+        """Test that the consumer skips messages whose caller gave up."""
+        self.received = []
+
+        class Receiver(object):
+            @staticmethod
+            def echo(context, value):
+                self.received.append(value)
+
+        callback = self.rpc.ProxyCallback(Receiver())
+        message = {"method": "echo",
+                   "args": {"value": 42},
+                   "_deadline": time.time() - 1}
+        self.rpc._pack_context(message, self.context)
+        callback(message)
+        callback.pool.waitall()
+        self.assertEqual([], self.received)
+
+    def test_consumer_prefetch_and_stats(self):
+        """Test that consumers limit prefetch and report their backlog."""
+        self.flags(rpc_thread_pool_size=2)
+        conn = self.rpc.create_connection()
+        conn.create_consumer('a_topic', test_rpc_common.TestReceiver(),
+                             False)
+        conn.create_consumer('a_topic', test_rpc_common.TestReceiver(),
+                             True)
+        self.assertEqual(2, conn.prefetch_count)
+        try:
+            for i in xrange(3):
+                self.rpc.cast(self.context, 'a_topic',
+                              {"method": "echo", "args": {"value": i}})
+            stats = conn.get_consumer_stats()
+        finally:
+            # NOTE: the messages would otherwise stay in the memory
+            #       transport and be received by later tests.
+            conn.consumers[0].queue.purge()
+            conn.close()
+
+        self.assertEqual([{'queue': 'a_topic', 'depth': 3, 'in_flight': 0}],
+                         stats)
+
+
+class RpcKombuReplyQueueTestCase(RpcKombuTestCase):
+    """Run the kombu tests with replies on the shared reply queue."""
+
+    def setUp(self):
+        super(RpcKombuReplyQueueTestCase, self).setUp()
+        self.flags(amqp_rpc_single_reply_queue=True)
+
+    def tearDown(self):
+        if self.rpc._REPLY_PROXY is not None:
+            self.rpc._REPLY_PROXY.close()
+            self.rpc._REPLY_PROXY = None
+        super(RpcKombuReplyQueueTestCase, self).tearDown()
+
+    def test_call_timeout(self):
+        """Test that a call nobody answers times out and cleans up."""
+        super(RpcKombuReplyQueueTestCase, self).test_call_timeout()
+        self.assertEqual(0, len(self.rpc._REPLY_PROXY._waiters))
+
+    def test_abandoned_multicall(self):
+        """Test that an abandoned multicall does not leak its waiter."""
+        result = self.rpc.multicall(self.context,
+                                    'test',
+                                    {"method": "echo_three_times_yield",
+                                     "args": {"value": 42}})
+        self.assertEqual(42, iter(result).next())
+        del result
+        self.assertEqual(0, len(self.rpc._REPLY_PROXY._waiters))
+
+    def test_reply_proxy_is_created_once(self):
+        """Test that concurrent first calls share one reply proxy."""
+        created = []
+
+        def fake_reply_proxy():
+            created.append(1)
+            eventlet.sleep(0)
+            return 'proxy'
+
+        self.stubs.Set(self.rpc, 'ReplyProxy', fake_reply_proxy)
+        threads = [eventlet.spawn(self.rpc._get_reply_proxy)
+                   for i in xrange(2)]
+        self.assertEqual(['proxy', 'proxy'], [t.wait() for t in threads])
+        self.assertEqual(1, len(created))
+        self.rpc._REPLY_PROXY = None
@@ -0,0 +1,75 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for cloning disk images in nova.virt.disk."""
+
+import errno
+import os
+import shutil
+import tempfile
+
+from nova import test
+from nova.virt import disk
+
+
+class CloneImageTestCase(test.TestCase):
+    def setUp(self):
+        super(CloneImageTestCase, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.base = os.path.join(self.tmpdir, 'base')
+        self.target = os.path.join(self.tmpdir, 'target')
+        # NOTE: one chunk of data, one written chunk of zeros and a hole.
+        with open(self.base, 'wb') as f:
+            f.write('data' * 1024)
+            f.seek(disk._CLONE_CHUNK_SIZE)
+            f.write('\0' * disk._CLONE_CHUNK_SIZE)
+            f.truncate(disk._CLONE_CHUNK_SIZE * 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super(CloneImageTestCase, self).tearDown()
+
+    def _stub_unsupported(self, module, name):
+        def unsupported(*args):
+            raise IOError(errno.EOPNOTSUPP, 'unsupported')
+
+        self.stubs.Set(module, name, unsupported)
+
+    def _assert_cloned(self):
+        self.assertEqual(open(self.base).read(), open(self.target).read())
+
+    def test_clone_image(self):
+        strategy, written = disk.clone_image(self.base, self.target)
+        self._assert_cloned()
+        self.assertTrue(strategy in ('reflink', 'sparse copy'))
+
+    def test_sparse_copy_skips_holes_and_zeros(self):
+        self._stub_unsupported(disk.fcntl, 'ioctl')
+        strategy, written = disk.clone_image(self.base, self.target)
+        self._assert_cloned()
+        self.assertEqual('sparse copy', strategy)
+        # NOTE: how much of the data chunk is written depends on the
+        #       SEEK_DATA granularity of the filesystem.
+        self.assertTrue(written < disk._CLONE_CHUNK_SIZE * 4)
+
+    def test_falls_back_to_plain_copy(self):
+        self._stub_unsupported(disk.fcntl, 'ioctl')
+        self._stub_unsupported(disk.os, 'lseek')
+        strategy, written = disk.clone_image(self.base, self.target)
+        self._assert_cloned()
+        self.assertEqual(('copy', disk._CLONE_CHUNK_SIZE * 4),
+                         (strategy, written))
@@ -0,0 +1,118 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for fetching disk images in nova.virt.images."""
+
+import os
+import shutil
+import tempfile
+
+from nova import context
+from nova import exception
+from nova import test
+from nova import utils
+import nova.image
+from nova.virt import images
+
+
+class FakeImageService(object):
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    def get(self, context, image_id, data):
+        for chunk in self.chunks:
+            data.write(chunk)
+        if self.error:
+            raise self.error
+        return {'id': image_id}
+
+
+class ImagesTestCase(test.TestCase):
+    def setUp(self):
+        super(ImagesTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'image')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super(ImagesTestCase, self).tearDown()
+
+    def _stub_image_service(self, image_service):
+        self.stubs.Set(nova.image, 'get_image_service',
+                       lambda context, image_href: (image_service, 1))
+
+    def test_detect_format(self):
+        self.assertEqual('qcow2', images.detect_format('QFI\xfb\0\0\0\2'))
+        self.assertEqual('vdi',
+                         images.detect_format('x' * 0x40 + '\x7f\x10\xda\xbe'))
+        self.assertEqual('raw', images.detect_format('\0' * 512))
+        self.assertEqual('raw', images.detect_format(''))
+
+    def _stub_qemu_img(self, formats):
+        """Make qemu-img info report formats in turn, and convert write a
+        raw file."""
+        def fake_execute(*cmd, **kwargs):
+            executed.append(cmd)
+            if 'info' in cmd:
+                return 'file format: %s\n' % formats.pop(0), ''
+            open(cmd[-1], 'w').write('\0' * 512)
+            return '', ''
+
+        executed = []
+        self.stubs.Set(utils, 'execute', fake_execute)
+        return executed
+
+    def test_fetch_to_raw_renames_raw_images_into_place(self):
+        executed = self._stub_qemu_img(['raw'])
+        self._stub_image_service(FakeImageService(['\0' * 100, 'data']))
+        images.fetch_to_raw(self.context, '1', self.path, 'fake', 'fake')
+        self.assertEqual(1, len(executed))
+        self.assertEqual(['image'], os.listdir(self.tmpdir))
+        self.assertEqual('\0' * 100 + 'data', open(self.path).read())
+
+    def test_fetch_to_raw_converts_other_formats(self):
+        executed = self._stub_qemu_img(['qcow2', 'raw'])
+        self._stub_image_service(FakeImageService(['QFI\xfb', '\0' * 512]))
+        images.fetch_to_raw(self.context, '1', self.path, 'fake', 'fake')
+        self.assertEqual(3, len(executed))
+        self.assertEqual(['image'], os.listdir(self.tmpdir))
+        self.assertEqual('\0' * 512, open(self.path).read())
+
+    def test_fetch_to_raw_converts_formats_not_detected(self):
+        executed = self._stub_qemu_img(['vhdx', 'raw'])
+        self._stub_image_service(FakeImageService(['vhdxfile', '\0' * 512]))
+        images.fetch_to_raw(self.context, '1', self.path, 'fake', 'fake')
+        self.assertEqual(3, len(executed))
+        self.assertEqual('\0' * 512, open(self.path).read())
+
+    def test_fetch_to_raw_refuses_raw_with_other_header(self):
+        self._stub_qemu_img(['raw'])
+        self._stub_image_service(FakeImageService(['QFI\xfb', '\0' * 512]))
+        self.assertRaises(exception.ImageUnacceptable, images.fetch_to_raw,
+                          self.context, '1', self.path, 'fake', 'fake')
+        self.assertEqual([], os.listdir(self.tmpdir))
+
+    def test_fetch_removes_partial_download(self):
+        error = exception.ImageChecksumMismatch(image_id=1, checksum='a',
+                                                expected='b')
+        self._stub_image_service(FakeImageService(['data'], error))
+        self.assertRaises(exception.ImageChecksumMismatch,
+                          images.fetch_to_raw, self.context, '1', self.path,
+                          'fake', 'fake')
+        self.assertEqual([], os.listdir(self.tmpdir))
@@ -23,6 +23,8 @@ import re
 import stubout
 import ast
 
+from eventlet import greenthread
+
 from nova import db
 from nova import context
 from nova import flags
@@ -1058,3 +1060,158 @@ class HostStateTestCase(test.TestCase):
         self.assertEquals(stats['host_memory_overhead'], 20)
         self.assertEquals(stats['host_memory_free'], 30)
         self.assertEquals(stats['host_memory_free_computed'], 40)
+
+
+class XenAPISessionTestCase(test.TestCase):
+    """Unit tests for the pool of sessions in XenAPISession."""
+    def setUp(self):
+        super(XenAPISessionTestCase, self).setUp()
+        self.stubs = stubout.StubOutForTesting()
+        self.flags(xenapi_connection_concurrent=2)
+        xenapi_fake.reset()
+        stubs.stubout_session(self.stubs, xenapi_fake.SessionBase)
+        self.session = xenapi_conn.XenAPISession('test_url', 'root',
+                                                 'test_pass')
+
+    def tearDown(self):
+        super(XenAPISessionTestCase, self).tearDown()
+        self.stubs.UnsetAll()
+
+    def test_sessions_are_reused(self):
+        self.session.call_xenapi('VM.get_all')
+        self.session.call_xenapi('VM.get_all')
+        self.assertEqual(1, self.session._session_count)
+
+    def test_pool_grows_to_concurrent_limit(self):
+        with self.session._get_session() as first:
+            with self.session._get_session() as second:
+                self.assertNotEqual(first.handle, second.handle)
+        self.assertEqual(2, self.session._session_count)
+        self.assertEqual(2, len(xenapi_fake.get_all('session')))
+
+    def test_expired_session_logs_in_again(self):
+        self.session.call_xenapi('VM.get_all')
+        xenapi_fake.reset_table('session')
+        self.session.call_xenapi('VM.get_all')
+        self.assertEqual(1, len(xenapi_fake.get_all('session')))
+
+    def test_call_stats(self):
+        self.session.call_xenapi('VM.get_all')
+        self.session.call_xenapi('VM.get_all')
+        self.assertRaises(xenapi_fake.Failure, self.session.call_xenapi,
+                          'VM.get_record', 'bogus_ref')
+        stats = self.session.get_call_stats()
+        self.assertEqual(2, stats['VM.get_all']['calls'])
+        self.assertEqual(0, stats['VM.get_all']['errors'])
+        self.assertEqual(1, stats['VM.get_record']['errors'])
+
+
+class XenAPITaskTestCase(test.TestCase):
+    """Unit tests for waiting on tasks in XenAPISession."""
+    def setUp(self):
+        super(XenAPITaskTestCase, self).setUp()
+        self.stubs = stubout.StubOutForTesting()
+        self.flags(xenapi_task_poll_interval=0.01)
+        xenapi_fake.reset()
+        stubs.stubout_session(self.stubs, xenapi_fake.SessionBase)
+        self.session = xenapi_conn.XenAPISession('test_url', 'root',
+                                                 'test_pass')
+        self.task = xenapi_fake.create_task('test')
+
+    def tearDown(self):
+        if self.session._task_watcher is not None:
+            self.session._task_watcher.kill()
+        super(XenAPITaskTestCase, self).tearDown()
+        self.stubs.UnsetAll()
+
+    def _finish_task(self):
+        task = xenapi_fake.get_record('task', self.task)
+        task['status'] = 'success'
+        task['result'] = '<value><string>done</string></value>'
+
+    def test_wait_for_task_polls(self):
+        waiter = greenthread.spawn(self.session.wait_for_task, self.task)
+        greenthread.sleep(0.05)
+        self._finish_task()
+        self.assertEqual('done', waiter.wait())
+
+    def test_wait_for_task_raises_task_error(self):
+        task = xenapi_fake.get_record('task', self.task)
+        task['status'] = 'failure'
+        task['error_info'] = ['VM_BAD_POWER_STATE']
+        self.assertRaises(xenapi_fake.Failure, self.session.wait_for_task,
+                          self.task)
+
+    def test_wait_for_task_event(self):
+        self.flags(xenapi_task_events=True)
+
+        def fake_poll_task(task):
+            self.fail('Task should not be polled')
+
+        self.stubs.Set(self.session, '_poll_task', fake_poll_task)
+        waiter = greenthread.spawn(self.session.wait_for_task, self.task)
+        while self.task not in self.session._task_waiters:
+            greenthread.sleep(0.01)
+        self._finish_task()
+        xenapi_fake.queue_event('task', self.task)
+        self.assertEqual('done', waiter.wait())
+
+    def test_lost_events_fall_back_to_polling(self):
+        self.flags(xenapi_task_events=True)
+
+        def fake_event_next(*args):
+            raise xenapi_fake.Failure(['EVENTS_LOST'])
+
+        self.stubs.Set(xenapi_fake.SessionBase, 'event_next',
+                       fake_event_next)
+        waiter = greenthread.spawn(self.session.wait_for_task, self.task)
+        greenthread.sleep(0.05)
+        self._finish_task()
+        self.assertEqual('done', waiter.wait())
+        self.assertEqual(None, self.session._task_watcher)
+
+    def test_lost_events_log_out_their_session(self):
+        self.flags(xenapi_task_events=True)
+        sessions = len(xenapi_fake.get_all('session'))
+
+        def fake_event_next(*args):
+            raise xenapi_fake.Failure(['EVENTS_LOST'])
+
+        self.stubs.Set(xenapi_fake.SessionBase, 'event_next',
+                       fake_event_next)
+        self._finish_task()
+        self.assertEqual('done', self.session.wait_for_task(self.task))
+        while self.session._task_watcher is not None:
+            greenthread.sleep(0.01)
+        self.assertEqual(sessions, len(xenapi_fake.get_all('session')))
+
+    def test_failed_register_logs_out_its_session(self):
+        self.flags(xenapi_task_events=True)
+        sessions = len(xenapi_fake.get_all('session'))
+
+        def fake_event_register(*args):
+            raise xenapi_fake.Failure(['SESSION_INVALID'])
+
+        self.stubs.Set(xenapi_fake.SessionBase, 'event_register',
+                       fake_event_register)
+        self.assertFalse(self.session._start_task_watcher())
+        self.assertEqual(sessions, len(xenapi_fake.get_all('session')))
+
+    def test_silent_events_read_the_task_again(self):
+        self.flags(xenapi_task_events=True)
+
+        def fake_event_next(*args):
+            return []
+
+        def fake_poll_task(task):
+            self.fail('Task should not be polled')
+
+        self.stubs.Set(xenapi_fake.SessionBase, 'event_next',
+                       fake_event_next)
+        self.stubs.Set(self.session, '_poll_task', fake_poll_task)
+        waiter = greenthread.spawn(self.session.wait_for_task, self.task)
+        while self.task not in self.session._task_waiters:
+            greenthread.sleep(0.01)
+        self._finish_task()
+        self.assertEqual('done', waiter.wait())
+        self.assertNotEqual(None, self.session._task_watcher)
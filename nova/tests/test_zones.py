@@ -49,8 +49,10 @@ class ZoneManagerTestCase(test.TestCase):
     def test_ping(self):
         zm = zone_manager.ZoneManager()
         self.mox.StubOutWithMock(zm, '_refresh_from_db')
+        self.mox.StubOutWithMock(zm, '_refresh_host_states_from_db')
         self.mox.StubOutWithMock(zm, '_poll_zones')
         zm._refresh_from_db(mox.IgnoreArg())
+        zm._refresh_host_states_from_db(mox.IgnoreArg())
         zm._poll_zones(mox.IgnoreArg())
 
         self.mox.ReplayAll()
@@ -379,3 +381,95 @@ class ZoneManagerTestCase(test.TestCase):
         utils.set_time_override(time_future)
         caps = zm.get_zone_capabilities(None)
         self.assertEquals(caps, {})
+        utils.clear_time_override()
+
+    def test_get_host_states(self):
+        zm = zone_manager.ZoneManager()
+        zm.update_service_capabilities("compute", "host1",
+                dict(host_memory_free=2048 * zone_manager.MB))
+        zm.update_service_capabilities("compute", "host2",
+                dict(host_memory_free=1024 * zone_manager.MB))
+        zm.update_service_capabilities("volume", "host3", dict(a=1))
+
+        states = zm.get_host_states("compute")
+        self.assertEquals(sorted(states.keys()), ["host1", "host2"])
+        self.assertEquals(states["host1"].free_ram_mb, 2048)
+        self.assertEquals(states["host1"].free_disk_gb, None)
+
+    def test_get_host_states_expired_host(self):
+        zm = zone_manager.ZoneManager()
+        expiry_time = (FLAGS.periodic_interval * 3) + 1
+
+        zm.update_service_capabilities("compute", "host1",
+                dict(host_memory_free=2048 * zone_manager.MB))
+        time_future = utils.utcnow() + datetime.timedelta(seconds=expiry_time)
+        utils.set_time_override(time_future)
+        self.assertEquals(zm.get_host_states("compute"), {})
+        utils.clear_time_override()
+
+    def test_consume_host_resources(self):
+        zm = zone_manager.ZoneManager()
+        zm.update_service_capabilities("compute", "host1",
+                dict(host_memory_free=2048 * zone_manager.MB,
+                     disk_available=100 * zone_manager.GB))
+        state = zm.get_host_states("compute")["host1"]
+        instance_type = dict(memory_mb=1024, local_gb=20, vcpus=1)
+
+        zm.consume_host_resources("compute", "host1", instance_type)
+        self.assertEquals(state.free_ram_mb, 1024)
+        self.assertEquals(state.free_disk_gb, 80)
+        caps = zm.service_states["host1"]["compute"]
+        self.assertEquals(caps["host_memory_free"], 1024 * zone_manager.MB)
+        self.assertEquals(caps["disk_available"], 80 * zone_manager.GB)
+        self.assertTrue(state.can_fit(instance_type))
+
+        zm.consume_host_resources("compute", "host1", instance_type)
+        self.assertFalse(state.can_fit(instance_type))
+
+    def test_claims_survive_one_report(self):
+        zm = zone_manager.ZoneManager()
+        utils.set_time_override()
+        zm.update_service_capabilities("compute", "host1",
+                dict(host_memory_free=2048 * zone_manager.MB))
+        zm.get_host_states("compute")
+        utils.advance_time_seconds(1)
+        zm.consume_host_resources("compute", "host1", dict(memory_mb=1024))
+
+        # The first report after the claim may not include the new
+        # instance yet, so the claim is still counted ...
+        utils.advance_time_seconds(1)
+        zm.update_service_capabilities("compute", "host1",
+                dict(host_memory_free=2048 * zone_manager.MB))
+        state = zm.get_host_states("compute")["host1"]
+        self.assertEquals(state.free_ram_mb, 1024)
+
+        # ... but the one after that must.
+        utils.advance_time_seconds(1)
+        zm.update_service_capabilities("compute", "host1",
+                dict(host_memory_free=1024 * zone_manager.MB))
+        state = zm.get_host_states("compute")["host1"]
+        self.assertEquals(state.free_ram_mb, 1024)
+        self.assertEquals(state.claims, [])
+        utils.clear_time_override()
+
+    def test_claims_expire(self):
+        zm = zone_manager.ZoneManager()
+        zm.update_service_capabilities("compute", "host1",
+                dict(host_memory_free=2048 * zone_manager.MB))
+        state = zm.get_host_states("compute")["host1"]
+        zm.consume_host_resources("compute", "host1", dict(memory_mb=1024))
+
+        state.expire_claims(utils.utcnow() + datetime.timedelta(
+                seconds=FLAGS.host_state_claim_timeout + 1))
+        self.assertEquals(state.free_ram_mb, 2048)
+
+    def test_host_state_update_from_compute_node(self):
+        state = zone_manager.HostState("host1", "compute")
+        state.update_from_compute_node(dict(vcpus=4, vcpus_used=3,
+                memory_mb=4096, memory_mb_used=1024,
+                local_gb=100, local_gb_used=40))
+        self.assertEquals(state.free_ram_mb, 3072)
+        self.assertEquals(state.free_disk_gb, 60)
+        self.assertEquals(state.free_vcpus, 1)
+        self.assertTrue(state.can_fit(dict(vcpus=1)))
+        self.assertFalse(state.can_fit(dict(vcpus=2)))
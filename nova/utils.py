@@ -20,10 +20,11 @@
 """Utilities and helper functions."""
 
 import datetime
+import errno
+import fcntl
 import functools
 import inspect
 import json
-import lockfile
 import netaddr
 import os
 import random
@@ -630,6 +631,38 @@ class _NoopContextManager(object):
         pass
 
 
+class _InterProcessLock(object):
+    """Lock shared by processes through flock on a file.
+
+    lockfile.FileLock keeps its state in a file named after the host,
+    thread and pid, which green threads holding differently named locks
+    end up sharing.  flock state lives with the open file instead, and
+    goes away with the process that held it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lockfile = None
+
+    def __enter__(self):
+        self.lockfile = open(self.path, 'w')
+        while True:
+            try:
+                fcntl.flock(self.lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return self
+            except IOError as e:
+                if e.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+                greenthread.sleep(0.01)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            fcntl.flock(self.lockfile, fcntl.LOCK_UN)
+        finally:
+            self.lockfile.close()
+            self.lockfile = None
+
+
 def synchronized(name, external=False):
     """Synchronization decorator.
 
@@ -677,7 +710,7 @@ def synchronized(name, external=False):
                                 {'lock': name, 'method': f.__name__}))
                     lock_file_path = os.path.join(FLAGS.lock_path,
                                                   'nova-%s.lock' % name)
-                    lock = lockfile.FileLock(lock_file_path)
+                    lock = _InterProcessLock(lock_file_path)
                 else:
                     lock = _NoopContextManager()
 
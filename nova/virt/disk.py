@@ -25,6 +25,8 @@ Includes injection of SSH PGP keys into authorized_keys file.
 
 """
 
+import errno
+import fcntl
 import json
 import os
 import tempfile
@@ -73,6 +75,15 @@ flags.DEFINE_multistring('virt_mkfs',
                          '<os_type>=<mkfs command>')
 
 
+# NOTE: Linux values, which python 2 does not export.
+_FICLONE = 0x40049409
+_SEEK_DATA = 3
+_SEEK_HOLE = 4
+_CLONE_CHUNK_SIZE = 1024 * 1024
+_ZEROS = '\0' * _CLONE_CHUNK_SIZE
+_CLONE_UNSUPPORTED = (errno.EINVAL, errno.ENOTTY, errno.EOPNOTSUPP,
+                      errno.EXDEV, errno.EBADF, errno.EPERM)
+
 _MKFS_COMMAND = {}
 _DEFAULT_MKFS_COMMAND = None
 
@@ -105,6 +116,89 @@ def extend(image, size):
     utils.execute('resize2fs', image, check_exit_code=False)
 
 
+def _reflink_copy(src, dest, size):
+    fcntl.ioctl(dest.fileno(), _FICLONE, src.fileno())
+    return 0
+
+
+def _data_extents(src, size):
+    """Yield (start, end) of the parts of src that hold data."""
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(src.fileno(), offset, _SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                return
+            raise
+        end = os.lseek(src.fileno(), start, _SEEK_HOLE)
+        yield start, end
+        offset = end
+
+
+def _copy_range(src, dest, start, end, skip_zeros):
+    written = 0
+    src.seek(start)
+    while start < end:
+        chunk = src.read(min(_CLONE_CHUNK_SIZE, end - start))
+        if not chunk:
+            break
+        if not (skip_zeros and chunk == _ZEROS[:len(chunk)]):
+            dest.seek(start)
+            dest.write(chunk)
+            written += len(chunk)
+        start += len(chunk)
+    return written
+
+
+def _sparse_copy(src, dest, size):
+    written = 0
+    for start, end in _data_extents(src, size):
+        written += _copy_range(src, dest, start, end, True)
+    dest.truncate(size)
+    return written
+
+
+def _plain_copy(src, dest, size):
+    return _copy_range(src, dest, 0, size, False)
+
+
+_CLONE_STRATEGIES = [('reflink', _reflink_copy),
+                     ('sparse copy', _sparse_copy),
+                     ('copy', _plain_copy)]
+
+
+def clone_image(base, target):
+    """Copy base to target writing as little data as possible.
+
+    Tries a reflink clone that shares extents with base, then a copy that
+    skips holes and zero filled blocks, then a plain copy.  Returns the
+    name of the strategy used and the number of bytes written.
+
+    The copy is done with blocking file i/o, so green threads should
+    call this through tpool.
+    """
+    size = os.path.getsize(base)
+    with open(base, 'rb') as src:
+        with open(target, 'wb') as dest:
+            for strategy, copy in _CLONE_STRATEGIES:
+                try:
+                    written = copy(src, dest, size)
+                    break
+                except (IOError, OSError) as e:
+                    if (e.errno not in _CLONE_UNSUPPORTED or
+                        copy is _plain_copy):
+                        raise
+                    LOG.debug(_("Could not %(strategy)s %(base)s: %(e)s") %
+                              locals())
+                    dest.seek(0)
+                    dest.truncate(0)
+
+    LOG.debug(_("Cloned %(base)s to %(target)s by %(strategy)s, wrote"
+                " %(written)d of %(size)d bytes") % locals())
+    return strategy, written
+
+
 def inject_data(image, key=None, net=None, metadata=None,
                 partition=None, nbd=False, tune2fs=True):
     """Injects a ssh key and optionally net data into a disk image.
@@ -486,6 +486,17 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def manage_image_cache(self, context):
+        """Manage the local cache of images.
+
+        Drivers that keep no local copies of images have nothing to do.
+        """
+        pass
+
+    def prefetch_image(self, context, image_id):
+        """Download image_id into the local image cache ahead of use."""
+        raise NotImplementedError()
+
     def host_power_action(self, host, action):
         """Reboots, shuts down or powers up the host."""
         raise NotImplementedError()
@@ -22,6 +22,8 @@ Handling of VM disk images.
 """
 
 import os
+import sys
+import time
 
 from nova import exception
 from nova import flags
@@ -34,38 +36,113 @@ from nova import utils
 FLAGS = flags.FLAGS
 LOG = logging.getLogger('nova.virt.images')
 
-
-def fetch(context, image_href, path, _user_id, _project_id):
+# NOTE: (offset, magic, format) for the formats qemu-img probes for.  An
+#       image that matches none of them is what qemu-img calls raw.
+_FORMAT_MAGIC = [
+    (0, 'QFI\xfb', 'qcow2'),
+    (0, 'QED\x00', 'qed'),
+    (0, 'OOOM', 'cow'),
+    (0, 'KDMV', 'vmdk'),
+    (0, 'COWD', 'vmdk'),
+    (0, '# Disk DescriptorFile', 'vmdk'),
+    (0, 'conectix', 'vpc'),
+    (0x40, '\x7f\x10\xda\xbe', 'vdi'),
+    (0, 'Bochs Virtual HD Image', 'bochs'),
+    (0, 'WithoutFreeSpace', 'parallels'),
+    (0, '#!/bin/sh\n#V2.0 Format\nmodprobe cloop\n', 'cloop'),
+]
+_HEADER_SIZE = 512
+
+
+def detect_format(header):
+    """Return the disk format of an image from its first bytes."""
+    for offset, magic, fmt in _FORMAT_MAGIC:
+        if header[offset:offset + len(magic)] == magic:
+            return fmt
+    return 'raw'
+
+
+class _ImageWriter(object):
+    """Writes an image to a file, keeping its header and write times."""
+
+    def __init__(self, image_file):
+        self.image_file = image_file
+        self.header = ''
+        self.size = 0
+        self.write_time = 0.0
+
+    def write(self, data):
+        if len(self.header) < _HEADER_SIZE:
+            self.header += data[:_HEADER_SIZE - len(self.header)]
+        self.size += len(data)
+        start = time.time()
+        self.image_file.write(data)
+        self.write_time += time.time() - start
+
+
+def _fetch(context, image_href, path):
+    """Download an image to path, returning its metadata and header."""
     # TODO(vish): Improve context handling and add owner and auth data
     #             when it is added to glance.  Right now there is no
     #             auth checking in glance, so we assume that access was
     #             checked before we got here.
     (image_service, image_id) = nova.image.get_image_service(context,
                                                              image_href)
-    with open(path, "wb") as image_file:
-        metadata = image_service.get(context, image_id, image_file)
+    start = time.time()
+    try:
+        with open(path, "wb") as image_file:
+            writer = _ImageWriter(image_file)
+            metadata = image_service.get(context, image_id, writer)
+    except Exception:
+        type_, value, traceback = sys.exc_info()
+        if os.path.exists(path):
+            os.unlink(path)
+        raise type_, value, traceback
+
+    elapsed = time.time() - start
+    read_time = max(elapsed - writer.write_time, 1e-6)
+    write_time = max(writer.write_time, 1e-6)
+    mbytes = writer.size / 1024.0 / 1024.0
+    LOG.debug(_("Fetched %(mbytes).1f MB of image %(image_href)s in"
+                " %(elapsed).2fs: %(read_rate).1f MB/s from the image"
+                " service, %(write_rate).1f MB/s to disk") %
+              {'mbytes': mbytes, 'image_href': image_href,
+               'elapsed': elapsed, 'read_rate': mbytes / read_time,
+               'write_rate': mbytes / write_time})
+    return metadata, writer.header
+
+
+def fetch(context, image_href, path, _user_id, _project_id):
+    metadata, _header = _fetch(context, image_href, path)
     return metadata
 
 
-def fetch_to_raw(context, image_href, path, user_id, project_id):
-    path_tmp = "%s.part" % path
-    metadata = fetch(context, image_href, path_tmp, user_id, project_id)
+def _qemu_img_info(path):
+    out, err = utils.execute('env', 'LC_ALL=C', 'LANG=C',
+        'qemu-img', 'info', path)
+
+    # output of qemu-img is 'field: value'
+    # the fields of interest are 'file format' and 'backing file'
+    data = {}
+    for line in out.splitlines():
+        (field, val) = line.split(':', 1)
+        if val[0] == " ":
+            val = val[1:]
+        data[field] = val
 
-    def _qemu_img_info(path):
+    return(data)
 
-        out, err = utils.execute('env', 'LC_ALL=C', 'LANG=C',
-            'qemu-img', 'info', path)
 
-        # output of qemu-img is 'field: value'
-        # the fields of interest are 'file format' and 'backing file'
-        data = {}
-        for line in out.splitlines():
-            (field, val) = line.split(':', 1)
-            if val[0] == " ":
-                val = val[1:]
-            data[field] = val
+def fetch_to_raw(context, image_href, path, user_id, project_id):
+    """Download an image to path, converting it to raw if needed.
 
-        return(data)
+    qemu-img info decides the format of every download, since qemu probes
+    for more formats than detect_format knows.  The header sniffed while
+    the image streams in is only a hint: an image whose header looks like
+    another format is never accepted as raw.
+    """
+    path_tmp = "%s.part" % path
+    metadata, header = _fetch(context, image_href, path_tmp)
 
     data = _qemu_img_info(path_tmp)
 
@@ -75,6 +152,12 @@ def fetch_to_raw(context, image_href, path, user_id, project_id):
         raise exception.ImageUnacceptable(
             reason=_("'qemu-img info' parsing failed."), image_id=image_href)
 
+    if fmt == "raw" and detect_format(header) != "raw":
+        os.unlink(path_tmp)
+        raise exception.ImageUnacceptable(image_id=image_href,
+            reason=_("qemu-img reports raw, but the header is %s") %
+            detect_format(header))
+
     if fmt != "raw":
         staged = "%s.converted" % path
         if "backing file" in data:
@@ -70,6 +70,7 @@ from nova.compute import power_state
 from nova.virt import disk
 from nova.virt import driver
 from nova.virt import images
+from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import netutils
 
 
@@ -171,6 +172,9 @@ def _get_eph_disk(ephemeral):
 
 
 class LibvirtConnection(driver.ComputeDriver):
+    # NOTE: shared by every connection in the process, like the base
+    #       images it manages.
+    image_cache = imagecache.ImageCacheManager()
 
     def __init__(self, read_only):
         super(LibvirtConnection, self).__init__()
@@ -736,8 +740,8 @@ class LibvirtConnection(driver.ComputeDriver):
 
         return {'token': token, 'host': host, 'port': port}
 
-    @staticmethod
-    def _cache_image(fn, target, fname, cow=False, *args, **kwargs):
+    @classmethod
+    def _cache_image(cls, fn, target, fname, cow=False, *args, **kwargs):
         """Wrapper for a method that creates an image that caches the image.
 
         This wrapper will save the image into a common store and create a
@@ -753,24 +757,69 @@ class LibvirtConnection(driver.ComputeDriver):
         """
 
         if not os.path.exists(target):
-            base_dir = os.path.join(FLAGS.instances_path, '_base')
-            if not os.path.exists(base_dir):
-                os.mkdir(base_dir)
-            base = os.path.join(base_dir, fname)
-
-            @utils.synchronized(fname)
-            def call_if_not_exists(base, fn, *args, **kwargs):
-                if not os.path.exists(base):
-                    fn(target=base, *args, **kwargs)
-
-            call_if_not_exists(base, fn, *args, **kwargs)
-
-            if cow:
-                utils.execute('qemu-img', 'create', '-f', 'qcow2', '-o',
-                              'cluster_size=2M,backing_file=%s' % base,
-                              target)
-            else:
-                utils.execute('cp', base, target)
+            def create_target(base):
+                if cow:
+                    utils.execute('qemu-img', 'create', '-f', 'qcow2', '-o',
+                                  'cluster_size=2M,backing_file=%s' % base,
+                                  target)
+                else:
+                    # NOTE: regular file i/o never yields to other green
+                    #       threads, so copy in a native thread.
+                    tpool.execute(disk.clone_image, base, target)
+
+            cls.image_cache.fetch(fn, fname, create_target, *args, **kwargs)
+
+    def _referenced_base_images(self, context):
+        """Return the base file names the instances on this host use."""
+        referenced = set()
+        for instance in db.instance_get_all_by_host(context, FLAGS.host):
+            if instance['image_ref']:
+                root_fname = hashlib.sha1(str(instance['image_ref'])).\
+                        hexdigest()
+                referenced.update([root_fname, root_fname + '_sm'])
+            for image_id in (instance['kernel_id'], instance['ramdisk_id']):
+                if image_id:
+                    referenced.add('%08x' % int(image_id))
+        return referenced
+
+    def manage_image_cache(self, context):
+        """Evict base images no instance on this host needs any more."""
+        self.image_cache.manage(self._referenced_base_images(context))
+        LOG.debug(_('Image cache: %(image_cache_images)d images in '
+                    '%(image_cache_bytes)d bytes, %(image_cache_hits)d hits, '
+                    '%(image_cache_misses)d misses, '
+                    '%(image_cache_evictions)d evictions') %
+                  self.image_cache.get_stats())
+
+    def prefetch_image(self, context, image_id):
+        """Download an image and its kernel and ramdisk into the cache."""
+        (image_service, service_image_id) = nova.image.get_image_service(
+                context, image_id)
+        properties = image_service.show(context,
+                                        service_image_id).get('properties',
+                                                              {})
+
+        def use_base(base):
+            pass
+
+        for prop in ('kernel_id', 'ramdisk_id'):
+            if properties.get(prop):
+                self.image_cache.fetch(self._fetch_image,
+                                       '%08x' % int(properties[prop]),
+                                       use_base,
+                                       context=context,
+                                       image_id=properties[prop],
+                                       user_id=context.user_id,
+                                       project_id=context.project_id)
+        LOG.info(_('Prefetching image %s'), image_id)
+        self.image_cache.fetch(self._fetch_image,
+                               hashlib.sha1(str(image_id)).hexdigest(),
+                               use_base,
+                               context=context,
+                               image_id=image_id,
+                               user_id=context.user_id,
+                               project_id=context.project_id,
+                               size=FLAGS.minimum_root_size)
 
     def _fetch_image(self, context, target, image_id, user_id, project_id,
                      size=None):
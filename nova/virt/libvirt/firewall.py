@@ -509,6 +509,10 @@ class IptablesFirewallDriver(FirewallDriver):
         self.iptables = linux_net.iptables_manager
         self.instances = {}
         self.network_infos = {}
+        # Compiled rules by security group id and the security groups of
+        # each filtered instance, see _security_group_rules
+        self.compiled_security_groups = {}
+        self.instance_security_groups = {}
         self.nwfilter = NWFilterFirewall(kwargs['get_connection'])
         self.basicly_filtered = False
 
@@ -533,6 +537,7 @@ class IptablesFirewallDriver(FirewallDriver):
         if self.instances.pop(instance['id'], None):
             # NOTE(vish): use the passed info instead of the stored info
             self.network_infos.pop(instance['id'])
+            self._forget_instance_security_groups(instance)
             self.remove_filters_for_instance(instance)
             self.iptables.apply()
             self.nwfilter.unfilter_instance(instance, network_info)
@@ -640,89 +645,149 @@ class IptablesFirewallDriver(FirewallDriver):
 
         security_groups = db.security_group_get_by_instance(ctxt,
                                                             instance['id'])
+        self.instance_security_groups[instance['id']] = \
+                set([security_group['id']
+                     for security_group in security_groups])
 
         # then, security group chains and rules
         for security_group in security_groups:
-            rules = db.security_group_rule_get_by_security_group(ctxt,
-                                                          security_group['id'])
+            group_ipv4_rules, group_ipv6_rules = \
+                    self._security_group_rules(ctxt, security_group['id'])
+            ipv4_rules += group_ipv4_rules
+            ipv6_rules += group_ipv6_rules
 
-            for rule in rules:
-                LOG.debug(_('Adding security group rule: %r'), rule)
+        ipv4_rules += ['-j $sg-fallback']
+        ipv6_rules += ['-j $sg-fallback']
 
-                if not rule.cidr:
-                    version = 4
-                else:
-                    version = netutils.get_ip_version(rule.cidr)
+        return ipv4_rules, ipv6_rules
+
+    def _security_group_rules(self, ctxt, security_group_id):
+        """Return the compiled ipv4 and ipv6 rules of a security group.
+
+        The rules are compiled once and shared by every instance in the
+        group until a refresh invalidates them.
+        """
+        if security_group_id not in self.compiled_security_groups:
+            self.compiled_security_groups[security_group_id] = \
+                    self._compile_security_group(ctxt, security_group_id)
+        _grantees, ipv4_rules, ipv6_rules = \
+                self.compiled_security_groups[security_group_id]
+        return ipv4_rules, ipv6_rules
+
+    def _compile_security_group(self, ctxt, security_group_id):
+        """Build the rules of a security group.
+
+        Returns the ids of the grantee groups along with the ipv4 and ipv6
+        rules. Addresses of grantee group members are looked up in one
+        query rather than one per member.
+        """
+        ipv4_rules = []
+        ipv6_rules = []
 
-                if version == 4:
-                    fw_rules = ipv4_rules
+        rules = db.security_group_rule_get_by_security_group(
+                ctxt, security_group_id)
+        grantees = set([rule['group_id'] for rule in rules
+                        if not rule.cidr and rule['grantee_group']])
+        member_addresses = {}
+        if grantees:
+            member_addresses = db.security_group_get_member_addresses(ctxt,
+                                                                list(grantees))
+
+        for rule in rules:
+            LOG.debug(_('Adding security group rule: %r'), rule)
+
+            if not rule.cidr:
+                version = 4
+            else:
+                version = netutils.get_ip_version(rule.cidr)
+
+            if version == 4:
+                fw_rules = ipv4_rules
+            else:
+                fw_rules = ipv6_rules
+
+            protocol = rule.protocol
+            if version == 6 and rule.protocol == 'icmp':
+                protocol = 'icmpv6'
+
+            args = ['-j ACCEPT']
+            if protocol:
+                args += ['-p', protocol]
+
+            if protocol in ['udp', 'tcp']:
+                if rule.from_port == rule.to_port:
+                    args += ['--dport', '%s' % (rule.from_port,)]
                 else:
-                    fw_rules = ipv6_rules
-
-                protocol = rule.protocol
-                if version == 6 and rule.protocol == 'icmp':
-                    protocol = 'icmpv6'
-
-                args = ['-j ACCEPT']
-                if protocol:
-                    args += ['-p', protocol]
-
-                if protocol in ['udp', 'tcp']:
-                    if rule.from_port == rule.to_port:
-                        args += ['--dport', '%s' % (rule.from_port,)]
-                    else:
-                        args += ['-m', 'multiport',
-                                 '--dports', '%s:%s' % (rule.from_port,
-                                                        rule.to_port)]
-                elif protocol == 'icmp':
-                    icmp_type = rule.from_port
-                    icmp_code = rule.to_port
-
-                    if icmp_type == -1:
-                        icmp_type_arg = None
-                    else:
-                        icmp_type_arg = '%s' % icmp_type
-                        if not icmp_code == -1:
-                            icmp_type_arg += '/%s' % icmp_code
-
-                    if icmp_type_arg:
-                        if version == 4:
-                            args += ['-m', 'icmp', '--icmp-type',
-                                     icmp_type_arg]
-                        elif version == 6:
-                            args += ['-m', 'icmp6', '--icmpv6-type',
-                                     icmp_type_arg]
-
-                if rule.cidr:
-                    LOG.info('Using cidr %r', rule.cidr)
-                    args += ['-s', rule.cidr]
-                    fw_rules += [' '.join(args)]
+                    args += ['-m', 'multiport',
+                             '--dports', '%s:%s' % (rule.from_port,
+                                                    rule.to_port)]
+            elif protocol == 'icmp':
+                icmp_type = rule.from_port
+                icmp_code = rule.to_port
+
+                if icmp_type == -1:
+                    icmp_type_arg = None
                 else:
-                    if rule['grantee_group']:
-                        for instance in rule['grantee_group']['instances']:
-                            LOG.info('instance: %r', instance)
-                            ips = db.instance_get_fixed_addresses(ctxt,
-                                                                instance['id'])
-                            LOG.info('ips: %r', ips)
-                            for ip in ips:
-                                subrule = args + ['-s %s' % ip]
-                                fw_rules += [' '.join(subrule)]
-
-                LOG.info('Using fw_rules: %r', fw_rules)
-        ipv4_rules += ['-j $sg-fallback']
-        ipv6_rules += ['-j $sg-fallback']
+                    icmp_type_arg = '%s' % icmp_type
+                    if not icmp_code == -1:
+                        icmp_type_arg += '/%s' % icmp_code
 
-        return ipv4_rules, ipv6_rules
+                if icmp_type_arg:
+                    if version == 4:
+                        args += ['-m', 'icmp', '--icmp-type',
+                                 icmp_type_arg]
+                    elif version == 6:
+                        args += ['-m', 'icmp6', '--icmpv6-type',
+                                 icmp_type_arg]
+
+            if rule.cidr:
+                LOG.info('Using cidr %r', rule.cidr)
+                args += ['-s', rule.cidr]
+                fw_rules += [' '.join(args)]
+            else:
+                if rule['grantee_group']:
+                    ips = member_addresses[rule['group_id']]
+                    LOG.info('ips: %r', ips)
+                    for ip in ips:
+                        subrule = args + ['-s %s' % ip]
+                        fw_rules += [' '.join(subrule)]
+
+            LOG.info('Using fw_rules: %r', fw_rules)
+
+        return grantees, ipv4_rules, ipv6_rules
+
+    def _invalidate_security_group_rules(self, security_group_id):
+        self.compiled_security_groups.pop(security_group_id, None)
+
+    def _invalidate_security_group_members(self, security_group_id):
+        # NOTE: compute.api sends a single members refresh when several
+        # groups change at once, so drop every compiled group that grants
+        # access to other groups rather than only those granting this one.
+        for group_id, (grantees, _ipv4, _ipv6) in \
+                self.compiled_security_groups.items():
+            if grantees:
+                del self.compiled_security_groups[group_id]
+
+    def _forget_instance_security_groups(self, instance):
+        """Drop compiled groups no longer used by a filtered instance."""
+        groups = self.instance_security_groups.pop(instance['id'], set())
+        in_use = set()
+        for instance_groups in self.instance_security_groups.values():
+            in_use.update(instance_groups)
+        for group_id in groups - in_use:
+            self.compiled_security_groups.pop(group_id, None)
 
     def instance_filter_exists(self, instance, network_info):
         """Check nova-instance-instance-xxx exists"""
         return self.nwfilter.instance_filter_exists(instance, network_info)
 
     def refresh_security_group_members(self, security_group):
+        self._invalidate_security_group_members(security_group)
         self.do_refresh_security_group_rules(security_group)
         self.iptables.apply()
 
     def refresh_security_group_rules(self, security_group):
+        self._invalidate_security_group_rules(security_group)
         self.do_refresh_security_group_rules(security_group)
         self.iptables.apply()
 
@@ -0,0 +1,210 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Manages the base images cached in instances_path/_base.
+
+Base files are created at most once per host: creating one holds a lock
+shared by every nova-compute worker on the host.  Each use of a base
+file bumps its mtime, so the mtime doubles as the last use time for LRU
+eviction, and a base used after an eviction pass started is kept by that
+pass.  A base file is never evicted while an instance disk on the host
+is backed by it, or while an instance on the host was booted from the
+image it holds.
+"""
+
+import errno
+import os
+import struct
+import time
+
+from nova import flags
+from nova import log as logging
+from nova import utils
+
+
+LOG = logging.getLogger('nova.virt.libvirt.imagecache')
+FLAGS = flags.FLAGS
+flags.DEFINE_integer('image_cache_manager_interval', 2400,
+                     'Seconds between runs of the base image cache manager')
+flags.DEFINE_integer('image_cache_max_age', 86400,
+                     'Unused base images older than this many seconds are'
+                     ' removed, 0 to keep them regardless of age')
+flags.DEFINE_integer('image_cache_max_size', 0,
+                     'Size in MB the base images may use before the least'
+                     ' recently used unused ones are removed, 0 for no'
+                     ' limit')
+
+_QCOW_MAGIC = 'QFI\xfb'
+_QCOW_HEADER = struct.Struct('>4sIQI')
+
+
+def get_backing_file(path):
+    """Return the backing file named in a qcow2 header, or None."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_QCOW_HEADER.size)
+            if len(header) < _QCOW_HEADER.size:
+                return None
+            magic, _version, offset, size = _QCOW_HEADER.unpack(header)
+            if magic != _QCOW_MAGIC or not offset or not size:
+                return None
+            f.seek(offset)
+            return f.read(size)
+    except IOError:
+        return None
+
+
+class ImageCacheManager(object):
+    """Creates, tracks and evicts the base images of a host."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._last_run = 0
+
+    @property
+    def base_dir(self):
+        return os.path.join(FLAGS.instances_path, '_base')
+
+    def _ensure_base_dir(self):
+        if os.path.exists(self.base_dir):
+            return
+        try:
+            os.mkdir(self.base_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    @staticmethod
+    def _touch(path):
+        if os.path.exists(path):
+            os.utime(path, None)
+
+    def fetch(self, fn, fname, use_fn, *args, **kwargs):
+        """Make sure the base file fname exists and hand it to use_fn.
+
+        fn is called with target set to the path of the base file when it
+        does not exist yet.  Only one worker on the host calls fn for a
+        given fname; the others wait for it and then reuse its result.
+        use_fn is then called with the path of the base file outside the
+        lock, so uses of one base, such as full copies, run in parallel.
+        The base is touched under the lock first, which keeps an eviction
+        pass that is already running from removing it.
+        """
+        self._ensure_base_dir()
+        base = os.path.join(self.base_dir, fname)
+
+        @utils.synchronized(fname, external=True)
+        def call_if_not_exists():
+            if os.path.exists(base):
+                self.hits += 1
+            else:
+                self.misses += 1
+                fn(target=base, *args, **kwargs)
+            self._touch(base)
+
+        call_if_not_exists()
+        use_fn(base)
+
+    def _list_bases(self):
+        """Return (fname, path, size, mtime) for each base file."""
+        if not os.path.isdir(self.base_dir):
+            return []
+        bases = []
+        for fname in os.listdir(self.base_dir):
+            # NOTE: skip downloads and conversions still in progress.
+            if fname.endswith('.part') or fname.endswith('.converted'):
+                continue
+            path = os.path.join(self.base_dir, fname)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            bases.append((fname, path, stat.st_blocks * 512, stat.st_mtime))
+        return bases
+
+    def _backing_files_in_use(self):
+        """Return the names of the base files instance disks point at."""
+        in_use = set()
+        instances_path = FLAGS.instances_path
+        for name in os.listdir(instances_path):
+            instance_dir = os.path.join(instances_path, name)
+            if name == '_base' or not os.path.isdir(instance_dir):
+                continue
+            for disk_name in os.listdir(instance_dir):
+                backing_file = get_backing_file(os.path.join(instance_dir,
+                                                             disk_name))
+                if backing_file:
+                    in_use.add(os.path.basename(backing_file))
+        return in_use
+
+    def _remove(self, fname, path, started):
+        @utils.synchronized(fname, external=True)
+        def remove_if_unused():
+            # NOTE: a base used since this pass started may be backing a
+            #       disk that did not exist when references were counted.
+            try:
+                if os.stat(path).st_mtime >= started:
+                    return False
+                os.unlink(path)
+            except OSError:
+                return False
+            return True
+
+        if remove_if_unused():
+            self.evictions += 1
+            LOG.info(_('Removed unused base image %s'), path)
+            return True
+        return False
+
+    def manage(self, referenced=None):
+        """Evict unused base files that are too old or over the budget.
+
+        referenced names base files that must be kept in addition to the
+        ones that instance disks are backed by.
+        """
+        now = time.time()
+        if now - self._last_run < FLAGS.image_cache_manager_interval:
+            return
+        self._last_run = now
+
+        keep = self._backing_files_in_use()
+        keep.update(referenced or [])
+        bases = self._list_bases()
+        total = sum(size for _fname, _path, size, _mtime in bases)
+        unused = sorted([base for base in bases if base[0] not in keep],
+                        key=lambda base: base[3])
+
+        max_age = FLAGS.image_cache_max_age
+        max_size = FLAGS.image_cache_max_size * 1024 * 1024
+        for fname, path, size, mtime in unused:
+            too_old = max_age and now - mtime > max_age
+            too_big = max_size and total > max_size
+            if not (too_old or too_big):
+                continue
+            if self._remove(fname, path, now):
+                total -= size
+
+    def get_stats(self):
+        """Return image cache statistics."""
+        bases = self._list_bases()
+        return {'image_cache_images': len(bases),
+                'image_cache_bytes': sum(base[2] for base in bases),
+                'image_cache_hits': self.hits,
+                'image_cache_misses': self.misses,
+                'image_cache_evictions': self.evictions}
@@ -66,6 +66,9 @@ _CLASSES = ['host', 'network', 'session', 'SR', 'VBD',
 
 _db_content = {}
 
+# Maps each session registered for events to its classes and pending events
+_events = {}
+
 LOG = logging.getLogger("nova.virt.xenapi.fake")
 
 
@@ -78,6 +81,7 @@ def log_db_contents(msg=None):
 def reset():
     for c in _CLASSES:
         _db_content[c] = {}
+    _events.clear()
     create_host('fake')
     create_vm('fake',
               'Running',
@@ -193,6 +197,20 @@ def create_task(name_label):
                            'status': 'pending'})
 
 
+def queue_event(cls, ref, operation='mod'):
+    """Queue an event for the given object for every session registered
+    for events of its class."""
+    snapshot = None
+    if operation != 'del':
+        snapshot = dict(_db_content[cls][ref])
+    for classes, events in _events.itervalues():
+        if cls in classes or '*' in classes:
+            events.append({'class': cls,
+                           'operation': operation,
+                           'ref': ref,
+                           'snapshot': snapshot})
+
+
 def create_local_pifs():
     """Adds a PIF for each to the local database with VLAN=-1.
        Do this one per host."""
@@ -387,6 +405,21 @@ class SessionBase(object):
     def network_get_all_records_where(self, _1, filter):
         return self.xenapi.network.get_all_records()
 
+    def event_register(self, _1, classes):
+        _events.setdefault(self._session, (set(), []))[0].update(classes)
+
+    def event_unregister(self, _1, classes):
+        if self._session in _events:
+            _events[self._session][0].difference_update(classes)
+
+    def event_next(self, _1):
+        if self._session not in _events:
+            raise Failure(['SESSION_NOT_REGISTERED', self._session])
+        events = _events[self._session][1]
+        result = events[:]
+        del events[:]
+        return result
+
     def xenapi_request(self, methodname, params):
         if methodname.startswith('login'):
             self._login(methodname, params)
@@ -413,6 +446,7 @@ class SessionBase(object):
     def _logout(self):
         s = self._session
         self._session = None
+        _events.pop(s, None)
         if s not in _db_content['session']:
             raise exception.Error(
                 "Logging out a session that is invalid or already logged "
@@ -568,6 +602,7 @@ class SessionBase(object):
             task['error_info'] = exc.details
             task['status'] = 'failed'
         task['finished'] = utils.utcnow()
+        queue_event('task', task_ref)
         return task_ref
 
     def _check_session(self, params):
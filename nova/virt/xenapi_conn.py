@@ -26,7 +26,8 @@ reasons.
 
 All long-running XenAPI calls (VM.start, VM.reboot, etc) are called async
 (using XenAPI.VM.async_start etc). These return a task, which can then be
-polled for completion.
+polled for completion, or waited on with a single greenthread watching task
+events for the session.
 
 This combination of techniques means that we don't block the main thread at
 all, and at the same time we don't hold lots of threads waiting for
@@ -45,6 +46,8 @@ reactor thread if the VM.get_by_name_label or VM.get_record calls block.
 :xenapi_task_poll_interval:  The interval (seconds) used for polling of
                              remote tasks (Async.VM.start, etc)
                              (default: 0.5).
+:xenapi_task_events:  Wait for remote tasks using XenAPI task events rather
+                      than polling each one (default: False).
 :target_host:                the iSCSI Target Host IP address, i.e. the IP
                              address for the nova-volume host
 :target_port:                iSCSI Target Port, 3260 Default
@@ -57,13 +60,18 @@ reactor thread if the VM.get_by_name_label or VM.get_record calls block.
 - suffix "_rec" for record objects
 """
 
+import contextlib
+import functools
 import json
 import random
 import sys
+import time
 import urlparse
 import xmlrpclib
 
 from eventlet import event
+from eventlet import greenthread
+from eventlet import queue
 from eventlet import tpool
 from eventlet import timeout
 
@@ -101,6 +109,11 @@ flags.DEFINE_float('xenapi_task_poll_interval',
                    'The interval used for polling of remote tasks '
                    '(Async.VM.start, etc). Used only if '
                    'connection_type=xenapi.')
+flags.DEFINE_bool('xenapi_task_events',
+                  False,
+                  'Wait for remote tasks by watching XenAPI task events'
+                  ' instead of polling each task. Polling is still used if'
+                  ' the events fail. Used only if connection_type=xenapi.')
 flags.DEFINE_float('xenapi_vhd_coalesce_poll_interval',
                    5.0,
                    'The interval used for polling of coalescing vhds.'
@@ -138,6 +151,13 @@ flags.DEFINE_string('xenapi_remap_vbd_dev_prefix', 'sd',
 flags.DEFINE_integer('xenapi_login_timeout',
                      10,
                      'Timeout in seconds for XenAPI login.')
+flags.DEFINE_integer('xenapi_connection_concurrent',
+                     5,
+                     'Maximum number of concurrent XenAPI connections.'
+                     ' Used only if connection_type=xenapi.')
+
+# Poll intervals a task waits for its event before it is read again.
+_TASK_EVENT_WAIT_INTERVALS = 5
 
 
 def get_connection(_):
@@ -368,15 +388,100 @@ class XenAPIConnection(driver.ComputeDriver):
 
 
 class XenAPISession(object):
-    """The session to invoke XenAPI SDK calls"""
+    """The session to invoke XenAPI SDK calls
+
+    Background calls are made over a pool of up to
+    FLAGS.xenapi_connection_concurrent logged in sessions, so that calls
+    made at the same time don't wait on one connection. A session that
+    has expired is logged in again and the call retried once.
+    """
 
     def __init__(self, url, user, pw):
         self.XenAPI = self.get_imported_xenapi()
-        self._session = self._create_session(url)
+        self._url = url
+        self._user = user
+        self._pw = pw
+        self._sessions = queue.Queue()
+        self._session_count = 0
+        self._call_stats = {}
+        self._session = self._new_session()
+        self._sessions.put(self._session)
+        self._task_waiters = {}
+        self._task_watcher = None
+
+    def _new_session(self):
+        """Create and log in a session for the pool."""
+        self._session_count += 1
+        try:
+            session = self._create_session(self._url)
+            self._login(session)
+        except Exception:
+            self._session_count -= 1
+            raise
+        return session
+
+    def _login(self, session):
         exception = self.XenAPI.Failure(_("Unable to log in to XenAPI "
                             "(is the Dom0 disk full?)"))
         with timeout.Timeout(FLAGS.xenapi_login_timeout, exception):
-            self._session.login_with_password(user, pw)
+            session.login_with_password(self._user, self._pw)
+
+    @contextlib.contextmanager
+    def _get_session(self):
+        """Check a session out of the pool, logging in another one if all
+        of them are in use and the pool is not full."""
+        if (self._sessions.empty() and
+            self._session_count < FLAGS.xenapi_connection_concurrent):
+            session = self._new_session()
+        else:
+            session = self._sessions.get()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def _is_session_invalid(self, exc):
+        details = getattr(exc, 'details', None)
+        if not isinstance(details, (list, tuple)):
+            return False
+        return (list(details[:1]) == ['SESSION_INVALID'] or
+                list(details[:2]) == ['HANDLE_INVALID', 'session'])
+
+    def _call_pooled(self, name, get_func, *args):
+        """Call get_func(session)(*args) on a background thread with a
+        session from the pool, and record how long it took under name."""
+        start = time.time()
+        failed = False
+        try:
+            with self._get_session() as session:
+                try:
+                    return tpool.execute(get_func(session), *args)
+                except self.XenAPI.Failure, exc:
+                    if not self._is_session_invalid(exc):
+                        raise
+                    LOG.info(_("XenAPI session expired, logging in again"))
+                    self._login(session)
+                    return tpool.execute(get_func(session), *args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            duration = time.time() - start
+            stats = self._call_stats.setdefault(name, {'calls': 0,
+                                                       'errors': 0,
+                                                       'max_duration': 0.0,
+                                                       'total_duration': 0.0})
+            stats['calls'] += 1
+            if failed:
+                stats['errors'] += 1
+            stats['max_duration'] = max(stats['max_duration'], duration)
+            stats['total_duration'] += duration
+
+    def get_call_stats(self):
+        """Return the call count and timings of each XenAPI method called
+        on a background thread."""
+        return dict((name, dict(stats))
+                    for name, stats in self._call_stats.iteritems())
 
     def get_imported_xenapi(self):
         """Stubout point. This can be replaced with a mock xenapi module."""
@@ -392,59 +497,55 @@ class XenAPISession(object):
 
     def call_xenapi(self, method, *args):
         """Call the specified XenAPI method on a background thread."""
-        f = self._session.xenapi
-        for m in method.split('.'):
-            f = f.__getattr__(m)
-        return tpool.execute(f, *args)
+        def get_func(session):
+            f = session.xenapi
+            for m in method.split('.'):
+                f = f.__getattr__(m)
+            return f
+
+        return self._call_pooled(method, get_func, *args)
 
     def call_xenapi_request(self, method, *args):
         """Some interactions with dom0, such as interacting with xenstore's
         param record, require using the xenapi_request method of the session
         object. This wraps that call on a background thread.
         """
-        f = self._session.xenapi_request
-        return tpool.execute(f, method, *args)
+        return self._call_pooled(method,
+                                 lambda session: session.xenapi_request,
+                                 method, *args)
 
     def async_call_plugin(self, plugin, fn, args):
         """Call Async.host.call_plugin on a background thread."""
-        return tpool.execute(self._unwrap_plugin_exceptions,
-                             self._session.xenapi.Async.host.call_plugin,
-                             self.get_xenapi_host(), plugin, fn, args)
+        def get_func(session):
+            return functools.partial(self._unwrap_plugin_exceptions,
+                                     session.xenapi.Async.host.call_plugin)
+
+        return self._call_pooled('Async.host.call_plugin', get_func,
+                                 self.get_xenapi_host(), plugin, fn, args)
 
     def wait_for_task(self, task, id=None):
-        """Return the result of the given task. The task is polled
-        until it completes."""
+        """Return the result of the given task. If FLAGS.xenapi_task_events
+        is set, wait for the event of the task finishing, otherwise poll
+        the task until it completes."""
+        record = None
+        if FLAGS.xenapi_task_events and self._start_task_watcher():
+            record = self._wait_for_task_event(task)
+        if record is None:
+            record = self._poll_task(task)
+        return self._task_result(task, id, record)
+
+    def _poll_task(self, task):
+        """Poll the given XenAPI task until it is no longer pending, and
+        return its record."""
         done = event.Event()
         loop = utils.LoopingCall(f=None)
 
         def _poll_task():
-            """Poll the given XenAPI task, and return the result if the
-            action was completed successfully or not.
-            """
             try:
-                name = self._session.xenapi.task.get_name_label(task)
-                status = self._session.xenapi.task.get_status(task)
-                # Ensure action is never > 255
-                action = dict(action=name[:255], error=None)
-                if id:
-                    action["instance_id"] = int(id)
-                if status == "pending":
+                record = self._session.xenapi.task.get_record(task)
+                if record['status'] == "pending":
                     return
-                elif status == "success":
-                    result = self._session.xenapi.task.get_result(task)
-                    LOG.info(_("Task [%(name)s] %(task)s status:"
-                            " success    %(result)s") % locals())
-                    done.send(_parse_xmlrpc_value(result))
-                else:
-                    error_info = self._session.xenapi.task.get_error_info(task)
-                    action["error"] = str(error_info)
-                    LOG.warn(_("Task [%(name)s] %(task)s status:"
-                            " %(status)s    %(error_info)s") % locals())
-                    done.send_exception(self.XenAPI.Failure(error_info))
-
-                if id:
-                    db.instance_action_create(context.get_admin_context(),
-                            action)
+                done.send(record)
             except self.XenAPI.Failure, exc:
                 LOG.warn(exc)
                 done.send_exception(*sys.exc_info())
@@ -454,6 +555,118 @@ class XenAPISession(object):
         loop.start(FLAGS.xenapi_task_poll_interval, now=True)
         return done.wait()
 
+    def _task_result(self, task, id, record):
+        """Return the parsed result of a finished task, or raise its
+        error, recording it as an action of instance id if given."""
+        name = record['name_label']
+        status = record['status']
+        # Ensure action is never > 255
+        action = dict(action=name[:255], error=None)
+        if id:
+            action["instance_id"] = int(id)
+        try:
+            if status == "success":
+                result = record.get('result')
+                LOG.info(_("Task [%(name)s] %(task)s status:"
+                        " success    %(result)s") % locals())
+                return _parse_xmlrpc_value(result)
+            else:
+                error_info = record.get('error_info')
+                action["error"] = str(error_info)
+                LOG.warn(_("Task [%(name)s] %(task)s status:"
+                        " %(status)s    %(error_info)s") % locals())
+                raise self.XenAPI.Failure(error_info)
+        finally:
+            if id:
+                db.instance_action_create(context.get_admin_context(),
+                                          action)
+
+    def _wait_for_task_event(self, task):
+        """Wait for the task watcher to see the given task finish, and
+        return its record, or None if the watcher stopped first."""
+        done = event.Event()
+        self._task_waiters[task] = done
+        try:
+            while self._task_watcher is not None:
+                # NOTE: the task may have finished before it had a waiter,
+                #       and the events may stop without an error inside
+                #       tpool, so the task is read again after each wait.
+                record = self.call_xenapi('task.get_record', task)
+                if record['status'] != "pending":
+                    return record
+                with timeout.Timeout(FLAGS.xenapi_task_poll_interval *
+                                     _TASK_EVENT_WAIT_INTERVALS, False):
+                    return done.wait()
+            return None
+        finally:
+            del self._task_waiters[task]
+
+    def _wake_task_waiter(self, task, record):
+        done = self._task_waiters.get(task)
+        if done is not None and not done.ready():
+            done.send(record)
+
+    def _start_task_watcher(self):
+        """Start the greenthread that wakes the waiters of finished tasks
+        unless it is running. Return False if it could not be started."""
+        if self._task_watcher is not None:
+            return True
+        try:
+            session = self._create_session(self._url)
+            self._login(session)
+        except Exception:
+            LOG.exception(_("Unable to watch XenAPI task events, polling"
+                            " tasks instead"))
+            return False
+        try:
+            tpool.execute(session.xenapi.event.register, ['task'])
+        except Exception:
+            LOG.exception(_("Unable to watch XenAPI task events, polling"
+                            " tasks instead"))
+            self._logout_task_watcher(session)
+            return False
+        self._task_watcher = greenthread.spawn(self._watch_tasks, session)
+        return True
+
+    def _watch_tasks(self, session):
+        """Wake the waiter of each task that an event shows has finished.
+
+        The session is only used for events, since event.next blocks until
+        there are some. If the events fail, all waiters are woken to poll
+        their tasks, and the next wait_for_task starts a new watcher.
+        """
+        try:
+            while True:
+                events = tpool.execute(session.xenapi.event.next)
+                if not events:
+                    greenthread.sleep(FLAGS.xenapi_task_poll_interval)
+                    continue
+                for ev in events:
+                    if ev.get('class') != 'task':
+                        continue
+                    record = ev.get('snapshot')
+                    if ev.get('operation') == 'del' or not record:
+                        self._wake_task_waiter(ev.get('ref'), None)
+                    elif record.get('status') != "pending":
+                        self._wake_task_waiter(ev.get('ref'), record)
+        except Exception:
+            LOG.exception(_("Lost XenAPI task events, polling tasks"
+                            " instead"))
+        finally:
+            self._task_watcher = None
+            for task in self._task_waiters.keys():
+                self._wake_task_waiter(task, None)
+            self._logout_task_watcher(session)
+
+    def _logout_task_watcher(self, session):
+        """Log out the session of a task watcher, so that restarts of the
+        watcher do not leave sessions for XenServer to evict."""
+        try:
+            tpool.execute(session.xenapi.session.logout)
+        except Exception:
+            LOG.exception(_("Unable to log out of the XenAPI task events"
+                            " session"))
+
     def _create_session(self, url):
         """Stubout point. This can be replaced with a mock session."""
         return self.XenAPI.Session(url)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare full and incremental iptables applies in linux_net.
+
+Loads a filter table with one wrapped chain per instance, then times
+adding a rule to a single chain and applying it.  iptables-save and
+iptables-restore are faked, so the numbers cover rule generation and the
+size of the input that would be handed to iptables-restore.
+
+Usage: iptables_apply.py [--flags] [num_rules [rules_per_chain]]
+"""
+
+import gettext
+import os
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from nova import flags
+from nova.network import linux_net
+
+
+FLAGS = flags.FLAGS
+
+
+class FakeIptables(object):
+    """Keeps the last restored tables and measures restore input."""
+
+    def __init__(self):
+        self.tables = {}
+        self.restored_bytes = 0
+
+    def execute(self, *cmd, **kwargs):
+        if cmd[0].endswith('-save'):
+            return self.tables.get((cmd[0], cmd[2]), ''), ''
+        process_input = kwargs.get('process_input', '')
+        self.restored_bytes += len(process_input)
+        if '--noflush' not in cmd:
+            table = process_input.split('\n')[0][1:]
+            self.tables[(cmd[0].replace('restore', 'save'), table)] = \
+                    process_input
+        return '', ''
+
+
+def run(num_rules, rules_per_chain, incremental, num_updates=10):
+    FLAGS.iptables_incremental_apply = incremental
+    fake = FakeIptables()
+    manager = linux_net.IptablesManager(execute=fake.execute)
+    table = manager.ipv4['filter']
+    for i in xrange(num_rules / rules_per_chain):
+        chain = 'inst-%d' % i
+        table.add_chain(chain)
+        table.add_rule('local', '-d 10.%d.%d.%d -j $%s' %
+                       (i >> 16 & 255, i >> 8 & 255, i & 255, chain))
+        for port in xrange(rules_per_chain):
+            table.add_rule(chain, '-p tcp --dport %d -j ACCEPT' % port)
+    manager.apply()
+
+    fake.restored_bytes = 0
+    start = time.time()
+    for i in xrange(num_updates):
+        table.add_rule('inst-%d' % i, '-p udp --dport 53 -j ACCEPT')
+        manager.apply()
+    elapsed = (time.time() - start) / num_updates
+    return elapsed, fake.restored_bytes / num_updates
+
+
+if __name__ == '__main__':
+    argv = FLAGS(sys.argv)
+    FLAGS.use_ipv6 = False
+    args = [int(arg) for arg in argv[1:]]
+    sizes = args[:1] or [10000, 100000]
+    rules_per_chain = len(args) > 1 and args[1] or 10
+
+    print "%10s %12s %14s %16s" % ("rules", "mode", "ms/apply",
+                                   "restore bytes")
+    for num_rules in sizes:
+        for incremental in (False, True):
+            elapsed, restored = run(num_rules, rules_per_chain, incremental)
+            print "%10d %12s %14.2f %16d" % (num_rules,
+                    incremental and "incremental" or "full",
+                    elapsed * 1000, restored)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the per-host and columnar paths of least_cost.weighted_sum.
+
+Usage: least_cost_weights.py [num_hosts ...]
+"""
+
+import gettext
+import os
+import random
+import sys
+import timeit
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from nova.scheduler import least_cost
+
+
+def fake_hosts(num_hosts):
+    return [('host%05d' % i,
+             {'compute': {'host_memory_free': random.randint(0, 64) << 30,
+                          'disk_available': random.randint(0, 2000) << 30}})
+            for i in xrange(num_hosts)]
+
+
+def main(sizes):
+    cost_fns = [(1, least_cost.noop_cost_fn),
+                (1, least_cost.compute_fill_first_cost_fn),
+                (2, least_cost.compute_fill_first_cost_fn)]
+    print "%10s %14s %14s %8s" % ("hosts", "per-host (ms)", "columnar (ms)",
+                                  "speedup")
+    for num_hosts in sizes:
+        hosts = fake_hosts(num_hosts)
+        number = max(1, 100000 / num_hosts)
+
+        def per_host():
+            least_cost.weighted_sum(hosts, cost_fns)
+
+        def columnar():
+            columns = least_cost.HostColumns('compute', hosts)
+            least_cost.weighted_sum(hosts, cost_fns, columns=columns)
+
+        slow = min(timeit.repeat(per_host, number=number, repeat=3))
+        fast = min(timeit.repeat(columnar, number=number, repeat=3))
+        print "%10d %14.3f %14.3f %7.1fx" % (num_hosts,
+                                             slow * 1000 / number,
+                                             fast * 1000 / number,
+                                             slow / fast)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000])
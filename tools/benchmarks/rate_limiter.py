@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Time rate limit checks for many distinct users.
+
+Usage: rate_limiter.py [num_users ...]
+"""
+
+import gettext
+import os
+import random
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from nova.api.openstack import limits
+
+
+REQUESTS = [("GET", "/v1.1/proj/servers/detail"),
+            ("GET", "/v1.1/proj/servers?changes-since=2011-01-01"),
+            ("POST", "/servers"),
+            ("PUT", "/v1.1/proj/servers/1"),
+            ("DELETE", "/v1.1/proj/servers/1")]
+
+
+def main(sizes):
+    print "%10s %12s %14s %12s" % ("users", "checks", "us per check",
+                                   "users held")
+    for num_users in sizes:
+        limiter = limits.Limiter(limits.DEFAULT_LIMITS)
+        checks = [(random.choice(REQUESTS), 'user%06d' % i)
+                  for i in xrange(num_users)]
+
+        start = time.time()
+        for (verb, url), username in checks:
+            limiter.check_for_delay(verb, url, username)
+        elapsed = time.time() - start
+
+        print "%10d %12d %14.2f %12d" % (num_users, len(checks),
+                                         elapsed * 1000000 / len(checks),
+                                         len(limiter._buckets))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
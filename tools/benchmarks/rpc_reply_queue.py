@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare per-call reply queues with the shared reply queue in impl_kombu.
+
+Runs rpc.call against an echo consumer over kombu's in-memory transport
+and reports calls per second and the number of queues declared.  The
+in-memory transport can stall per-call reply queues that are drained
+concurrently, so calls are made one at a time unless asked otherwise.
+
+Usage: rpc_reply_queue.py [num_calls [concurrency]]
+"""
+
+import gettext
+import os
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from eventlet import greenpool
+import kombu.entity
+
+from nova import context
+from nova import flags
+from nova.rpc import impl_kombu
+
+
+FLAGS = flags.FLAGS
+
+
+class Echo(object):
+    def echo(self, context, value):
+        return value
+
+
+def count_declares():
+    """Wrap Queue.declare to count queue declarations."""
+    counter = {'declares': 0}
+    declare = kombu.entity.Queue.declare
+
+    def counting_declare(self, *args, **kwargs):
+        counter['declares'] += 1
+        return declare(self, *args, **kwargs)
+
+    kombu.entity.Queue.declare = counting_declare
+    return counter
+
+
+def run(num_calls, concurrency, single_reply_queue):
+    FLAGS.amqp_rpc_single_reply_queue = single_reply_queue
+    ctxt = context.get_admin_context()
+    pool = greenpool.GreenPool(concurrency)
+
+    def _call(i):
+        impl_kombu.call(ctxt, 'bench', {'method': 'echo',
+                                         'args': {'value': i}})
+
+    # Warm up the connection pool and, if enabled, the reply queue.
+    _call(0)
+    counter['declares'] = 0
+    start = time.time()
+    for i in xrange(num_calls):
+        pool.spawn_n(_call, i)
+    pool.waitall()
+    return time.time() - start, counter['declares']
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    num_calls = args and args[0] or 2000
+    concurrency = len(args) > 1 and args[1] or 1
+
+    FLAGS(['rpc_reply_queue', '--fake_rabbit'])
+    counter = count_declares()
+    conn = impl_kombu.create_connection(True)
+    conn.create_consumer('bench', Echo(), False)
+    conn.consume_in_thread()
+
+    print "%d calls, concurrency %d" % (num_calls, concurrency)
+    print "%22s %12s %16s" % ("reply queue", "calls/sec", "queue declares")
+    for single in (False, True):
+        elapsed, declares = run(num_calls, concurrency, single)
+        print "%22s %12.1f %16d" % (single and "shared" or "per-call",
+                                    num_calls / elapsed, declares)
+    conn.close()